@@ -1,8 +1,27 @@
 from django.contrib import admin
-from .models import Customer,Dress,Rental
-
+from .models import ArchivedRental, Customer,Dress,Rental
 # Register your models here.
-
 admin.site.register(Customer)
 admin.site.register(Dress)
-admin.site.register(Rental)
\ No newline at end of file
+admin.site.register(Rental)
+
+
+@admin.register(ArchivedRental)
+class ArchivedRentalAdmin(admin.ModelAdmin):
+    # ใบจองใน archive เป็นประวัติที่ยอดรายวัน / ตัวเลขของชุดนับไปแล้ว (core/archive.py)
+    # แก้หรือลบตรงนี้ signal ไม่ปรับยอดตาม -> ให้ดูได้อย่างเดียว
+    list_display = ('id', 'customer', 'dress', 'start_date', 'end_date', 'total_price', 'archived_at')
+    list_select_related = ('customer', 'dress')
+    readonly_fields = (
+        'id', 'customer', 'dress', 'accessories', 'start_date', 'end_date', 'total_price',
+        'status', 'price_override', 'deposit', 'note', 'archived_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
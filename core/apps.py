@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 
 class CoreConfig(AppConfig):
+    # ให้ตรงกับ migration ทุกตัว (id เป็น BigAutoField มาตั้งแต่ 0001)
+    default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import signals  # noqa: F401  ลงทะเบียน signal ของ Rental
+        from . import db_tuning  # noqa: F401  ตั้ง PRAGMA ของ SQLite ทุก connection
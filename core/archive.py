@@ -0,0 +1,157 @@
+"""แยกใบจองเก่าที่คืนแล้วออกไปตาราง ArchivedRental ให้ตาราง Rental เหลือแต่ของที่ยังใช้งาน
+
+ใบจองส่วนใหญ่คือของที่คืนไปนานแล้ว แต่ query เช็คคิว / dashboard ต้องกรองผ่านทั้งตาราง
+manage.py archive_rentals --older-than 180d ย้ายใบจอง RETURNED ที่คืนก่อนวันตัด (พร้อมของแถม) ไปทีละก้อน
+ก้อนละ transaction: ย้ายครบทั้งใบจอง + ของแถมของก้อนนั้น หรือไม่ย้ายเลย (หยุดกลางทางก็ไม่มีของหาย)
+
+การย้ายไม่ใช่การลบ: ยอดรายวัน (core/rollups.py) และตัวเลขของชุด (core/dress_stats.py) ไม่ถูกหักออก
+แต่ถ้าใบจองใน archive ถูกลบจริง (ลบลูกค้า / ชุด แล้ว cascade) จะหักออกเหมือนใบจองปกติ (core/signals.py)
+หน้ารายงาน / ประวัติลูกค้า / export อ่านทั้งสองตารางผ่าน RentalHistory
+"""
+import heapq
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, transaction
+
+from . import cache_versions
+from .models import ArchivedRental, Rental
+
+RENTAL_FIELDS = (
+    'id', 'customer_id', 'dress_id', 'start_date', 'end_date', 'total_price',
+    'status', 'price_override', 'deposit', 'note',
+)
+
+_moving = ContextVar('archiving_rentals', default=False)
+
+
+def is_moving():
+    """True ระหว่างลบใบจองที่เพิ่งย้ายเข้า archive (signal ของ Rental ไม่ต้องหักยอด)"""
+    return _moving.get()
+
+
+@contextmanager
+def _moving_rentals():
+    token = _moving.set(True)
+    try:
+        yield
+    finally:
+        _moving.reset(token)
+
+
+def _move_chunk(cutoff, chunk_size):
+    with transaction.atomic():
+        candidates = Rental.objects.filter(status='RETURNED', end_date__lt=cutoff).order_by('id')
+        if connection.features.has_select_for_update:
+            candidates = candidates.select_for_update()
+        rows = list(candidates.values(*RENTAL_FIELDS)[:chunk_size])
+        if not rows:
+            return 0, 0
+        ids = [row['id'] for row in rows]
+        ArchivedRental.objects.bulk_create([ArchivedRental(**row) for row in rows])
+
+        links = Rental.accessories.through.objects.filter(rental_id__in=ids).values_list('rental_id', 'accessory_id')
+        through = ArchivedRental.accessories.through
+        moved_links = through.objects.bulk_create([
+            through(archivedrental_id=rental_id, accessory_id=accessory_id) for rental_id, accessory_id in links
+        ])
+
+        with _moving_rentals():
+            Rental.objects.filter(id__in=ids).delete()
+    return len(rows), len(moved_links)
+
+
+def archive_rentals(cutoff, chunk_size=1000, progress=None):
+    """ย้ายใบจองที่คืนแล้วและ end_date ก่อน cutoff ไป archive ทีละ chunk_size ใบ คืน (ใบจอง, ของแถม) ที่ย้าย"""
+    rentals = links = 0
+    while True:
+        moved, moved_links = _move_chunk(cutoff, chunk_size)
+        if not moved:
+            if rentals:
+                cache_versions.bump(cache_versions.RENTALS)
+            return rentals, links
+        rentals += moved
+        links += moved_links
+        if progress:
+            progress(rentals, links)
+
+
+class _SortKey:
+    # เทียบค่าหลายช่องที่เรียงคนละทิศ (เช่น -start_date, -id) ใช้ merge ผลจากสองตาราง
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __lt__(self, other):
+        for mine, theirs, descending in zip(self.values, other.values, self.descending):
+            if mine != theirs:
+                return mine > theirs if descending else mine < theirs
+        return False
+
+
+class RentalHistory:
+    """ใบจองทั้งหมด (ตาราง Rental + ArchivedRental) ใช้เหมือน queryset แบบอ่านอย่างเดียว
+
+    filter / exclude / select_related / prefetch_related / values_list ทำกับทั้งสองตารางพร้อมกัน
+    order_by แล้วตัดหน้า ([:n]) หรือ iterator() = ดึงฝั่งละไม่เกิน n แถวตามลำดับเดียวกัน แล้ว merge
+    (เรียงได้เฉพาะฟิลด์ของใบจองเอง และต้องเป็น model object ไม่ใช่ values_list)
+    ใช้กับ keyset_page (core/listing.py) ได้เลย
+    """
+
+    def __init__(self, hot=None, cold=None, ordering=()):
+        self.hot = Rental.objects.all() if hot is None else hot
+        self.cold = ArchivedRental.objects.all() if cold is None else cold
+        self.ordering = ordering
+
+    def _apply(self, method, *args, **kwargs):
+        return RentalHistory(
+            getattr(self.hot, method)(*args, **kwargs), getattr(self.cold, method)(*args, **kwargs), self.ordering,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._apply('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._apply('exclude', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._apply('select_related', *fields)
+
+    def prefetch_related(self, *lookups):
+        return self._apply('prefetch_related', *lookups)
+
+    def values_list(self, *fields, **kwargs):
+        return self._apply('values_list', *fields, **kwargs)
+
+    def order_by(self, *fields):
+        history = self._apply('order_by', *fields)
+        history.ordering = fields
+        return history
+
+    def count(self):
+        return self.hot.count() + self.cold.count()
+
+    def _key(self, obj):
+        return _SortKey(
+            [getattr(obj, field.lstrip('-')) for field in self.ordering],
+            [field.startswith('-') for field in self.ordering],
+        )
+
+    def _merge(self, hot, cold):
+        if not self.ordering:
+            return itertools.chain(hot, cold)
+        return heapq.merge(hot, cold, key=self._key)
+
+    def iterator(self, chunk_size=2000):
+        return self._merge(self.hot.iterator(chunk_size=chunk_size), self.cold.iterator(chunk_size=chunk_size))
+
+    def __iter__(self):
+        return self.iterator()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None or (key.start or 0) < 0 or key.stop is None:
+            raise TypeError("RentalHistory ตัดได้แค่แบบ [a:b]")
+        return list(itertools.islice(self._merge(self.hot[:key.stop], self.cold[:key.stop]), key.start, key.stop))
@@ -0,0 +1,37 @@
+from .models import Rental
+
+
+def accessory_conflicts(start_date, end_date, accessory_ids=None, exclude_rental_id=None):
+    """คืนแถวใน through table (Rental.accessories) ที่เครื่องประดับถูกจองทับช่วง start_date - end_date
+
+    join ใบจอง + ลูกค้า + เครื่องประดับมาใน query เดียว
+    accessory_ids=None คือเช็คทุกชิ้น
+    """
+    links = Rental.accessories.through.objects.filter(
+        rental__start_date__lte=end_date,   # เริ่มก่อนที่เราจะคืน
+        rental__end_date__gte=start_date,   # คืนหลังที่เราเริ่ม
+    ).exclude(rental__status='RETURNED')    # ไม่นับคนที่คืนของแล้ว
+
+    if accessory_ids is not None:
+        links = links.filter(accessory_id__in=accessory_ids)
+    if exclude_rental_id is not None:
+        links = links.exclude(rental_id=exclude_rental_id)
+
+    return links.select_related('rental__customer', 'accessory').order_by('rental__start_date', 'rental_id')
+
+
+def busy_accessory_ids(start_date, end_date, exclude_rental_id=None):
+    # เอาแค่ ID ของเครื่องประดับที่ไม่ว่าง (ไม่ต้องสร้าง object)
+    return set(
+        accessory_conflicts(start_date, end_date, exclude_rental_id=exclude_rental_id)
+        .values_list('accessory_id', flat=True)
+    )
+
+
+async def abusy_accessory_ids(start_date, end_date, exclude_rental_id=None):
+    # แบบ async ของ busy_accessory_ids (ใช้ใน async view ของ portal ลูกค้า)
+    return {
+        accessory_id
+        async for accessory_id in accessory_conflicts(start_date, end_date, exclude_rental_id=exclude_rental_id)
+        .values_list('accessory_id', flat=True)
+    }
@@ -0,0 +1,108 @@
+"""วัดความเร็วหน้าหลักๆ ผ่าน test client: เวลา / จำนวน query / ขนาดหน้า เทียบกับงบที่ตั้งไว้
+
+ใช้กับข้อมูลจาก manage.py seed_bench แล้วรัน manage.py bench_views
+ทุก request รันใน transaction แล้ว rollback ทิ้ง -> POST จองคิวกี่รอบ DB ก็ไม่เปลี่ยน
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Accessory, Customer, Dress, Rental
+
+BENCH_USERNAME = 'bench'
+
+# งบต่อหน้า (ต่อ request): queries = จำนวน query, ms = เวลากลาง (median), bytes = ขนาด HTML
+# ตัวเลขตั้งเผื่อไว้จากข้อมูล seed_bench ค่าเริ่มต้น ถ้าเกิน = มีอะไรช้าลง (เช่น N+1 query กลับมา)
+BUDGETS = {
+    'dashboard': {'queries': 12, 'ms': 250, 'bytes': 400_000},
+    'dress_list': {'queries': 8, 'ms': 150, 'bytes': 300_000},
+    'add_rental_get': {'queries': 6, 'ms': 100, 'bytes': 200_000},
+    'add_rental_post': {'queries': 30, 'ms': 150, 'bytes': 10_000},
+    'customer_portal': {'queries': 8, 'ms': 100, 'bytes': 200_000},
+    'customer_select_accessories': {'queries': 8, 'ms': 150, 'bytes': 400_000},
+}
+
+
+def _scenarios():
+    """ชื่อ -> (client, ฟังก์ชันยิง request, status ที่ควรได้)"""
+    staff, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'is_staff': True})
+    admin = Client()
+    admin.force_login(staff)
+
+    rental = Rental.objects.exclude(status='RETURNED').order_by('id').first()
+    customer = Client()
+    if rental is not None:
+        session = customer.session
+        session['customer_id'] = rental.customer_id
+        session.save()
+
+    # วันที่ไกลๆ ที่ไม่มีใครจอง -> POST ผ่านการเช็คและบันทึกจริง (แล้ว rollback)
+    start = timezone.now().date() + timedelta(days=3650)
+    booking = {
+        'customer': Customer.objects.order_by('id').values_list('id', flat=True).first(),
+        'dress': Dress.objects.order_by('id').values_list('id', flat=True).first(),
+        'accessories': list(Accessory.objects.order_by('id').values_list('id', flat=True)[:1]),
+        'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=2)).isoformat(),
+    }
+
+    scenarios = {
+        'dashboard': (lambda: admin.get(reverse('dashboard')), 200),
+        'dress_list': (lambda: admin.get(reverse('dress_list')), 200),
+        'add_rental_get': (lambda: admin.get(reverse('add_rental')), 200),
+        'add_rental_post': (lambda: admin.post(reverse('add_rental'), booking), 302),
+    }
+    if rental is not None:
+        url = reverse('customer_select_accessories', args=[rental.id])
+        scenarios['customer_portal'] = (lambda: customer.get(reverse('customer_portal')), 200)
+        scenarios['customer_select_accessories'] = (lambda: customer.get(url), 200)
+    return scenarios
+
+
+def _measure(send, expected_status):
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = send()
+            elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    if response.status_code != expected_status:
+        raise AssertionError(f"ได้ status {response.status_code} (ควรเป็น {expected_status})")
+    return elapsed * 1000, len(queries.captured_queries), len(response.content)
+
+
+def run(repeat=5, warmup=1, only=None):
+    """วัดทุกหน้า คืน {ชื่อ: {ms, ms_max, queries, bytes}} (ms = median ของ repeat รอบ หลังอุ่นเครื่อง warmup รอบ)"""
+    results = {}
+    # test client ใช้ host 'testserver'
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for name, (send, expected_status) in _scenarios().items():
+            if only and name not in only:
+                continue
+            for _ in range(warmup):
+                _measure(send, expected_status)
+            runs = [_measure(send, expected_status) for _ in range(repeat)]
+            times = [ms for ms, _, _ in runs]
+            results[name] = {
+                'ms': round(statistics.median(times), 2),
+                'ms_max': round(max(times), 2),
+                'queries': max(count for _, count, _ in runs),
+                'bytes': max(size for _, _, size in runs),
+            }
+    return results
+
+
+def over_budget(results, budgets):
+    """รายการที่เกินงบ [(หน้า, ตัววัด, ค่าที่ได้, งบ)]"""
+    return [
+        (name, metric, results[name][metric], limit)
+        for name, limits in budgets.items() if name in results
+        for metric, limit in limits.items() if results[name][metric] > limit
+    ]
@@ -0,0 +1,45 @@
+"""จองแบบ atomic: เช็คคิวว่าง + บันทึก อยู่ใน transaction เดียวกัน
+
+ถ้าเช็คแล้วค่อยบันทึกแยกกัน แอดมินสองคน (หรือแอดมิน + ลูกค้าใน portal) กดจองของชิ้นเดียวกันพร้อมกัน
+จะผ่านการเช็คทั้งคู่ เพราะต่างคนต่างยังไม่เห็นใบจองของอีกฝั่ง -> จองซ้อน
+
+วิธีกันขึ้นกับ DB:
+- SQLite เขียนได้ทีละ connection อยู่แล้ว transaction ทุกอันเปิดด้วย BEGIN IMMEDIATE
+  (transaction_mode ใน settings.DATABASES) = ได้สิทธิ์เขียนตั้งแต่ต้น คนที่สองต้องรอ (busy_timeout)
+  จนคนแรก commit แล้วค่อยเช็ค จึงเห็นใบจองของคนแรกเสมอ
+- PostgreSQL: lock_items() ทำ SELECT ... FOR UPDATE เฉพาะแถวชุด/เครื่องประดับที่จะจอง
+  ของคนละชิ้นยังจองพร้อมกันได้ รอกันเฉพาะคนที่แย่งชิ้นเดียวกัน
+"""
+from django.db import connection, transaction
+
+from .availability import accessory_conflicts
+from .models import Accessory, Dress
+
+
+def lock_items(dress_ids=(), accessory_ids=()):
+    """ล็อกแถวชุด/เครื่องประดับจนจบ transaction (ต้องเรียกใน transaction.atomic())
+
+    ล็อกเรียงตาม id เสมอ สองคนที่จองของหลายชิ้นทับกันจะได้ไม่ deadlock
+    DB ที่ไม่มี FOR UPDATE (SQLite) ไม่ต้องทำอะไร ได้ล็อกทั้งไฟล์จาก BEGIN IMMEDIATE แล้ว
+    """
+    if not connection.features.has_select_for_update:
+        return
+    for model, ids in ((Dress, dress_ids), (Accessory, accessory_ids)):
+        if ids:
+            list(model.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', flat=True))
+
+
+def choose_accessories(rental, accessory_ids):
+    """ลูกค้าเลือกเครื่องประดับใน portal: เช็คว่ายังว่าง + บันทึก ใน transaction เดียว
+
+    คืน False ถ้ามีชิ้นที่ถูกคนอื่นจองตัดหน้าไประหว่างที่ลูกค้าเปิดหน้าอยู่ (ไม่บันทึกอะไรเลย)
+    """
+    with transaction.atomic():
+        lock_items(accessory_ids=accessory_ids)
+        taken = accessory_conflicts(
+            rental.start_date, rental.end_date,
+            accessory_ids=accessory_ids, exclude_rental_id=rental.id,
+        ).exists()
+        if not taken:
+            rental.accessories.set(accessory_ids)
+    return not taken
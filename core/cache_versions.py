@@ -0,0 +1,49 @@
+"""เลขเวอร์ชันของข้อมูลแต่ละกลุ่ม เก็บใน cache กลาง
+
+signal จะ bump เลขทุกครั้งที่ข้อมูลในกลุ่มเปลี่ยน ส่วนอะไรที่ cache ผลคำนวณไว้
+ก็เอาเลขเวอร์ชันไปต่อท้าย key -> ข้อมูลเปลี่ยนเมื่อไหร่ key ก็เปลี่ยนเอง ไม่ต้องไล่ลบ
+"""
+import time
+
+from django.core.cache import cache
+
+RENTALS = 'rentals'   # ใบจอง + ของแถมในใบจอง
+CATALOG = 'catalog'   # ชุด + เครื่องประดับ
+
+
+def _key(name):
+    return f"version:{name}"
+
+
+def _initial():
+    # เริ่มจากเวลาปัจจุบัน (ms) ไม่ใช่ 1 -> ถ้า cache ถูกล้างแล้วนับใหม่ จะไม่ชนเลขเก่า
+    # ที่ process ไหนจำไว้ (เช่น แคตตาล็อกในแรม core/catalog.py) จนได้ข้อมูลเก่ากลับไป
+    return int(time.time() * 1000)
+
+
+def get(name):
+    version = cache.get(_key(name))
+    if version is None:
+        initial = _initial()
+        cache.add(_key(name), initial, timeout=None)
+        version = cache.get(_key(name), initial)
+    return version
+
+
+async def aget(name):
+    """get() สำหรับ async view -> ใช้ cache แบบ async ไม่บล็อก event loop"""
+    version = await cache.aget(_key(name))
+    if version is None:
+        initial = _initial()
+        await cache.aadd(_key(name), initial, timeout=None)
+        version = await cache.aget(_key(name), initial)
+    return version
+
+
+def bump(name):
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        # ยังไม่มี key (cache เพิ่งเริ่ม / ถูกล้าง) -> เริ่มนับใหม่แล้วบวก 1
+        cache.add(_key(name), _initial(), timeout=None)
+        return cache.incr(_key(name))
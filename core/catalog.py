@@ -0,0 +1,69 @@
+"""แคตตาล็อกชุด / เครื่องประดับ เก็บไว้ในแรมของ process (อ่านบ่อยมาก แก้แค่ไม่กี่ครั้งต่อสัปดาห์)
+
+เก็บเป็น tuple เล็กๆ (id, ชื่อ, url รูป, url รูปย่อ, ขนาด, สีพื้นหลัง) ไม่ใช่ model object
+ทุกครั้งที่เรียกจะเช็คเลขเวอร์ชันแคตตาล็อกใน cache กลาง (get ครั้งเดียว) ถ้ายังตรงกับที่โหลดไว้ก็ใช้ของเดิม
+ไม่ตรง (มีคนแก้ชุด/เครื่องประดับ/รูปย่อเสร็จ) ค่อยโหลดจาก DB ใหม่ทั้งตาราง
+"""
+import threading
+from collections import namedtuple
+
+from . import cache_versions, images
+from .models import Accessory, Dress
+
+# ชื่อ field image_* ตรงกับของโมเดล -> ส่งเข้า {% responsive_image %} แทน model ได้เลย
+CatalogItem = namedtuple(
+    'CatalogItem',
+    ['id', 'name', 'image_url', 'renditions', 'image_width', 'image_height', 'image_placeholder'],
+)
+
+_FIELDS = ('id', 'name', 'image', 'image_renditions', 'image_width', 'image_height', 'image_placeholder')
+
+_loaded = {}   # ชื่อแคตตาล็อก -> (เวอร์ชัน, tuple ของ CatalogItem)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _item(model, pk, name, image_name, widths, width, height, placeholder):
+    image_url = renditions = None
+    if image_name:
+        storage = model._meta.get_field('image').storage
+        image_url = storage.url(image_name)
+        renditions = images.rendition_urls(storage, image_name, widths)
+    return CatalogItem(pk, name, image_url, renditions, width, height, placeholder)
+
+
+def _load(name, model):
+    version = cache_versions.get(cache_versions.CATALOG)
+    loaded = _loaded.get(name)
+    if loaded is not None and loaded[0] == version:
+        with _lock:
+            _stats['hits'] += 1
+        return loaded[1]
+    # อ่านเวอร์ชันก่อนโหลด: ถ้ามีคนแก้ระหว่างโหลด เวอร์ชันจะขยับ รอบหน้าก็โหลดใหม่เอง (ไม่ค้างของเก่า)
+    items = tuple(
+        _item(model, *row) for row in model._default_manager.order_by('id').values_list(*_FIELDS)
+    )
+    with _lock:
+        _stats['misses'] += 1
+        _loaded[name] = (version, items)
+    return items
+
+
+def accessories():
+    return _load('accessories', Accessory)
+
+
+def dresses():
+    return _load('dresses', Dress)
+
+
+def stats():
+    """จำนวนครั้งที่ได้จากแรม (hit) / ต้องโหลดจาก DB (miss) ของ process นี้"""
+    with _lock:
+        return dict(_stats)
+
+
+def clear():
+    with _lock:
+        _loaded.clear()
+        _stats.update(hits=0, misses=0)
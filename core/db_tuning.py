@@ -0,0 +1,31 @@
+"""ตั้งค่า SQLite ตอนเปิด connection ใหม่ (ค่าใน settings.SQLITE_PRAGMAS)
+
+ค่า default ของ SQLite เหมาะกับโปรแกรมคนเดียว พอแอดมินจองคิวพร้อมกับลูกค้าเปิด portal
+ก็เจอ "database is locked" บ่อย ปรับเป็น:
+- journal_mode=WAL   คนอ่านไม่ต้องรอคนเขียน (และคนเขียนไม่ต้องรอคนอ่าน) เขียนทีละคนเหมือนเดิม
+- synchronous=NORMAL ใน WAL ยังปลอดภัยถ้าไฟดับ (อาจหายแค่ transaction ล่าสุด) แต่ไม่ fsync ทุก commit
+- busy_timeout       ถ้ามีคนเขียนอยู่ ให้รอคิวก่อน (ms) ไม่ใช่ error ทันที
+- cache_size / mmap_size  ให้ page cache ใหญ่ขึ้น + อ่านไฟล์ผ่าน mmap ลด syscall
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragma_statements(pragmas):
+    # busy_timeout ต้องมาก่อน: journal_mode ต้องได้ lock ถ้ามีคนใช้ไฟล์อยู่จะได้รอ ไม่ error ทันที
+    names = sorted(pragmas, key=lambda name: name != 'busy_timeout')
+    return [f"PRAGMA {name} = {pragmas[name]}" for name in names]
+
+
+def apply_pragmas(raw_connection, pragmas):
+    """รัน PRAGMA บน connection ของ sqlite3 ตรงๆ (ใช้ทั้งตอน Django เปิด connection และใน benchmark)"""
+    for statement in pragma_statements(pragmas):
+        raw_connection.execute(statement).fetchall()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(connection.connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
@@ -0,0 +1,129 @@
+"""ตัวเลขสรุปของแต่ละชุดที่เก็บเป็นคอลัมน์บน Dress: เช่าไปกี่ครั้ง / รายได้รวม / มัดจำรวม / เช่าล่าสุด / คิวถัดไป
+
+อัปเดตทีละใบจองผ่าน signal (core/signals.py) เหมือนยอดรายวัน (core/rollups.py):
+- ตัวนับ + ยอดเงิน บวก/ลบด้วย F() ใน DB ตรงๆ สองคนบันทึกพร้อมกันก็ไม่ทับกัน
+- วันที่ (ค่ามาก/น้อยสุด) ลบออกแบบบวกลบไม่ได้ -> คำนวณใหม่ด้วย subquery ใน UPDATE คำสั่งเดียวกัน
+  ทำเฉพาะตอนชุด / วันที่ยืม / สถานะ เปลี่ยน
+
+หน้าสต็อกชุดเรียงตามความนิยม / รายได้ จึงเป็น ORDER BY คอลัมน์ที่มี index ไม่ต้อง aggregate ตอนเปิดหน้า
+ค่าเพี้ยน (แก้ DB ตรงๆ / bulk_create / queryset.update) -> manage.py recount
+คิวถัดไป = ใบจอง BOOKED ที่วันยืมยังไม่ผ่าน วันผ่านไปค่าเก่าไม่ขยับเอง -> ตั้ง cron manage.py recount --next-bookings วันละครั้ง
+ใบจองที่ย้ายไป ArchivedRental แล้วยังนับรวมอยู่ (core/archive.py)
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedRental, Dress, Rental, charged_price, charged_price_expression
+
+# สถานะที่นับว่า "ได้เช่าไปแล้วจริง" (ใช้หา เช่าล่าสุดเมื่อ)
+RENTED_STATUSES = ('ACTIVE', 'RETURNED')
+
+
+def rental_state(rental):
+    """ค่าของใบจองที่มีผลกับตัวเลขของชุด: (ชุด, วันที่ยืม, สถานะ, ราคาที่เก็บจริง, มัดจำ)"""
+    return (rental.dress_id, rental.start_date, rental.status, charged_price(rental), rental.deposit or 0)
+
+
+def last_rented_on():
+    def latest(model):
+        return Subquery(
+            model.objects.filter(dress=OuterRef('pk'), status__in=RENTED_STATUSES)
+            .order_by('-start_date').values('start_date')[:1]
+        )
+    # ใบจองใน archive เก่ากว่าใบที่ยังอยู่ตารางหลักเสมอ -> ดูตารางหลักก่อน
+    return Coalesce(latest(Rental), latest(ArchivedRental))
+
+
+def next_booking_on(today=None):
+    # ใบจอง BOOKED ที่วันยืมผ่านไปแล้ว (ไม่เคยถูกเปลี่ยนเป็นกำลังเช่า/คืนแล้ว) ไม่ใช่คิวถัดไป
+    today = today or timezone.localdate()
+    return Subquery(
+        Rental.objects.filter(dress=OuterRef('pk'), status='BOOKED', start_date__gte=today)
+        .order_by('start_date').values('start_date')[:1]
+    )
+
+
+def refresh_next_bookings(today=None):
+    """เลื่อนคิวถัดไปของชุดที่วันคิวผ่านไปแล้ว (ไม่มีใบจองเปลี่ยน ค่าก็ไม่ขยับเอง) คืนจำนวนชุดที่แก้
+
+    UPDATE เดียว แตะเฉพาะชุดที่ค่าเก่ากว่าวันนี้ -> รันวันละครั้งได้ (manage.py recount --next-bookings)
+    """
+    today = today or timezone.localdate()
+    return Dress.objects.filter(next_booking_on__lt=today).update(next_booking_on=next_booking_on(today))
+
+
+def _update(dress_id, count, revenue, deposit, dates):
+    changes = {}
+    if count:
+        changes['times_rented'] = F('times_rented') + count
+    if revenue:
+        changes['revenue_to_date'] = F('revenue_to_date') + revenue
+    if deposit:
+        changes['deposit_total'] = F('deposit_total') + deposit
+    if dates:
+        changes['last_rented_on'] = last_rented_on()
+        changes['next_booking_on'] = next_booking_on()
+    if changes:
+        Dress.objects.filter(pk=dress_id).update(**changes)
+
+
+def apply_change(old_state, new_state):
+    """ย้ายตัวเลขของใบจองหนึ่งใบจาก old_state ไป new_state (None = ไม่มี เช่นตอนสร้างใหม่ / ตอนลบ)"""
+    if old_state == new_state:
+        return
+    if old_state is not None and new_state is not None and old_state[0] == new_state[0]:
+        # ชุดเดิม: ปรับแค่ส่วนต่าง
+        _update(
+            new_state[0], 0, new_state[3] - old_state[3], new_state[4] - old_state[4],
+            dates=old_state[1:3] != new_state[1:3],
+        )
+        return
+    if old_state is not None:
+        _update(old_state[0], -1, -old_state[3], -old_state[4], dates=True)
+    if new_state is not None:
+        _update(new_state[0], 1, new_state[3], new_state[4], dates=True)
+
+
+def _totals():
+    # {ชุด: [จำนวนใบจอง, รายได้, มัดจำ]} รวมจากตารางหลัก + archive
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for model in (Rental, ArchivedRental):
+        rows = model.objects.order_by().values('dress').annotate(
+            count=Count('id'), revenue=Sum(charged_price_expression()), deposit=Sum('deposit'),
+        )
+        for row in rows:
+            total = totals[row['dress']]
+            total[0] += row['count']
+            total[1] += row['revenue'] or 0
+            total[2] += row['deposit'] or 0
+    return totals
+
+
+def rebuild(batch_size=1000):
+    """คำนวณตัวเลขของทุกชุดใหม่จากใบจอง แก้เฉพาะชุดที่ค่าไม่ตรง คืนจำนวนชุดที่แก้ (ใช้กับคำสั่ง recount)"""
+    totals = _totals()
+    actual = Dress.objects.annotate(
+        last_rented=last_rented_on(),
+        next_booking=next_booking_on(),
+    ).only('id', *Dress.STATS_FIELDS).order_by('id')
+
+    drifted = []
+    for dress in actual.iterator(chunk_size=batch_size):
+        count, revenue, deposit = totals[dress.id]
+        values = {
+            'times_rented': count,
+            'revenue_to_date': revenue,
+            'deposit_total': deposit,
+            'last_rented_on': dress.last_rented,
+            'next_booking_on': dress.next_booking,
+        }
+        if any(getattr(dress, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(dress, field, value)
+            drifted.append(dress)
+    Dress.objects.bulk_update(drifted, Dress.STATS_FIELDS, batch_size=batch_size)
+    return len(drifted)
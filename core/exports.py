@@ -0,0 +1,164 @@
+"""ส่งออกข้อมูลให้ฝ่ายบัญชี (ใบจอง / ลูกค้า / ยอดรายวัน) เป็น CSV หรือ Excel
+
+ดึงจาก DB ทีละก้อน (iterator(chunk_size)) แล้วเขียนออกทีละแถว -> ไม่ว่าจะ 100 หรือ 500,000 แถว
+แรมก็ใช้เท่าเดิม ใบจองดึงลูกค้า/ชุดมาด้วย select_related ส่วนของแถม prefetch ทีละก้อนตามไปด้วย
+"""
+import csv
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .archive import RentalHistory
+from .models import Accessory, Customer, DailyRevenue
+
+CHUNK_SIZE = 2000
+CSV_ROWS_PER_WRITE = 500   # รวมหลายแถวเป็นก้อนเดียวก่อนส่ง ลดจำนวนครั้งที่เขียนลง socket
+FILE_BLOCK_SIZE = 64 * 1024
+
+
+def rental_rows(date_from=None, date_to=None, status=None):
+    # รวมใบจองเก่าที่ย้ายไป archive แล้ว เรียงตามเลขที่เหมือนเดิม (core/archive.py)
+    rentals = RentalHistory().select_related('customer', 'dress').prefetch_related(
+        Prefetch('accessories', queryset=Accessory.objects.only('id', 'name').order_by('id'))
+    ).order_by('id')
+    if date_from:
+        rentals = rentals.filter(start_date__gte=date_from)
+    if date_to:
+        rentals = rentals.filter(start_date__lte=date_to)
+    if status:
+        rentals = rentals.filter(status=status)
+    # Django prefetch ของแถมให้ทีละ chunk_size แถว (ไม่โหลดทั้งตารางเข้าแรม)
+    for rental in rentals.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            rental.id,
+            rental.start_date,
+            rental.end_date,
+            rental.get_status_display(),
+            rental.customer.name,
+            rental.customer.phone,
+            rental.customer.line_id or '',
+            rental.dress.name,
+            ", ".join(acc.name for acc in rental.accessories.all()),
+            rental.total_price,
+            rental.price_override if rental.price_override is not None else '',
+            rental.deposit,
+            rental.note or '',
+        ]
+
+
+def customer_rows(date_from=None, date_to=None, status=None):
+    customers = Customer.objects.order_by('id')
+    if date_from:
+        customers = customers.filter(created_at__date__gte=date_from)
+    if date_to:
+        customers = customers.filter(created_at__date__lte=date_to)
+    for customer in customers.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            customer.id,
+            customer.name,
+            customer.phone,
+            customer.line_id or '',
+            # Excel ไม่รับเวลาที่มี timezone -> แปลงเป็นเวลาไทยแบบข้อความ
+            timezone.localtime(customer.created_at).strftime('%Y-%m-%d %H:%M'),
+        ]
+
+
+def revenue_rows(date_from=None, date_to=None, status=None):
+    days = DailyRevenue.objects.filter(rental_count__gt=0).order_by('day')
+    if date_from:
+        days = days.filter(day__gte=date_from)
+    if date_to:
+        days = days.filter(day__lte=date_to)
+    for row in days.values_list('day', 'rental_count', 'booked_total', 'deposits').iterator(chunk_size=CHUNK_SIZE):
+        yield list(row)
+
+
+# ชื่อชุดข้อมูล -> (หัวตาราง, ฟังก์ชันสร้างแถว) ตัวกรองสถานะใช้กับใบจองเท่านั้น
+EXPORTS = {
+    'rentals': (
+        ['เลขที่', 'วันที่ยืม', 'วันที่คืน', 'สถานะ', 'ลูกค้า', 'เบอร์โทร', 'Line ID', 'ชุด',
+         'เครื่องประดับ', 'ราคารวม', 'ราคาพิเศษ', 'ค่ามัดจำ', 'หมายเหตุ'],
+        rental_rows,
+    ),
+    'customers': (
+        ['เลขที่', 'ชื่อลูกค้า', 'เบอร์โทร', 'Line ID', 'วันที่สมัคร'],
+        customer_rows,
+    ),
+    'revenue': (
+        ['วันที่', 'จำนวนใบจอง', 'ยอดจองรวม', 'ค่ามัดจำรวม'],
+        revenue_rows,
+    ),
+}
+
+
+# ข้อความที่ขึ้นต้นด้วยตัวเหล่านี้ Excel / Google Sheets ตีความเป็นสูตร (เช่น ชื่อลูกค้า "=HYPERLINK(...)")
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def safe_cell(value):
+    """ใส่ ' นำหน้าข้อความที่จะกลายเป็นสูตร ให้เปิดแล้วเห็นเป็นข้อความธรรมดา (ตัวเลข/วันที่ไม่แตะ)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    # csv.writer ต้องการไฟล์ -> ให้ write() คืนข้อความกลับมาเลย เอาไป yield ต่อ
+    def write(self, value):
+        return value
+
+
+def csv_chunks(kind, **filters):
+    """สร้าง CSV ทีละก้อน (str) ใช้กับ StreamingHttpResponse หรือเขียนลงไฟล์"""
+    header, rows = EXPORTS[kind]
+    writer = csv.writer(_Echo())
+    # BOM นำหน้า -> Excel เปิดภาษาไทยถูก ส่งหัวตารางออกไปทันทีก่อนเริ่ม query
+    yield '\ufeff' + writer.writerow(header)
+    buffer = []
+    for row in rows(**filters):
+        buffer.append(writer.writerow([safe_cell(value) for value in row]))
+        if len(buffer) >= CSV_ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_xlsx(kind, fh, **filters):
+    """เขียนไฟล์ Excel ลง fh แบบ write-only (openpyxl พักแถวลงไฟล์ชั่วคราว ไม่เก็บทั้งชีตในแรม)"""
+    header, rows = EXPORTS[kind]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(kind)
+    sheet.append(header)
+    for row in rows(**filters):
+        sheet.append([safe_cell(value) for value in row])
+    workbook.save(fh)
+
+
+def file_blocks(fh, block_size=FILE_BLOCK_SIZE):
+    """อ่านไฟล์ทีละก้อนแล้วปิดไฟล์เมื่ออ่านจบ (หรือเมื่อ client ตัดการเชื่อมต่อ)"""
+    with fh:
+        yield from iter(lambda: fh.read(block_size), b'')
+
+
+async def aiterate(chunks):
+    """แปลง iterator แบบ sync (csv_chunks / file_blocks) เป็น async iterator ดึงทีละก้อนผ่าน sync_to_async
+
+    ใต้ ASGI ถ้าส่ง iterator แบบ sync ให้ StreamingHttpResponse, Django จะดึงทั้งหมดลงแรมก่อน
+    (sync_to_async(list)) แล้วค่อยส่ง -> ต้องให้เป็น async iterator ถึงจะสตรีมจริง
+    thread_sensitive (ค่าเริ่มต้น) -> ทุกก้อนรันใน thread เดียวกัน cursor ของ DB ใช้ต่อกันได้
+    """
+    iterator = iter(chunks)
+    done = object()
+    try:
+        while True:
+            chunk = await sync_to_async(next)(iterator, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await sync_to_async(close)()
@@ -1,9 +1,26 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from .images import ImageTooLarge, check_pixels
+from .phones import normalize_phone
 from .models import Customer, Dress, Rental, Accessory
 
 
+class ProductImageFormMixin:
+    # เช็คขนาดรูปจาก header ก่อนบันทึก (ไม่ decode ทั้งรูป) รูปใหญ่เกินจะขึ้น error ในฟอร์มแทน
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        header = getattr(image, 'image', None)  # มีเฉพาะไฟล์ที่เพิ่งอัปโหลด
+        if header is not None:
+            try:
+                check_pixels(*header.size)
+            except ImageTooLarge as e:
+                raise forms.ValidationError(str(e))
+        return image
+
+
 # 1. ฟอร์มสำหรับเพิ่มเครื่องประดับ (Admin)
-class AccessoryForm(forms.ModelForm):
+class AccessoryForm(ProductImageFormMixin, forms.ModelForm):
     class Meta:
         model = Accessory
         fields = ['name', 'image']
@@ -16,6 +33,41 @@ class AccessoryForm(forms.ModelForm):
 class DateInput(forms.DateInput):
     input_type = 'date'
 
+
+class AutocompleteSelect(forms.Select):
+    """dropdown ที่ render แค่ตัวเลือกที่ถูกเลือกอยู่ (ไม่ใช่ทุกแถวในตาราง)
+
+    ตัวเลือกอื่นให้ JS ดึงจาก url_name ตอนพิมพ์ค้นหา (ดู autocomplete views) -> หน้าเว็บไม่โตตามจำนวนลูกค้า/ชุด
+    """
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse(self.url_name)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # ชั่วคราวเปลี่ยน choices เป็น "ค่าว่าง + ตัวที่เลือก" แล้วให้ Select สร้าง <option> ตามปกติ
+        all_choices = self.choices
+        self.choices = self._selected_choices(value)
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
+
+    def _selected_choices(self, value):
+        iterator = self.choices
+        choices = [('', iterator.field.empty_label or '')]
+        selected = [v for v in value if v not in (None, '')]
+        if selected:
+            try:
+                choices += [iterator.choice(obj) for obj in iterator.queryset.filter(pk__in=selected)]
+            except (ValueError, ValidationError):
+                pass  # ค่าที่ส่งมาไม่ใช่ id -> ไม่มีอะไรให้เลือกค้างไว้
+        return choices
+
 class RentalForm(forms.ModelForm):
     # เราจะเรนเดอร์ accessories แบบพิเศษใน HTML (ไม่ใช้ widget ปกติ)
     # แต่ต้องประกาศ field ไว้เพื่อให้ Django รู้จัก
@@ -28,11 +80,13 @@ class RentalForm(forms.ModelForm):
         model = Rental
         fields = ['customer', 'dress', 'accessories', 'start_date', 'end_date', 'price_override', 'note']
         widgets = {
+            'customer': AutocompleteSelect('customer_autocomplete', attrs={'class': 'form-select'}),
+            'dress': AutocompleteSelect('dress_autocomplete', attrs={'class': 'form-select'}),
             'start_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control rounded-pill'}),
             'end_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control rounded-pill'}),
         }
 
-class DressForm(forms.ModelForm):
+class DressForm(ProductImageFormMixin, forms.ModelForm):
     class Meta:
         model = Dress
         fields = '__all__'
@@ -42,5 +96,23 @@ class CustomerForm(forms.ModelForm):
         model = Customer
         fields = '__all__'
 
+    def clean_phone(self):
+        # ลูกค้าใช้เบอร์นี้ login ต้องมีตัวเลข (เบอร์ซ้ำเช็คใน Customer.validate_unique)
+        phone = self.cleaned_data['phone']
+        if not normalize_phone(phone):
+            raise forms.ValidationError("กรุณากรอกเบอร์โทรเป็นตัวเลข")
+        return phone
+
 
 
+
+
+class ExportFilterForm(forms.Form):
+    # ตัวกรองของหน้าส่งออกข้อมูล (core/exports.py) ไม่กรอก = เอาทั้งหมด
+    date_from = forms.DateField(required=False, label="ตั้งแต่วันที่", widget=DateInput(attrs={'class': 'form-control form-control-sm'}))
+    date_to = forms.DateField(required=False, label="ถึงวันที่", widget=DateInput(attrs={'class': 'form-control form-control-sm'}))
+    status = forms.ChoiceField(
+        required=False, label="สถานะ",
+        choices=[('', 'ทุกสถานะ')] + Rental.STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
@@ -0,0 +1,258 @@
+"""ย่อรูปสินค้า (ชุด / เครื่องประดับ) นอก request
+
+โมเดลบันทึกไฟล์ต้นฉบับทันทีพร้อมสถานะ PROCESSING แล้วส่งงานมาที่นี่
+งานหนัก (decode / หมุนตาม EXIF / thumbnail / encode JPEG + รูปย่อ WebP/JPEG หลายขนาด)
+รันใน process pool ขนาดจำกัด
+ส่วนการอัปเดตสถานะใน DB ทำฝั่ง process หลักตอนงานเสร็จ
+"""
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import ExifTags, Image, ImageOps
+
+from . import cache_versions, instrumentation
+
+logger = logging.getLogger(__name__)
+
+MAX_SIZE = 800      # ด้านยาวสุดของรูปหลังย่อ (px)
+JPEG_QUALITY = 85   # Quality 85 ชัดแต่ไฟล์เล็ก
+
+# รูปย่อสำหรับ srcset (ความกว้าง px) สร้างครั้งเดียวตอนอัปโหลด ทั้ง WebP และ JPEG
+RENDITION_WIDTHS = (96, 400, 800)
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', 80),
+    ('jpg', 'JPEG', 82),
+)
+
+SPOOL_MAX_MEMORY = 1024 * 1024  # ไฟล์ที่ encode แล้วเกินนี้จะพักลงดิสก์แทนแรม
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(name, width, ext, pathmod=posixpath):
+    """ชื่อไฟล์ของรูปย่อแต่ละขนาด เช่น dresses/a.jpg -> dresses/renditions/a_400w.webp"""
+    folder, filename = pathmod.split(name)
+    stem = pathmod.splitext(filename)[0]
+    return pathmod.join(folder, 'renditions', f"{stem}_{width}w.{ext}")
+
+
+def rendition_urls(storage, name, widths):
+    """url ของรูปย่อทุกขนาด แยกตามนามสกุล {'webp': ((96, url), ...), 'jpg': (...)} (ไม่มีรูปย่อ = {})"""
+    if not widths:
+        return {}
+    return {
+        ext: tuple((width, storage.url(rendition_name(name, width, ext))) for width in widths)
+        for ext, _, _ in RENDITION_FORMATS
+    }
+
+
+def rendition_widths(width):
+    # ไม่ขยายรูปเล็กให้ใหญ่ขึ้น: รูปกว้าง 300 จะได้แค่ 96 กับ 300
+    return sorted({min(w, width) for w in RENDITION_WIDTHS})
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def check_pixels(width, height, max_pixels=None):
+    """กันรูปความละเอียดสูงเกิน (เช่น 100MP) ที่จะกินแรมตอน decode"""
+    max_pixels = max_pixels or settings.IMAGE_MAX_PIXELS
+    if width * height > max_pixels:
+        raise ImageTooLarge(
+            f"รูปใหญ่เกินไป ({width}x{height} = {width * height / 1_000_000:.1f} ล้านพิกเซล) "
+            f"รับได้ไม่เกิน {max_pixels / 1_000_000:.0f} ล้านพิกเซล"
+        )
+
+
+def _load(src, max_size=MAX_SIZE, max_pixels=None):
+    """เปิดรูป ย่อ + หมุนตาม EXIF + แปลง RGB คืน (รูป, ต้องเขียนไฟล์หลักทับไหม)
+
+    เรียงลำดับให้มีรูปขนาดเต็มอยู่ในแรมแค่ก้อนเดียว: ย่อตั้งแต่ตอน decode ก่อน แล้วค่อยหมุน/แปลงสีรูปเล็ก
+    """
+    with Image.open(src) as img:
+        check_pixels(img.width, img.height, max_pixels)
+        rotated = img.getexif().get(ExifTags.Base.Orientation, 1) != 1
+        too_big = img.width > max_size or img.height > max_size
+        if too_big:
+            # JPEG: ให้ decoder ถอดรหัสแบบลดขนาด (1/2, 1/4, 1/8) เลย ไม่ต้องกางรูปเต็มในแรม
+            img.draft('RGB', (max_size, max_size))
+            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        else:
+            img.load()
+        # 🔧 แก้ปัญหาหมุนภาพ (ถ้าถ่ายจากมือถือบางทีภาพจะตะแคง)
+        if rotated:
+            img = ImageOps.exif_transpose(img)
+        # แปลงเป็น RGB (เผื่อเจอไฟล์ PNG จะได้ไม่ error)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return img, too_big or rotated
+
+
+def placeholder_colour(img):
+    # สีเฉลี่ยของทั้งรูป (ย่อเหลือ 1 พิกเซล) ใช้เป็นพื้นหลังระหว่างรอรูปโหลด
+    r, g, b = img.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def image_fields(img):
+    """ข้อมูลของรูปหลังประมวลผล ที่เก็บลงโมเดลไว้ให้ template ใช้โดยไม่ต้องเปิดไฟล์"""
+    return {
+        'image_renditions': rendition_widths(img.width),
+        'image_width': img.width,
+        'image_height': img.height,
+        'image_placeholder': placeholder_colour(img),
+    }
+
+
+def _renditions(img):
+    for width in rendition_widths(img.width):
+        if width == img.width:
+            resized = img
+        else:
+            resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+        for ext, fmt, quality in RENDITION_FORMATS:
+            yield width, ext, fmt, quality, resized
+
+
+def process_file(path, max_size=MAX_SIZE, quality=JPEG_QUALITY, max_pixels=None):
+    """ย่อรูปที่ path ให้ไม่เกิน max_size (เขียนทับไฟล์เดิม) แล้วสร้างรูปย่อทุกขนาดไว้ข้างๆ
+
+    คืน (เวลาที่ใช้ ms, ค่าที่ต้องเก็บลงโมเดล) ดู image_fields()
+    ฟังก์ชันนี้รันใน worker process จึงห้ามแตะ DB
+    """
+    started = time.perf_counter()
+    img, changed = _load(path, max_size, max_pixels)
+    if changed:
+        # เขียนลงไฟล์ชั่วคราวก่อนแล้วค่อยสลับ กันคนเปิดรูปเจอไฟล์ครึ่งๆ กลางๆ
+        tmp_path = f"{path}.tmp"
+        img.save(tmp_path, format='JPEG', quality=quality)
+        os.replace(tmp_path, path)
+    os.makedirs(os.path.join(os.path.dirname(path), 'renditions'), exist_ok=True)
+    for width, ext, fmt, rendition_quality, resized in _renditions(img):
+        resized.save(rendition_name(path, width, ext, os.path), format=fmt, quality=rendition_quality)
+    return (time.perf_counter() - started) * 1000, image_fields(img)
+
+
+def process_stored(name, max_size=MAX_SIZE, quality=JPEG_QUALITY, max_pixels=None):
+    """เหมือน process_file แต่อ่าน/เขียนผ่าน storage (กรณี storage ไม่ใช่ไฟล์ในเครื่อง)"""
+    started = time.perf_counter()
+    with default_storage.open(name, 'rb') as fh:
+        img, changed = _load(fh, max_size, max_pixels)
+    if changed:
+        _save_to_storage(img, name, 'JPEG', quality)
+    for width, ext, fmt, rendition_quality, resized in _renditions(img):
+        _save_to_storage(resized, rendition_name(name, width, ext), fmt, rendition_quality)
+    return (time.perf_counter() - started) * 1000, image_fields(img)
+
+
+def _save_to_storage(img, name, fmt, quality):
+    # encode ลงไฟล์ชั่วคราว (อยู่ในแรมถ้าเล็ก ล้นไปดิสก์ถ้าใหญ่) แล้วให้ storage อ่านต่อเป็นสตรีม ไม่ต้องก๊อปเป็น bytes อีกรอบ
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as output:
+        img.save(output, format=fmt, quality=quality)
+        output.seek(0)
+        default_storage.delete(name)
+        default_storage.save(name, File(output, name=name))
+
+
+def _local_path(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn แทน fork: worker ไม่ติด connection DB / thread ของ process หลักไปด้วย
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                mp_context=get_context('spawn'),
+            )
+        return _executor
+
+
+def _set_status(model, pk, status, instance=None, fields=None):
+    fields = {'image_status': status, **(fields or {})}
+    model._default_manager.filter(pk=pk).update(**fields)
+    # update() ไม่ยิง signal -> บอก cache เองว่ารูปในแคตตาล็อกเปลี่ยนแล้ว
+    cache_versions.bump(cache_versions.CATALOG)
+    if instance is not None:
+        for field, value in fields.items():
+            setattr(instance, field, value)
+
+
+def _job_done(model, pk, name, queued_at, future):
+    # ถ้างานเสร็จก่อน add_done_callback, callback จะรันทันทีใน thread ที่ submit (= on_commit ของ request)
+    # -> อัปเดต DB ใน thread แยกเสมอ ปิด connection ได้โดยไม่ไปปิดของ request
+    thread = threading.Thread(
+        target=_record_result, args=(model, pk, name, queued_at, future), name='image-status', daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _record_result(model, pk, name, queued_at, future):
+    try:
+        try:
+            elapsed_ms, fields = future.result()
+        except Exception:
+            logger.exception("resize %s failed (%s #%s)", name, model.__name__, pk)
+            _set_status(model, pk, model.IMAGE_FAILED)
+            return
+        _set_status(model, pk, model.IMAGE_READY, fields=fields)
+        logger.info(
+            "resized %s (%s #%s) in %.1f ms, %.1f ms after upload",
+            name, model.__name__, pk, elapsed_ms, (time.perf_counter() - queued_at) * 1000,
+        )
+    finally:
+        # thread นี้มีไว้งานนี้งานเดียว -> connection ทุกตัวในนี้เป็นของมันเอง
+        connections.close_all()
+
+
+def process_now(instance):
+    """ย่อรูปใน process ปัจจุบัน (ใช้ตอนปิด pool, storage ไม่ใช่ไฟล์ในเครื่อง หรือสั่งจาก command)"""
+    model = type(instance)
+    name = instance.image.name
+    path = _local_path(name)
+    try:
+        with instrumentation.span('img'):
+            elapsed_ms, fields = process_file(path) if path else process_stored(name)
+    except Exception:
+        logger.exception("resize %s failed (%s #%s)", name, model.__name__, instance.pk)
+        _set_status(model, instance.pk, model.IMAGE_FAILED, instance)
+        return False
+    _set_status(model, instance.pk, model.IMAGE_READY, instance, fields)
+    logger.info("resized %s (%s #%s) in %.1f ms", name, model.__name__, instance.pk, elapsed_ms)
+    return True
+
+
+def enqueue(instance):
+    """ส่งรูปของ instance ไปย่อหลัง transaction commit (ไฟล์ต้นฉบับต้องอยู่ใน storage แล้ว)"""
+    model = type(instance)
+    pk = instance.pk
+    name = instance.image.name
+
+    def submit():
+        path = _local_path(name)
+        if not settings.IMAGE_PROCESSING_WORKERS or path is None:
+            process_now(instance)
+            return
+        future = _get_executor().submit(process_file, path, max_pixels=settings.IMAGE_MAX_PIXELS)
+        queued_at = time.perf_counter()
+        future.add_done_callback(lambda f: _job_done(model, pk, name, queued_at, f))
+
+    transaction.on_commit(submit)
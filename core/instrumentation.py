@@ -0,0 +1,191 @@
+"""จับเวลาแต่ละ request (เปิดด้วย REQUEST_INSTRUMENTATION=1): SQL / template / งานอื่นๆ
+
+ต่อ request เก็บ: จำนวน query, เวลา SQL รวม, query ที่ช้าสุด, query หน้าตาเดียวกันที่ยิงซ้ำ (กลิ่น N+1)
+เวลา render template (และ query ที่ถูกยิงระหว่าง render เช่น {% with p=dress.profit %})
+แล้วส่งออกเป็น header Server-Timing (ดูใน DevTools > Network > Timing) + log JSON บรรทัดเดียว
+request ที่ช้าเกิน INSTRUMENTATION_SLOW_MS จะ log รายการ query ทั้งหมดไว้ดูย้อนหลัง
+log เก็บแค่ SQL (มี %s แทนค่า) + เวลา + path ไม่เก็บค่าพารามิเตอร์ / query string (อาจเป็นเบอร์โทร ชื่อลูกค้า)
+
+ปิดอยู่ (ค่าเริ่มต้น) = middleware ถอดตัวเองออกตั้งแต่เริ่ม (MiddlewareNotUsed) ไม่มีอะไรทำงานเพิ่มเลย
+ข้อมูลของ request ปัจจุบันอยู่ใน ContextVar จึงตามไปถึง query ของ async view ที่รันใน thread อื่นด้วย
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_stats', default=None)
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def signature(sql):
+    # IN (%s, %s, ...) ยาวไม่เท่ากันก็นับเป็น query แบบเดียวกัน
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []           # (sql, ms, ยิงระหว่าง render template ไหม) ไม่เก็บค่าพารามิเตอร์
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.spans = Counter()      # ชื่อ -> ms (เช่น img = เวลาย่อรูปใน request)
+
+    @property
+    def sql_ms(self):
+        return sum(ms for _, ms, _ in self.queries)
+
+    def duplicates(self):
+        counts = Counter(signature(sql) for sql, _, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries.append((sql, (time.perf_counter() - started) * 1000, stats.template_depth > 0))
+
+
+def _install(connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@contextmanager
+def span(name):
+    """จับเวลางานช่วงหนึ่งของ request ปัจจุบัน (ไม่ได้เปิด instrumentation = ไม่ทำอะไร)"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.spans[name] += (time.perf_counter() - started) * 1000
+
+
+_templates_patched = False
+
+
+def _patch_templates():
+    # ห่อ render ของ template backend (ชั้นนอกสุด ไม่นับซ้ำตอน include/extends) ทำครั้งเดียวตอนเปิดใช้
+    global _templates_patched
+    if _templates_patched:
+        return
+    from django.template.backends.django import Template
+
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return original(self, context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_ms += (time.perf_counter() - started) * 1000
+
+    Template.render = render
+    _templates_patched = True
+
+
+def _start():
+    # connection ที่เปิดอยู่แล้วใน thread นี้ + ที่จะเปิดใหม่ (เช่น thread ของ async ORM) ต้องมีตัวจับ query
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def _finish(request, response, stats):
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    duplicates = stats.duplicates()
+    in_template = sum(1 for query in stats.queries if query[2])
+
+    timings = [
+        f'sql;dur={stats.sql_ms:.1f};desc="{len(stats.queries)} queries, {len(duplicates)} repeated"',
+        f'tpl;dur={stats.template_ms:.1f};desc="template ({in_template} queries inside)"',
+    ]
+    timings += [f'{name};dur={ms:.1f}' for name, ms in stats.spans.items()]
+    timings.append(f'total;dur={total_ms:.1f}')
+    response['Server-Timing'] = ", ".join(timings)
+
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(total_ms, 1),
+        'sql_ms': round(stats.sql_ms, 1),
+        'queries': len(stats.queries),
+        'template_ms': round(stats.template_ms, 1),
+        'template_queries': in_template,
+        'spans': {name: round(ms, 1) for name, ms in stats.spans.items()},
+        'slowest': [
+            {'sql': sql, 'ms': round(ms, 2)}
+            for sql, ms, _ in stats.slowest(settings.INSTRUMENTATION_TOP_QUERIES)
+        ],
+        'repeated': [{'sql': sql, 'count': count} for sql, count in duplicates[:settings.INSTRUMENTATION_TOP_QUERIES]],
+    }
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    if total_ms >= settings.INSTRUMENTATION_SLOW_MS:
+        logger.warning(json.dumps({
+            'slow_request': request.path,
+            'total_ms': round(total_ms, 1),
+            'queries': [
+                {'sql': sql, 'ms': round(ms, 2), 'in_template': in_tpl}
+                for sql, ms, in_tpl in stats.queries
+            ],
+        }, ensure_ascii=False, default=str))
+    return response
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    if not settings.REQUEST_INSTRUMENTATION:
+        raise MiddlewareNotUsed
+    _patch_templates()
+    connection_created.connect(_install, dispatch_uid='core.instrumentation')
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, token = _start()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, stats)
+    else:
+        def middleware(request):
+            stats, token = _start()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, stats)
+    return middleware
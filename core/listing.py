@@ -0,0 +1,135 @@
+"""ตัวช่วยของหน้ารายการ (ลูกค้า / ชุด / เครื่องประดับ / ประวัติเช่า): ค้นหา + แบ่งหน้าแบบ keyset
+
+แบ่งหน้าแบบ keyset (seek) = จำค่าของแถวสุดท้ายในหน้า แล้วหน้าถัดไปถามว่า "เอาแถวที่อยู่ถัดจากค่านี้"
+(WHERE id > ... ORDER BY id LIMIT n) แทน OFFSET -> DB เดินตาม index ไปถึงจุดนั้นเลย
+หน้า 1 หรือหน้า 10,000 ก็เร็วเท่ากัน และไม่ต้องนับจำนวนแถวทั้งหมด (COUNT) ทุกครั้ง
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+# ตัวอักษรที่มากที่สุดใน unicode: ทุกข้อความที่ขึ้นต้นด้วย "คำ" น้อยกว่า "คำ" + ตัวนี้เสมอ (เมื่อเรียงแบบ binary)
+_PREFIX_END = '\U0010ffff'
+
+
+def search(queryset, term, fields):
+    """ค้นแบบขึ้นต้นด้วยคำที่พิมพ์ (prefix) ในหลายช่อง เช่น ชื่อ หรือ เบอร์โทร
+
+    SQLite: ใช้ช่วง คำ <= ค่า < คำ + _PREFIX_END แทน startswith เพราะ startswith กลายเป็น
+    LIKE ... ESCAPE ซึ่งไม่สนตัวพิมพ์เล็ก/ใหญ่ -> ใช้ index ของคอลัมน์ไม่ได้ ต้องไล่ทุกแถว
+    ช่วงนี้ถูกเฉพาะเมื่อเรียงข้อความแบบ binary (SQLite เรียงแบบนี้)
+
+    DB อื่น (เช่น PostgreSQL) ใช้ startswith ตามปกติ: collation ตาม locale เรียงไม่ตรงกับ binary
+    ช่วงค่าอาจตกหล่นแถวที่ควรเจอ ข้อจำกัด: LIKE 'คำ%' บน PostgreSQL จะใช้ index ก็ต่อเมื่อ
+    DB ใช้ collation "C" หรือสร้าง index แบบ text_pattern_ops ไว้ ไม่งั้นไล่ทุกแถว
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+    if connections[queryset.db].vendor == 'sqlite':
+        conditions = (Q(**{f"{field}__gte": term, f"{field}__lt": term + _PREFIX_END}) for field in fields)
+    else:
+        conditions = (Q(**{f"{field}__startswith": term}) for field in fields)
+    return queryset.filter(reduce(or_, conditions))
+
+
+def _encode(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _seek(ordering, values, forward):
+    # (a, b) ถัดจาก (x, y) = a > x OR (a = x AND b > y)  (ฟิลด์ที่เรียงมากไปน้อยใช้ < แทน)
+    conditions = []
+    for i, (field, descending) in enumerate(ordering):
+        op = 'lt' if descending == forward else 'gt'
+        equal = [Q(**{name: value}) for (name, _), value in zip(ordering[:i], values)]
+        conditions.append(reduce(and_, equal + [Q(**{f"{field}__{op}": values[i]})]))
+    return reduce(or_, conditions)
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def keyset_page(request, queryset, ordering=('id',), page_size=None):
+    """ตัดหน้าจาก ?after=<cursor> (หน้าถัดไป) หรือ ?before=<cursor> (หน้าก่อน)
+
+    ordering ต้องเป็นฟิลด์ของโมเดลเองและปิดท้ายด้วยฟิลด์ที่ไม่ซ้ำ (เช่น id) ลำดับจะได้ไม่กำกวม
+    เรียงตามค่าที่ annotate ไว้ก็ได้ (เช่น Customer.objects.with_stats()) แต่ค่านั้นต้องไม่เป็น null
+    """
+    page_size = page_size or PAGE_SIZE
+    ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    after = _decode(request.GET.get('after', ''))
+    before = _decode(request.GET.get('before', '')) if after is None else None
+    forward = before is None
+    cursor = after if forward else before
+    if cursor is not None and len(cursor) != len(ordering):
+        cursor = None
+
+    page = queryset
+    if cursor is not None:
+        try:
+            page = page.filter(_seek(ordering, cursor, forward))
+        except (ValueError, ValidationError):
+            # cursor ถูกแก้มั่ว (ชนิดข้อมูลไม่ตรงฟิลด์) -> กลับไปหน้าแรก
+            cursor, forward = None, True
+    # ถอยหลัง = เรียงกลับด้าน เอา n แถวที่อยู่ก่อน cursor แล้วค่อยกลับลำดับคืน
+    page = page.order_by(*[
+        ('-' if descending == forward else '') + field for field, descending in ordering
+    ])
+    items = list(page[:page_size + 1])
+    more = len(items) > page_size
+    items = items[:page_size]
+    if not forward:
+        items.reverse()
+
+    def key(obj):
+        return _encode([getattr(obj, field) for field, _ in ordering])
+
+    has_next = more if forward else True
+    has_previous = (cursor is not None) if forward else more
+    return KeysetPage(
+        items,
+        next_cursor=key(items[-1]) if items and has_next else None,
+        previous_cursor=key(items[0]) if items and has_previous else None,
+    )
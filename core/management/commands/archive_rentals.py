@@ -0,0 +1,45 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import archive
+from core.models import Rental
+
+UNITS = {'d': 1, 'w': 7}
+
+
+def parse_age(value):
+    # 180d / 26w / 180 (ไม่มีหน่วย = วัน)
+    match = re.fullmatch(r'(\d+)([dw]?)', value.strip())
+    if not match:
+        raise CommandError(f"--older-than ต้องเป็นจำนวนวัน เช่น 180d หรือ 26w (ได้ {value!r})")
+    return timedelta(days=int(match.group(1)) * UNITS[match.group(2) or 'd'])
+
+
+class Command(BaseCommand):
+    help = (
+        "ย้ายใบจองที่คืนแล้วและเก่ากว่าที่กำหนด (นับจากวันคืน) พร้อมของแถม ไปตาราง archive "
+        "ทีละก้อน ก้อนละ transaction ยอดรายวัน / ตัวเลขของชุดไม่เปลี่ยน"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', default='180d', help="อายุขั้นต่ำนับจากวันคืน เช่น 180d หรือ 26w")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="ย้ายก้อนละกี่ใบ (1 ก้อน = 1 transaction)")
+        parser.add_argument('--dry-run', action='store_true', help="นับอย่างเดียว ไม่ย้ายจริง")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now().date() - parse_age(options['older_than'])
+        if options['dry_run']:
+            count = Rental.objects.filter(status='RETURNED', end_date__lt=cutoff).count()
+            self.stdout.write(f"จะย้าย {count:,} ใบ (คืนก่อน {cutoff})")
+            return
+
+        def progress(rentals, links):
+            self.stdout.write(f"  ย้ายแล้ว {rentals:,} ใบ / ของแถม {links:,} รายการ")
+
+        rentals, links = archive.archive_rentals(cutoff, chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"ย้ายใบจองที่คืนก่อน {cutoff} ไป archive แล้ว {rentals:,} ใบ (ของแถม {links:,} รายการ)"
+        ))
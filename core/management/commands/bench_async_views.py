@@ -0,0 +1,121 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from core.models import Rental
+
+HEADERS = {'host': 'localhost'}
+
+
+class Command(BaseCommand):
+    help = (
+        "เทียบหน้าฝั่งลูกค้า (หน้าแรก / portal / เลือกเครื่องประดับ) แบบ WSGI (thread pool) กับ ASGI (event loop) "
+        "ยิง request พร้อมกันผ่าน handler ของ Django ใน process เดียว ใช้ข้อมูลใน DB จริง (อ่านอย่างเดียว)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="จำนวน request ต่อหน้า ต่อโหมด")
+        parser.add_argument('--concurrency', type=int, default=20, help="จำนวนคนยิงพร้อมกัน (แต่ละคนยิงทีละ request)")
+        parser.add_argument('--threads', type=int, default=4, help="จำนวน worker thread ของฝั่ง WSGI")
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help="หน่วงทุก query เพิ่ม (ms) จำลอง DB ช้าช่วงคนเยอะ")
+
+    def handle(self, *args, **options):
+        rental = Rental.objects.exclude(status='RETURNED').order_by('id').first()
+        if rental is None:
+            raise CommandError("ต้องมีใบจองที่ยังไม่คืนอย่างน้อย 1 ใบ (ใช้ session ของลูกค้าคนนั้น)")
+        session = SessionStore()
+        session['customer_id'] = rental.customer_id
+        session.create()
+
+        paths = {
+            'landing': (reverse('landing_page'), None),
+            'portal': (reverse('customer_portal'), session.session_key),
+            'select': (reverse('customer_select_accessories', args=[rental.id]), session.session_key),
+        }
+        try:
+            for label, (path, session_key) in paths.items():
+                for mode, run in (('wsgi', self._run_wsgi), ('asgi', self._run_asgi)):
+                    timings, elapsed = run(path, session_key, options)
+                    self.stdout.write(
+                        f"{label:>8} {mode}: {len(timings) / max(elapsed, 1e-9):,.0f} req/s "
+                        f"p50 {statistics.median(timings) * 1000:.1f} ms "
+                        f"p95 {statistics.quantiles(timings, n=20)[-1] * 1000:.1f} ms"
+                    )
+        finally:
+            session.delete()
+
+    def _slow(self, latency):
+        def wrapper(execute, sql, params, many, context):
+            time.sleep(latency / 1000)
+            return execute(sql, params, many, context)
+        return wrapper
+
+    def _client(self, cls, session_key):
+        client = cls(headers=HEADERS)
+        if session_key:
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        return client
+
+    def _run_wsgi(self, path, session_key, options):
+        def handle(client):
+            if options['db_latency'] and not connection.execute_wrappers:
+                connection.execute_wrappers.append(self._slow(options['db_latency']))
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+
+        # คนยิง = concurrency thread ยิงทีละ request ต่อกัน ส่วน "server" มีแค่ --threads thread
+        # เวลาที่วัดจึงรวมเวลารอ thread ว่างด้วย (เหมือนคิวหน้า worker จริง)
+        server = ThreadPoolExecutor(max_workers=options['threads'])
+        per_client = self._split(options)
+
+        def user(count):
+            client = self._client(Client, session_key)
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                server.submit(handle, client).result()
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        started = time.perf_counter()
+        with server, ThreadPoolExecutor(max_workers=len(per_client)) as users:
+            timings = [t for result in users.map(user, per_client) for t in result]
+        return timings, time.perf_counter() - started
+
+    def _split(self, options):
+        # แบ่ง request ให้คนยิงแต่ละคนเท่าๆ กัน
+        requests, concurrency = options['requests'], max(1, min(options['concurrency'], options['requests']))
+        return [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    def _run_asgi(self, path, session_key, options):
+        async def user(count):
+            client = self._client(AsyncClient, session_key)
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(path)
+                assert response.status_code == 200, response.status_code
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        async def main():
+            if options['db_latency']:
+                # ORM แบบ async รัน query ใน thread กลางของ asgiref -> ใส่ตัวหน่วงที่ thread นั้น
+                await sync_to_async(connection.execute_wrappers.append)(self._slow(options['db_latency']))
+            started = time.perf_counter()
+            results = await asyncio.gather(*(user(count) for count in self._split(options)))
+            elapsed = time.perf_counter() - started
+            await sync_to_async(connection.execute_wrappers.clear)()
+            return [t for result in results for t in result], elapsed
+
+        return asyncio.run(main())
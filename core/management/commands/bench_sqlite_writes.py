@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import db_tuning
+
+# ค่า default ของ SQLite/Python (ก่อนปรับ): journal แบบ DELETE, fsync ทุก commit, รอ lock 5 วินาที
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = (
+        "วัดความเร็วการเขียน SQLite ตอนมีคนเขียนหลายคน + คนอ่านพร้อมกัน "
+        "เทียบค่า default กับ SQLITE_PRAGMAS ใน settings (ใช้ไฟล์ชั่วคราว ไม่แตะ DB จริง)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="จำนวน thread ที่เขียน (เหมือนแอดมินบันทึกใบจอง)")
+        parser.add_argument('--readers', type=int, default=4, help="จำนวน thread ที่อ่าน (เหมือนลูกค้าเปิด portal)")
+        parser.add_argument('--seconds', type=float, default=3.0, help="วัดแต่ละแบบนานกี่วินาที")
+
+    def handle(self, *args, **options):
+        for label, pragmas in (('default', DEFAULT_PRAGMAS), ('tuned', settings.SQLITE_PRAGMAS)):
+            result = self._run(pragmas, options['writers'], options['readers'], options['seconds'])
+            self.stdout.write(
+                f"{label:>8}: เขียน {result['writes_per_sec']:,.0f} ครั้ง/วิ "
+                f"(p95 {result['write_p95_ms']:.1f} ms, locked {result['locked']}) "
+                f"อ่าน {result['reads_per_sec']:,.0f} ครั้ง/วิ"
+            )
+
+    def _run(self, pragmas, writers, readers, seconds):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'bench.sqlite3')
+            setup = sqlite3.connect(path, isolation_level=None)
+            db_tuning.apply_pragmas(setup, pragmas)
+            setup.execute(
+                "CREATE TABLE rental (id INTEGER PRIMARY KEY, dress_id INTEGER, start_date TEXT, note TEXT)"
+            )
+            setup.execute("CREATE INDEX rental_dress ON rental (dress_id, start_date)")
+            setup.close()
+
+            stop = threading.Event()
+            latencies, counts = [], {'reads': 0, 'locked': 0}
+            lock = threading.Lock()
+
+            def connect():
+                # timeout=0 -> ให้ busy_timeout ใน pragmas เป็นตัวกำหนดการรอ lock อย่างเดียว
+                conn = sqlite3.connect(path, isolation_level=None, timeout=0, check_same_thread=False)
+                db_tuning.apply_pragmas(conn, pragmas)
+                return conn
+
+            def writer(n):
+                conn = connect()
+                i = 0
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        conn.execute("BEGIN")
+                        conn.execute(
+                            "INSERT INTO rental (dress_id, start_date, note) VALUES (?, date('now', ?), ?)",
+                            (i % 50, f"+{i % 365} days", 'x' * 200),
+                        )
+                        conn.execute("COMMIT")
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        with lock:
+                            counts['locked'] += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                    i += 1
+                conn.close()
+
+            def reader(n):
+                conn = connect()
+                done = 0
+                while not stop.is_set():
+                    try:
+                        conn.execute(
+                            "SELECT COUNT(*), MAX(start_date) FROM rental WHERE dress_id = ?", (done % 50,)
+                        ).fetchone()
+                        done += 1
+                    except sqlite3.OperationalError:
+                        with lock:
+                            counts['locked'] += 1
+                with lock:
+                    counts['reads'] += done
+                conn.close()
+
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+            threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        return {
+            'writes_per_sec': len(latencies) / seconds,
+            'write_p95_ms': statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else 0.0,
+            'reads_per_sec': counts['reads'] / seconds,
+            'locked': counts['locked'],
+        }
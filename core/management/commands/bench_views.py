@@ -0,0 +1,75 @@
+import copy
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import benchmarks
+from core.models import Customer, Dress, Rental
+
+
+class Command(BaseCommand):
+    help = (
+        "วัดเวลา / จำนวน query / ขนาดหน้า ของหน้าหลัก (dashboard, สต็อกชุด, ฟอร์มจอง GET+POST, portal ลูกค้า) "
+        "แล้วเทียบกับงบ เกินงบ = exit code 1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="วัดหน้าละกี่รอบ (ใช้ค่ากลาง)")
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--only', nargs='*', help="วัดเฉพาะบางหน้า เช่น --only dashboard dress_list")
+        parser.add_argument('--output', '-o', help="เขียนผลเป็น JSON ลงไฟล์นี้")
+        parser.add_argument('--budgets', help="ไฟล์ JSON งบต่อหน้า เช่น {\"dashboard\": {\"queries\": 10}} (ทับค่าเริ่มต้น)")
+        parser.add_argument('--budget', action='append', default=[], metavar='หน้า.ตัววัด=ค่า',
+                            help="ตั้งงบทีละค่า เช่น --budget dashboard.ms=120 (ใส่ได้หลายครั้ง)")
+
+    def handle(self, *args, **options):
+        budgets = self._budgets(options)
+        results = benchmarks.run(repeat=options['repeat'], warmup=options['warmup'], only=options['only'])
+        violations = benchmarks.over_budget(results, budgets)
+
+        for name, result in results.items():
+            limits = budgets.get(name, {})
+            self.stdout.write(
+                f"{name:<30} {result['ms']:>8.1f} ms  {result['queries']:>3} queries  {result['bytes']:>9,} bytes"
+                f"   (งบ {limits.get('ms', '-')} ms / {limits.get('queries', '-')} q / {limits.get('bytes', '-')} B)"
+            )
+
+        if options['output']:
+            report = {
+                'generated_at': timezone.now().isoformat(),
+                'data': {
+                    'customers': Customer.objects.count(),
+                    'dresses': Dress.objects.count(),
+                    'rentals': Rental.objects.count(),
+                },
+                'results': results,
+                'budgets': budgets,
+                'over_budget': [
+                    {'view': name, 'metric': metric, 'value': value, 'budget': limit}
+                    for name, metric, value, limit in violations
+                ],
+            }
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+
+        if violations:
+            raise CommandError("เกินงบ: " + "; ".join(
+                f"{name} {metric} {value} > {limit}" for name, metric, value, limit in violations
+            ))
+        self.stdout.write(self.style.SUCCESS("ทุกหน้าอยู่ในงบ"))
+
+    def _budgets(self, options):
+        budgets = copy.deepcopy(benchmarks.BUDGETS)
+        if options['budgets']:
+            with open(options['budgets'], encoding='utf-8') as fh:
+                for name, limits in json.load(fh).items():
+                    budgets.setdefault(name, {}).update(limits)
+        for item in options['budget']:
+            try:
+                key, value = item.split('=', 1)
+                name, metric = key.split('.', 1)
+                budgets.setdefault(name, {})[metric] = float(value)
+            except ValueError:
+                raise CommandError(f"--budget ต้องเป็นรูปแบบ หน้า.ตัววัด=ค่า (ได้ {item!r})")
+        return budgets
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Customer
+from core.phones import normalize_phone
+
+
+class Command(BaseCommand):
+    help = "รายชื่อลูกค้าที่เบอร์ซ้ำกับลูกค้าคนอื่น (ไม่มีเบอร์สำหรับ login portal จนกว่าจะแก้เบอร์)"
+
+    def handle(self, *args, **options):
+        # เบอร์ซ้ำ = มีเบอร์แต่ phone_normalized ว่าง (คนอื่นใช้เบอร์นี้ไปแล้ว ดู Customer.save)
+        found = 0
+        candidates = Customer.objects.filter(phone_normalized=None).order_by('id').values_list('id', 'name', 'phone')
+        for pk, name, phone in candidates.iterator():
+            normalized = normalize_phone(phone)
+            if not normalized:
+                continue
+            owner = Customer.objects.filter(phone_normalized=normalized).values_list('id', 'name').first()
+            owner_text = f"#{owner[0]} {owner[1]}" if owner else "-"
+            self.stdout.write(f"#{pk} {name} ({phone}) ซ้ำกับ {owner_text}")
+            found += 1
+        if found:
+            self.stdout.write(self.style.WARNING(f"ลูกค้าเบอร์ซ้ำ {found} คน แก้เบอร์ได้ที่หน้าแก้ไขลูกค้า"))
+        else:
+            self.stdout.write(self.style.SUCCESS("ไม่มีลูกค้าเบอร์ซ้ำ"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS, csv_chunks, write_xlsx
+from core.forms import ExportFilterForm
+
+
+class Command(BaseCommand):
+    help = "ส่งออกใบจอง (หรือลูกค้า / ยอดรายวัน) เป็น CSV หรือ Excel แบบทีละก้อน ไม่โหลดทั้งตารางเข้าแรม"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', choices=sorted(EXPORTS), default='rentals', help="ชุดข้อมูลที่จะส่งออก")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', '-o', help="ไฟล์ปลายทาง (CSV ไม่ระบุ = พิมพ์ออกหน้าจอ)")
+        parser.add_argument('--from', dest='date_from', help="ตั้งแต่วันที่ (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="ถึงวันที่ (YYYY-MM-DD)")
+        parser.add_argument('--status', help="BOOKED / ACTIVE / RETURNED")
+
+    def handle(self, *args, **options):
+        # ใช้ฟอร์มเดียวกับหน้าเว็บตรวจตัวกรอง -> รูปแบบวันที่/สถานะที่รับได้ตรงกัน
+        form = ExportFilterForm({
+            'date_from': options['date_from'] or '',
+            'date_to': options['date_to'] or '',
+            'status': options['status'] or '',
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        filters = form.cleaned_data
+        kind = options['data']
+        output = options['output']
+
+        if options['format'] == 'xlsx':
+            if not output:
+                raise CommandError("ส่งออก Excel ต้องระบุ --output")
+            with open(output, 'wb') as fh:
+                write_xlsx(kind, fh, **filters)
+        elif output:
+            with open(output, 'w', encoding='utf-8', newline='') as fh:
+                fh.writelines(csv_chunks(kind, **filters))
+        else:
+            for chunk in csv_chunks(kind, **filters):
+                self.stdout.write(chunk, ending='')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"ส่งออก {kind} ไปที่ {output} แล้ว"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core import images
+from core.models import Accessory, Dress
+
+
+class Command(BaseCommand):
+    help = "ย่อรูป + สร้างรูปย่อ (srcset) + เก็บขนาด/สีพื้นหลัง ให้รูปชุดและเครื่องประดับที่มีอยู่แล้ว"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="ทำใหม่ทุกรูป (ปกติทำเฉพาะรูปที่ยังไม่มีรูปย่อหรือขนาดรูป)")
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        for model in (Dress, Accessory):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['all']:
+                queryset = queryset.filter(Q(image_renditions=[]) | Q(image_width__isnull=True))
+            done = failed = 0
+            last_pk = 0
+            # ดึงทีละชุด (เรียงตาม id) แทนการเปิด cursor ค้างไว้ระหว่างที่อัปเดตแถวเดียวกัน
+            while True:
+                batch = list(
+                    queryset.filter(pk__gt=last_pk).order_by('pk').only('id', 'image')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                for obj in batch:
+                    if images.process_now(obj):
+                        done += 1
+                    else:
+                        failed += 1
+                last_pk = batch[-1].pk
+                self.stdout.write(f"{model.__name__}: ถึง id {last_pk} แล้ว")
+            self.stdout.write(f"{model.__name__}: สำเร็จ {done} รูป, ไม่สำเร็จ {failed} รูป")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import occupancy
+
+
+class Command(BaseCommand):
+    help = "สร้างปฏิทินคิวชุด (DressOccupancy) ใหม่ทั้งหมดจากใบจองที่มีอยู่"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = occupancy.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"สร้างปฏิทินคิวใหม่แล้ว {total} แถว"))
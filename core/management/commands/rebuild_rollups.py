@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "คำนวณตารางยอดรายวัน (DailyRevenue) ใหม่ทั้งหมดจากใบจองที่มีอยู่"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"สร้างยอดรายวันใหม่แล้ว {total} วัน"))
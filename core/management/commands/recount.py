@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import dress_stats
+
+
+class Command(BaseCommand):
+    help = "คำนวณตัวเลขสรุปของทุกชุด (เช่ากี่ครั้ง / รายได้ / มัดจำ / เช่าล่าสุด / คิวถัดไป) ใหม่จากใบจอง แก้ชุดที่ค่าเพี้ยน"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--next-bookings', action='store_true',
+            help="เลื่อนเฉพาะคิวถัดไปที่วันผ่านไปแล้ว (เบา ใช้รันทุกวันจาก cron)",
+        )
+
+    def handle(self, *args, **options):
+        if options['next_bookings']:
+            fixed = dress_stats.refresh_next_bookings()
+            self.stdout.write(self.style.SUCCESS(f"เลื่อนคิวถัดไปแล้ว {fixed} ชุด"))
+            return
+        with transaction.atomic():
+            fixed = dress_stats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"นับใหม่แล้ว แก้ค่าที่เพี้ยน {fixed} ชุด"))
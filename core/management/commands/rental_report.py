@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core import reports
+
+
+class Command(BaseCommand):
+    help = "คำนวณรายงานวิเคราะห์ (อัตราการใช้ชุด คืนทุน รายได้รายเดือน ของแถมยอดนิยม) แล้วเก็บลง cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="พิมพ์รายงานทั้งก้อนเป็น JSON")
+
+    def handle(self, *args, **options):
+        report = reports.get_report(refresh=True)
+        if options['json']:
+            self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"ใบจองทั้งหมด {report['rental_count']} ใบ รายได้รวม {report['total_revenue']:,.2f} บาท")
+        self.stdout.write("\nชุด (อัตราการใช้งาน / รายได้ / คืนทุน)")
+        for dress in report['dresses']:
+            if dress['paid_back']:
+                payback = "คืนทุนแล้ว"
+            elif dress['days_to_payback'] is None:
+                payback = "ยังไม่มีรายได้"
+            else:
+                payback = f"อีก ~{dress['days_to_payback']} วัน"
+            self.stdout.write(
+                f"  {dress['name']}: {dress['utilisation']:.0%} / {dress['revenue']:,.2f} / {payback}"
+            )
+        self.stdout.write("\nรายได้รายเดือน")
+        for month in report['monthly']:
+            self.stdout.write(f"  {month['month']}: {month['revenue']:,.2f} ({month['rental_count']} ใบ)")
+        self.stdout.write("\nเครื่องประดับยอดนิยม")
+        for acc in report['accessories']:
+            self.stdout.write(f"  {acc['name']}: {acc['count']} ครั้ง")
+        self.stdout.write(self.style.SUCCESS("\nเก็บรายงานลง cache แล้ว"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import seed
+
+
+class Command(BaseCommand):
+    help = "สร้างข้อมูลสมมติ (ลูกค้า / ชุด / เครื่องประดับ + รูป / ใบจอง) จำนวนมากไว้วัดความเร็ว"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--dresses', type=int, default=100)
+        parser.add_argument('--rentals', type=int, default=5000)
+        parser.add_argument('--accessories', type=int, default=None, help="ค่าเริ่มต้น = ครึ่งหนึ่งของจำนวนชุด (อย่างน้อย 10)")
+        parser.add_argument('--images', type=int, default=12, help="จำนวนรูปที่สร้างจริง (ชุด/เครื่องประดับใช้รูปซ้ำกันวนไป)")
+        parser.add_argument('--seed', type=int, default=0, help="seed ของตัวสุ่ม (ได้ข้อมูลชุดเดิมทุกครั้ง)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = seed.seed(
+                options['customers'], options['dresses'], options['rentals'],
+                accessories=options['accessories'], image_count=options['images'], seed=options['seed'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "สร้างแล้ว: " + ", ".join(f"{name} {count:,}" for name, count in created.items())
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_rental_deposit_rental_price_override"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="rental",
+            name="deposit",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                default=0,
+                max_digits=10,
+                verbose_name="ค่ามัดจำ",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rental",
+            index=models.Index(
+                fields=["start_date", "end_date", "status"],
+                name="rental_dates_status_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-18 09:02
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_occupancy(apps, schema_editor):
+    # เติมปฏิทินคิวจากใบจองที่มีอยู่แล้ว (เหมือนคำสั่ง rebuild_occupancy)
+    # ใบจองที่คืนแล้วไม่กินคิว / นับรวมวันรับและวันคืน อย่างน้อย 1 วัน
+    Rental = apps.get_model("core", "Rental")
+    DressOccupancy = apps.get_model("core", "DressOccupancy")
+    rentals = Rental.objects.exclude(status="RETURNED").values_list(
+        "id", "dress_id", "start_date", "end_date"
+    )
+    batch = []
+    for rental_id, dress_id, start_date, end_date in rentals.iterator(chunk_size=1000):
+        for i in range(max((end_date - start_date).days, 0) + 1):
+            batch.append(
+                DressOccupancy(
+                    rental_id=rental_id,
+                    dress_id=dress_id,
+                    day=start_date + timedelta(days=i),
+                )
+            )
+        if len(batch) >= 1000:
+            DressOccupancy.objects.bulk_create(batch)
+            batch = []
+    DressOccupancy.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_rental_dates_status_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DressOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="วันที่")),
+                (
+                    "dress",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.dress",
+                        verbose_name="ชุด",
+                    ),
+                ),
+                (
+                    "rental",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.rental",
+                        verbose_name="ใบจอง",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["dress", "day"], name="occupancy_dress_day_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
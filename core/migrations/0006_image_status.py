@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_dressoccupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accessory",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("PROCESSING", "กำลังประมวลผลรูป"),
+                    ("READY", "พร้อมใช้งาน"),
+                    ("FAILED", "ประมวลผลรูปไม่สำเร็จ"),
+                ],
+                default="READY",
+                editable=False,
+                max_length=10,
+                verbose_name="สถานะรูปภาพ",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dress",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("PROCESSING", "กำลังประมวลผลรูป"),
+                    ("READY", "พร้อมใช้งาน"),
+                    ("FAILED", "ประมวลผลรูปไม่สำเร็จ"),
+                ],
+                default="READY",
+                editable=False,
+                max_length=10,
+                verbose_name="สถานะรูปภาพ",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_image_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accessory",
+            name="image_renditions",
+            field=models.JSONField(
+                blank=True, default=list, editable=False, verbose_name="ขนาดรูปย่อ"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dress",
+            name="image_renditions",
+            field=models.JSONField(
+                blank=True, default=list, editable=False, verbose_name="ขนาดรูปย่อ"
+            ),
+        ),
+    ]
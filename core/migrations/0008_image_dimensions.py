@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accessory",
+            name="image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="accessory",
+            name="image_placeholder",
+            field=models.CharField(
+                blank=True, editable=False, max_length=7, verbose_name="สีพื้นหลังรูป"
+            ),
+        ),
+        migrations.AddField(
+            model_name="accessory",
+            name="image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="dress",
+            name="image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="dress",
+            name="image_placeholder",
+            field=models.CharField(
+                blank=True, editable=False, max_length=7, verbose_name="สีพื้นหลังรูป"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dress",
+            name="image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
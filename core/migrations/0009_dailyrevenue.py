@@ -0,0 +1,78 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_daily_revenue(apps, schema_editor):
+    # เติมยอดรายวันจากใบจองที่มีอยู่แล้ว (เหมือนคำสั่ง rebuild_rollups)
+    # ยอด = ราคาที่เก็บจริง (ราคาพิเศษถ้ามี) เหมือน core.models.charged_price
+    Rental = apps.get_model("core", "Rental")
+    DailyRevenue = apps.get_model("core", "DailyRevenue")
+    rows = (
+        Rental.objects.order_by()
+        .values("start_date")
+        .annotate(
+            total=Sum(Coalesce("price_override", "total_price")),
+            count=Count("id"),
+            deposit_total=Sum("deposit"),
+        )
+    )
+    DailyRevenue.objects.bulk_create(
+        DailyRevenue(
+            day=row["start_date"],
+            booked_total=row["total"] or 0,
+            rental_count=row["count"],
+            deposits=row["deposit_total"] or 0,
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_image_dimensions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True, verbose_name="วันที่")),
+                (
+                    "booked_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="ยอดจองรวม",
+                    ),
+                ),
+                (
+                    "rental_count",
+                    models.PositiveIntegerField(default=0, verbose_name="จำนวนใบจอง"),
+                ),
+                (
+                    "deposits",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="ค่ามัดจำรวม",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(fill_daily_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accessory',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100, verbose_name='ชื่อเครื่องประดับ'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100, verbose_name='ชื่อลูกค้า'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone',
+            field=models.CharField(db_index=True, max_length=15, verbose_name='เบอร์โทร'),
+        ),
+        migrations.AlterField(
+            model_name='dress',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100, verbose_name='ชื่อชุด'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+def fill_phone_normalized(apps, schema_editor):
+    from core.phones import normalize_phone
+
+    Customer = apps.get_model('core', 'Customer')
+    # อ่าน (id, เบอร์) มาก่อนทั้งหมด แล้วค่อยเขียน (SQLite ไม่ควรเขียนตารางระหว่างไล่ iterator อยู่)
+    rows = list(Customer.objects.order_by('id').values_list('id', 'phone'))
+    owners = {}
+    batch = []
+    duplicates = []
+    # ลูกค้าเก่าสุดได้เบอร์ไป ถ้ามีเบอร์ซ้ำตัวถัดไปเว้นว่างไว้ (login portal ไม่ได้จนกว่าจะแก้เบอร์ที่หน้าแก้ไขลูกค้า)
+    for pk, raw in rows:
+        phone = normalize_phone(raw)
+        if not phone:
+            continue
+        if phone in owners:
+            duplicates.append((pk, owners[phone]))
+            continue
+        owners[phone] = pk
+        batch.append(Customer(id=pk, phone_normalized=phone))
+    Customer.objects.bulk_update(batch, ['phone_normalized'], batch_size=2000)
+    if duplicates:
+        # แจ้งตอน migrate ให้เห็น ไม่เงียบหาย (ดูรายชื่อเต็มทีหลังได้ด้วย manage.py duplicate_phones)
+        print(f"\n  ลูกค้า {len(duplicates)} คนเบอร์ซ้ำกับคนอื่น ยังไม่มีเบอร์สำหรับ login:")
+        for pk, owner in duplicates[:20]:
+            print(f"    #{pk} ซ้ำกับ #{owner}")
+        print("  ดูทั้งหมด: python manage.py duplicate_phones")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.RunPython(fill_phone_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_dress_stats(apps, schema_editor):
+    # เติมตัวเลขของชุดจากใบจองที่มีอยู่แล้ว (เหมือนคำสั่ง recount) ด้วย UPDATE คำสั่งเดียว
+    Dress = apps.get_model('core', 'Dress')
+    Rental = apps.get_model('core', 'Rental')
+    rentals = Rental.objects.filter(dress=OuterRef('pk')).order_by().values('dress')
+
+    def total(expression):
+        return Coalesce(Subquery(rentals.annotate(value=expression).values('value')), 0)
+
+    Dress.objects.update(
+        times_rented=total(Count('id')),
+        revenue_to_date=total(Sum(Coalesce('price_override', 'total_price'))),
+        deposit_total=total(Sum('deposit')),
+        last_rented_on=Subquery(
+            Rental.objects.filter(dress=OuterRef('pk'), status__in=['ACTIVE', 'RETURNED'])
+            .order_by('-start_date').values('start_date')[:1]
+        ),
+        next_booking_on=Subquery(
+            # ใบจองที่วันยืมผ่านไปแล้วแต่ยังค้างสถานะ BOOKED ไม่นับเป็นคิวถัดไป
+            Rental.objects.filter(dress=OuterRef('pk'), status='BOOKED', start_date__gte=timezone.localdate())
+            .order_by('start_date').values('start_date')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dress',
+            name='deposit_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='มัดจำรวม'),
+        ),
+        migrations.AddField(
+            model_name='dress',
+            name='last_rented_on',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='เช่าล่าสุดเมื่อ'),
+        ),
+        migrations.AddField(
+            model_name='dress',
+            name='next_booking_on',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='คิวถัดไป'),
+        ),
+        migrations.AddField(
+            model_name='dress',
+            name='revenue_to_date',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='รายได้รวม'),
+        ),
+        migrations.AddField(
+            model_name='dress',
+            name='times_rented',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='เช่าไป (ครั้ง)'),
+        ),
+        migrations.AddIndex(
+            model_name='dress',
+            index=models.Index(fields=['times_rented', 'id'], name='dress_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dress',
+            index=models.Index(fields=['revenue_to_date', 'id'], name='dress_revenue_idx'),
+        ),
+        migrations.RunPython(fill_dress_stats, migrations.RunPython.noop),
+    ]
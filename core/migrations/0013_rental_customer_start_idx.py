@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_dress_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['customer', 'start_date'], name='rental_customer_start_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_rental_customer_start_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRental',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='เลขที่ใบจองเดิม')),
+                ('start_date', models.DateField(verbose_name='วันที่ยืม')),
+                ('end_date', models.DateField(verbose_name='วันที่คืน')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='ราคารวมรอบนี้')),
+                ('status', models.CharField(choices=[('BOOKED', 'จองแล้ว'), ('ACTIVE', 'กำลังเช่า'), ('RETURNED', 'คืนแล้ว')], default='RETURNED', max_length=10, verbose_name='สถานะ')),
+                ('price_override', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='ราคาพิเศษ (ถ้ามี)')),
+                ('deposit', models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=10, verbose_name='ค่ามัดจำ')),
+                ('note', models.TextField(blank=True, null=True, verbose_name='หมายเหตุ')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='ย้ายเข้า archive เมื่อ')),
+                ('accessories', models.ManyToManyField(blank=True, related_name='archived_rentals', to='core.accessory', verbose_name='เครื่องประดับที่แถม')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rentals', to='core.customer', verbose_name='ลูกค้า')),
+                ('dress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rentals', to='core.dress', verbose_name='ชุดที่เช่า')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'start_date'], name='archived_customer_start_idx'), models.Index(fields=['start_date'], name='archived_start_idx')],
+            },
+        ),
+    ]
@@ -1,132 +1,211 @@
+import logging
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Count, DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from PIL import Image, ExifTags # เพิ่มตัวจัดการรูปภาพ
-from io import BytesIO
-from django.core.files.base import ContentFile
-from datetime import timedelta
-import os
+from datetime import date, timedelta
+from functools import reduce
+from operator import add
+
+from . import images
+from .phones import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+
+# ราคาที่เก็บจริงของใบจอง: ราคาพิเศษถ้ามี ไม่งั้นราคารวมปกติ
+# ทุกที่ที่รวมเงินจากใบจอง (ยอดรายวัน / รายงาน / ตัวเลขของชุด / ยอดใช้จ่ายลูกค้า) ใช้นิยามนี้
+def charged_price(rental):
+    price = rental.price_override if rental.price_override is not None else rental.total_price
+    return price or 0
+
+
+def charged_price_expression(prefix=''):
+    """charged_price ในรูป expression ของ DB (prefix เช่น 'rental__' ตอนรวมผ่าน relation)"""
+    return Coalesce(f'{prefix}price_override', f'{prefix}total_price')
+
+
+class CustomerQuerySet(models.QuerySet):
+    def with_stats(self):
+        # ตัวเลขของลูกค้าแต่ละคนจากใบจอง (รวมใบจองเก่าใน ArchivedRental) ใน query เดียว
+        # ใช้ subquery ต่อแถว (วิ่งตาม index (customer, start_date)) แทน JOIN + GROUP BY ทั้งตาราง
+        # หน้าแรกที่เรียงตาม id จึงคำนวณแค่ลูกค้าในหน้านั้น ไม่ต้องรวมยอดของทุกคนก่อน
+        money = DecimalField(max_digits=12, decimal_places=2)
+
+        def per_customer(aggregate, default, output_field, tables=(Rental, ArchivedRental)):
+            totals = [
+                Coalesce(
+                    Subquery(
+                        model.objects.filter(customer=OuterRef('pk')).order_by()
+                        .values('customer').annotate(value=aggregate).values('value')
+                    ),
+                    Value(default), output_field=output_field,
+                )
+                for model in tables
+            ]
+            return reduce(add, totals)
+
+        def latest_visit(model):
+            return Subquery(
+                model.objects.filter(customer=OuterRef('pk'), status__in=['ACTIVE', 'RETURNED'])
+                .order_by('-start_date').values('start_date')[:1]
+            )
+
+        # ใบจองใน archive เก่ากว่าใบที่ยังอยู่ตารางหลักเสมอ -> ดูตารางหลักก่อน
+        last_visit = Coalesce(latest_visit(Rental), latest_visit(ArchivedRental))
+        return self.annotate(
+            rental_count=per_customer(Count('id'), 0, models.IntegerField()),
+            lifetime_spend=per_customer(Sum(charged_price_expression()), 0, money),
+            last_visit=last_visit,
+            # last_visit ที่ไม่เป็น null (ยังไม่เคยมา = วันแรกสุด) ไว้ใช้เรียง/แบ่งหน้า
+            last_visit_key=Coalesce(last_visit, Value(date.min)),
+            # ใบจองที่ยังไม่คืนอยู่ตารางหลักเท่านั้น
+            open_bookings=per_customer(
+                Count('id', filter=Q(status__in=['BOOKED', 'ACTIVE'])), 0, models.IntegerField(), tables=(Rental,),
+            ),
+        )
+
 
 class Customer(models.Model):
-    name = models.CharField(max_length=100, verbose_name="ชื่อลูกค้า")
-    phone = models.CharField(max_length=15, verbose_name="เบอร์โทร")
+    # db_index: หน้ารายชื่อค้นจากชื่อ/เบอร์ (ขึ้นต้นด้วย) ดู core/listing.py
+    name = models.CharField(max_length=100, db_index=True, verbose_name="ชื่อลูกค้า")
+    phone = models.CharField(max_length=15, db_index=True, verbose_name="เบอร์โทร")
     line_id = models.CharField(max_length=50, blank=True, null=True, verbose_name="Line ID")
     created_at = models.DateTimeField(auto_now_add=True)
+    # เบอร์แบบตัวเลขล้วน (ดู core/phones.py) ไว้ให้ลูกค้า login -> ค้นด้วย unique index ตรงตัว
+    # null = ไม่มีเบอร์ / เบอร์ซ้ำกับลูกค้าคนอื่น (unique ยอมให้ null ซ้ำได้) ดูรายชื่อด้วย manage.py duplicate_phones
+    phone_normalized = models.CharField(max_length=15, unique=True, null=True, blank=True, editable=False)
+
+    objects = CustomerQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        normalized = normalize_phone(self.phone) or None
+        if (
+            normalized and normalized != self.phone_normalized
+            and Customer.objects.filter(phone_normalized=normalized).exclude(pk=self.pk).exists()
+        ):
+            # เบอร์ซ้ำกับลูกค้าคนอื่น (บันทึกไม่ผ่าน validate_unique เช่น สคริปต์ / ข้อมูลเก่า)
+            # -> เว้นว่างไว้แทนการ IntegrityError ลูกค้าคนนี้ login portal ไม่ได้ (ดู manage.py duplicate_phones)
+            logger.warning("customer #%s phone %s is already used by another customer", self.pk, normalized)
+            normalized = None
+        self.phone_normalized = normalized
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
+
+    def validate_unique(self, exclude=None):
+        # phone_normalized เป็น editable=False ModelForm (รวมหน้าแอดมิน) ไม่เช็ค unique ให้
+        # -> เช็คจากเบอร์ที่กรอกแทน เบอร์เดียวกันคนละรูปแบบจะได้เป็น error ของช่องเบอร์ ไม่ใช่ IntegrityError
+        errors = {}
+        try:
+            super().validate_unique(exclude=exclude)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        normalized = normalize_phone(self.phone)
+        if (
+            normalized and not (exclude and 'phone' in exclude)
+            and Customer.objects.filter(phone_normalized=normalized).exclude(pk=self.pk).exists()
+        ):
+            errors.setdefault('phone', []).append(ValidationError("เบอร์นี้มีลูกค้าใช้อยู่แล้ว", code='unique'))
+        if errors:
+            raise ValidationError(errors)
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
-class Dress(models.Model):
-    name = models.CharField(max_length=100, verbose_name="ชื่อชุด")
+class ProcessedImageModel(models.Model):
+    # ฐานร่วมของโมเดลที่มีรูป: บันทึกไฟล์ต้นฉบับทันที แล้วส่งไปย่อเบื้องหลัง (core/images.py)
+    IMAGE_PROCESSING = 'PROCESSING'
+    IMAGE_READY = 'READY'
+    IMAGE_FAILED = 'FAILED'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PROCESSING, 'กำลังประมวลผลรูป'),
+        (IMAGE_READY, 'พร้อมใช้งาน'),
+        (IMAGE_FAILED, 'ประมวลผลรูปไม่สำเร็จ'),
+    ]
+
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_READY,
+        editable=False, verbose_name="สถานะรูปภาพ",
+    )
+    # ความกว้างของรูปย่อที่สร้างไว้แล้ว (เช่น [96, 400, 800]) ใช้สร้าง srcset โดยไม่ต้องเปิดไฟล์
+    image_renditions = models.JSONField(default=list, blank=True, editable=False, verbose_name="ขนาดรูปย่อ")
+    # ขนาดรูปจริง + สีพื้นหลังระหว่างรอโหลด (เก็บตอนประมวลผลรูป) template จะได้จองพื้นที่ได้ถูกสัดส่วน
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_placeholder = models.CharField(max_length=7, blank=True, editable=False, verbose_name="สีพื้นหลังรูป")
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # มีไฟล์อัปโหลดใหม่ที่ยังไม่ได้เขียนลง storage -> ต้องส่งไปย่อ
+        new_upload = bool(self.image) and not self.image._committed
+        if new_upload:
+            self.image_status = self.IMAGE_PROCESSING
+            self.image_renditions = []
+            self.image_width = self.image_height = None
+            self.image_placeholder = ''
+        # บันทึกลง Database (พร้อมไฟล์ต้นฉบับ) ทันที ไม่ต้องรอย่อรูป
+        super().save(*args, **kwargs)
+        if new_upload:
+            images.enqueue(self)
+
+
+class Dress(ProcessedImageModel):
+    name = models.CharField(max_length=100, db_index=True, verbose_name="ชื่อชุด")
     image = models.ImageField(upload_to='dresses/', verbose_name="รูปภาพสินค้า")
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="ต้นทุนชุด (บาท)")
     rental_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="ราคาเช่าต่อครั้ง (บาท)")
     is_available = models.BooleanField(default=True, verbose_name="สถานะพร้อมเช่า")
 
+    # ตัวเลขสรุปจากใบจอง อัปเดตเองตอนใบจองถูกบันทึก/ลบ (core/dress_stats.py) ค่าเพี้ยน -> manage.py recount
+    times_rented = models.PositiveIntegerField(default=0, editable=False, verbose_name="เช่าไป (ครั้ง)")
+    revenue_to_date = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name="รายได้รวม")
+    deposit_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name="มัดจำรวม")
+    last_rented_on = models.DateField(null=True, blank=True, editable=False, verbose_name="เช่าล่าสุดเมื่อ")
+    next_booking_on = models.DateField(null=True, blank=True, editable=False, verbose_name="คิวถัดไป")
+
+    STATS_FIELDS = ('times_rented', 'revenue_to_date', 'deposit_total', 'last_rented_on', 'next_booking_on')
+
+    class Meta:
+        indexes = [
+            # เรียงสต็อกชุดตามความนิยม / รายได้ (มาก -> น้อย ใช้ index แบบย้อนหลัง)
+            models.Index(fields=['times_rented', 'id'], name='dress_popularity_idx'),
+            models.Index(fields=['revenue_to_date', 'id'], name='dress_revenue_idx'),
+        ]
+
     def __str__(self):
         return self.name
-    
+
+    def save(self, *args, **kwargs):
+        # แก้ข้อมูลชุด (ชื่อ/ราคา/รูป) ไม่เขียนตัวเลขสรุปทับ: ค่าในตัวแปรอาจเก่ากว่าใน DB ถ้ามีใบจองใหม่เข้ามาระหว่างนี้
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def total_revenue(self):
-        # คำนวณรายได้รวมของชุดนี้
-        rentals = self.rental_set.all()
-        return sum(r.total_price for r in rentals)
+        # ใช้ยอดที่เก็บไว้บนชุด (รวมใบจองใน archive) ไม่ต้อง query
+        return self.revenue_to_date
 
     def profit(self):
         # กำไร = รายได้รวม - ต้นทุน
         return self.total_revenue() - self.cost_price
-    
-    def save(self, *args, **kwargs):
-        # 1. เช็คว่ามีรูปไหม
-        if self.image:
-            try:
-                # เปิดรูปขึ้นมา
-                img = Image.open(self.image)
-                
-                # 🔧 แก้ปัญหาหมุนภาพ (ถ้าถ่ายจากมือถือบางทีภาพจะตะแคง)
-                if hasattr(img, '_getexif') and img._getexif():
-                    exif = dict(img._getexif().items())
-                    # รหัส 274 คือ Orientation
-                    if 274 in exif:
-                        if exif[274] == 3: img = img.rotate(180, expand=True)
-                        elif exif[274] == 6: img = img.rotate(270, expand=True)
-                        elif exif[274] == 8: img = img.rotate(90, expand=True)
-
-                # 2. แปลงเป็น RGB (เผื่อเจอไฟล์ PNG จะได้ไม่ error)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-
-                # 3. กำหนดขนาดสูงสุด (เช่น กว้างไม่เกิน 800px)
-                max_size = (800, 800) 
-                
-                # ถ้ารูปใหญ่กว่ากำหนด ให้ย่อลง
-                if img.height > 800 or img.width > 800:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                    # เตรียมเซฟทับ
-                    output = BytesIO()
-                    img.save(output, format='JPEG', quality=85) # Quality 85 ชัดแต่ไฟล์เล็ก
-                    output.seek(0)
-
-                    # เปลี่ยนชื่อไฟล์ใน Memory ให้เป็นค่าใหม่
-                    self.image = ContentFile(output.read(), name=os.path.basename(self.image.name))
-
-            except Exception as e:
-                print(f"Error resizing image: {e}")
-                # ถ้า error ก็เซฟแบบเดิมไป ไม่ต้องย่อ
-
-        # บันทึกลง Database
-        super().save(*args, **kwargs)
-    
 
-class Accessory(models.Model):
-    name = models.CharField(max_length=100, verbose_name="ชื่อเครื่องประดับ")
+
+class Accessory(ProcessedImageModel):
+    name = models.CharField(max_length=100, db_index=True, verbose_name="ชื่อเครื่องประดับ")
     image = models.ImageField(upload_to='accessories/', verbose_name="รูปภาพ", blank=True, null=True) # ✅ ต้องมีรูป
-    
 
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
-        # 1. เช็คว่ามีรูปไหม
-        if self.image:
-            try:
-                # เปิดรูปขึ้นมา
-                img = Image.open(self.image)
-                
-                # 🔧 แก้ปัญหาหมุนภาพ (ถ้าถ่ายจากมือถือบางทีภาพจะตะแคง)
-                if hasattr(img, '_getexif') and img._getexif():
-                    exif = dict(img._getexif().items())
-                    # รหัส 274 คือ Orientation
-                    if 274 in exif:
-                        if exif[274] == 3: img = img.rotate(180, expand=True)
-                        elif exif[274] == 6: img = img.rotate(270, expand=True)
-                        elif exif[274] == 8: img = img.rotate(90, expand=True)
-
-                # 2. แปลงเป็น RGB (เผื่อเจอไฟล์ PNG จะได้ไม่ error)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-
-                # 3. กำหนดขนาดสูงสุด (เช่น กว้างไม่เกิน 800px)
-                max_size = (800, 800) 
-                
-                # ถ้ารูปใหญ่กว่ากำหนด ให้ย่อลง
-                if img.height > 800 or img.width > 800:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                    # เตรียมเซฟทับ
-                    output = BytesIO()
-                    img.save(output, format='JPEG', quality=85) # Quality 85 ชัดแต่ไฟล์เล็ก
-                    output.seek(0)
-
-                    # เปลี่ยนชื่อไฟล์ใน Memory ให้เป็นค่าใหม่
-                    self.image = ContentFile(output.read(), name=os.path.basename(self.image.name))
-
-            except Exception as e:
-                print(f"Error resizing image: {e}")
-                # ถ้า error ก็เซฟแบบเดิมไป ไม่ต้องย่อ
-
-        # บันทึกลง Database
-        super().save(*args, **kwargs)
-    
+
 
 class Rental(models.Model):
     STATUS_CHOICES = [
@@ -148,6 +227,16 @@ class Rental(models.Model):
     deposit = models.DecimalField(max_digits=10, decimal_places=2, default=0, blank=True, verbose_name="ค่ามัดจำ")
     note = models.TextField(blank=True, null=True, verbose_name="หมายเหตุ")
 
+    is_archived = False   # ดู ArchivedRental
+
+    class Meta:
+        indexes = [
+            # ใช้ตอนหาใบจองที่วันที่ทับซ้อน (เช็คคิวว่าง)
+            models.Index(fields=['start_date', 'end_date', 'status'], name='rental_dates_status_idx'),
+            # ประวัติเช่าของลูกค้า (เรียงตามวันที่) + วันที่มาล่าสุดในหน้ารายชื่อลูกค้า
+            models.Index(fields=['customer', 'start_date'], name='rental_customer_start_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # ถ้าไม่ได้กรอกราคารวม ให้คำนวณอัตโนมัติ (วัน * ราคาต่อชุด)
         if not self.total_price:
@@ -158,5 +247,58 @@ class Rental(models.Model):
 
     def __str__(self):
         return f"{self.customer.name} - {self.dress.name}"
-    
+
+
+class ArchivedRental(models.Model):
+    # ใบจองเก่าที่คืนแล้ว ย้ายออกจากตาราง Rental (manage.py archive_rentals) ให้ตารางหลักเล็กลง
+    # ช่องเหมือน Rental ทุกอย่าง id เดิมตามมาด้วย อ่านรวมกับใบจองปัจจุบันได้ที่ core/archive.py
+    id = models.BigIntegerField(primary_key=True, verbose_name="เลขที่ใบจองเดิม")
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_rentals', verbose_name="ลูกค้า")
+    accessories = models.ManyToManyField(Accessory, blank=True, related_name='archived_rentals', verbose_name="เครื่องประดับที่แถม")
+    dress = models.ForeignKey(Dress, on_delete=models.CASCADE, related_name='archived_rentals', verbose_name="ชุดที่เช่า")
+    start_date = models.DateField(verbose_name="วันที่ยืม")
+    end_date = models.DateField(verbose_name="วันที่คืน")
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="ราคารวมรอบนี้")
+    status = models.CharField(max_length=10, choices=Rental.STATUS_CHOICES, default='RETURNED', verbose_name="สถานะ")
+    price_override = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="ราคาพิเศษ (ถ้ามี)")
+    deposit = models.DecimalField(max_digits=10, decimal_places=2, default=0, blank=True, verbose_name="ค่ามัดจำ")
+    note = models.TextField(blank=True, null=True, verbose_name="หมายเหตุ")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="ย้ายเข้า archive เมื่อ")
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'start_date'], name='archived_customer_start_idx'),
+            models.Index(fields=['start_date'], name='archived_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.name} - {self.dress.name}"
+
+
+class DressOccupancy(models.Model):
+    # ปฏิทินคิวชุด: 1 แถว = ชุดนี้ถูกจองในวันนี้ (อัปเดตอัตโนมัติตอน Rental ถูกบันทึก/ลบ ดู core/occupancy.py)
+    dress = models.ForeignKey(Dress, on_delete=models.CASCADE, verbose_name="ชุด")
+    rental = models.ForeignKey(Rental, on_delete=models.CASCADE, verbose_name="ใบจอง")
+    day = models.DateField(verbose_name="วันที่")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dress', 'day'], name='occupancy_dress_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dress_id} @ {self.day}"
+
+
+class DailyRevenue(models.Model):
+    # ยอดรวมรายวัน (ตามวันที่ยืม) อัปเดตแบบบวก/ลบทีละใบจองผ่าน signal ดู core/rollups.py
+    day = models.DateField(unique=True, verbose_name="วันที่")
+    booked_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="ยอดจองรวม")
+    rental_count = models.PositiveIntegerField(default=0, verbose_name="จำนวนใบจอง")
+    deposits = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="ค่ามัดจำรวม")
+
+    def __str__(self):
+        return f"{self.day}: {self.booked_total}"
 
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from .models import DressOccupancy, Rental
+
+
+def rental_days(start_date, end_date):
+    # วันที่ชุดไม่อยู่ร้าน นับรวมวันรับและวันคืน (อย่างน้อย 1 วัน)
+    span = max((end_date - start_date).days, 0)
+    return [start_date + timedelta(days=i) for i in range(span + 1)]
+
+
+def occupancy_rows(rental_id, dress_id, start_date, end_date):
+    return [
+        DressOccupancy(rental_id=rental_id, dress_id=dress_id, day=day)
+        for day in rental_days(start_date, end_date)
+    ]
+
+
+def sync_rental(rental):
+    """เขียนปฏิทินคิวของใบจองนี้ใหม่ (เรียกทุกครั้งที่ Rental ถูกบันทึก)
+
+    ใบจองที่คืนแล้ว (RETURNED) ไม่กินคิว จึงไม่มีแถวในปฏิทิน
+    ส่วนตอนลบใบจอง แถวจะถูกลบตามไปเองด้วย on_delete=CASCADE
+    """
+    DressOccupancy.objects.filter(rental_id=rental.pk).delete()
+    if rental.status != 'RETURNED':
+        DressOccupancy.objects.bulk_create(
+            occupancy_rows(rental.pk, rental.dress_id, rental.start_date, rental.end_date)
+        )
+
+
+def dress_conflict(dress_id, start_date, end_date, exclude_rental_id=None):
+    """คืนใบจอง (พร้อมลูกค้า) ที่จองชุดนี้ทับช่วงวันที่ หรือ None ถ้าชุดว่าง"""
+    busy = DressOccupancy.objects.filter(dress_id=dress_id, day__range=(start_date, end_date))
+    if exclude_rental_id is not None:
+        busy = busy.exclude(rental_id=exclude_rental_id)
+    hit = busy.select_related('rental__customer').order_by('day').first()
+    return hit.rental if hit else None
+
+
+def rebuild(batch_size=1000):
+    """ล้างปฏิทินแล้วสร้างใหม่จากใบจองทั้งหมด (ใช้กับคำสั่ง rebuild_occupancy)"""
+    DressOccupancy.objects.all().delete()
+    rentals = Rental.objects.exclude(status='RETURNED').values_list(
+        'id', 'dress_id', 'start_date', 'end_date'
+    )
+    batch = []
+    total = 0
+    for rental_id, dress_id, start_date, end_date in rentals.iterator(chunk_size=batch_size):
+        batch.extend(occupancy_rows(rental_id, dress_id, start_date, end_date))
+        if len(batch) >= batch_size:
+            DressOccupancy.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        DressOccupancy.objects.bulk_create(batch)
+        total += len(batch)
+    return total
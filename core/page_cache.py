@@ -0,0 +1,106 @@
+"""cache ทั้งหน้าสำหรับคนที่ยังไม่ได้ login (เช่น หน้าแรกที่คนกดมาจากโซเชียล)
+
+key ผูกกับเลขเวอร์ชันแคตตาล็อก (core/cache_versions.py) -> แก้/ลบ ชุดหรือเครื่องประดับเมื่อไหร่ หน้าใหม่ทันที
+แอดมิน / ลูกค้าที่ login อยู่ ไม่ผ่าน cache เลย ได้หน้าสดเสมอ
+
+ในหน้ามีฟอร์ม (csrf_token) ซึ่งต้องไม่ซ้ำกันแต่ละคน -> เก็บหน้าโดยเว้นช่อง token ไว้
+แล้วเติม token ของคนที่เปิดหน้าตอนส่งออกไป (ได้ cookie CSRF ถูกต้องเหมือนหน้าปกติ)
+"""
+import re
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from . import cache_versions
+
+CSRF_PLACEHOLDER = b'__csrf_token__'
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def is_anonymous(request):
+    return not request.user.is_authenticated and 'customer_id' not in request.session
+
+
+async def ais_anonymous(request):
+    user = await request.auser()
+    return not user.is_authenticated and not await request.session.ahas_key('customer_id')
+
+
+def cache_anonymous_page(name, skip_params=()):
+    """decorator: เก็บหน้า GET ของคนที่ไม่ได้ login ไว้ PAGE_CACHE_TIMEOUT วินาที (0 = ปิด)
+
+    query string อื่นๆ (เช่น ?fbclid= จาก Facebook) ไม่ทำให้ได้หน้าแยก ยกเว้นพารามิเตอร์ใน skip_params
+    ที่ทำให้หน้าเปลี่ยน (เช่น ?error=) -> กรณีนั้น render สดไม่เก็บ
+    ใช้ได้ทั้ง view ปกติและ async view
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not _cacheable(request, skip_params) or not await ais_anonymous(request):
+                    return await view(request, *args, **kwargs)
+                # ใช้ cache แบบ async ทั้งหมด -> ไม่บล็อก event loop ระหว่างคุยกับ cache
+                key = _page_key(name, request, await cache_versions.aget(cache_versions.CATALOG))
+                cached = _cached_response(request, await cache.aget(key))
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                entry = _entry(response)
+                if entry is not None:
+                    await cache.aset(key, entry, settings.PAGE_CACHE_TIMEOUT)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request, skip_params) or not is_anonymous(request):
+                return view(request, *args, **kwargs)
+            key = _page_key(name, request, cache_versions.get(cache_versions.CATALOG))
+            cached = _cached_response(request, cache.get(key))
+            if cached is not None:
+                return cached
+            response = view(request, *args, **kwargs)
+            entry = _entry(response)
+            if entry is not None:
+                cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def _cacheable(request, skip_params):
+    return (settings.PAGE_CACHE_TIMEOUT and request.method == 'GET'
+            and not any(param in request.GET for param in skip_params))
+
+
+def _page_key(name, request, catalog_version):
+    return f"page:{name}:{catalog_version}:{request.path}"
+
+
+def _cached_response(request, cached):
+    if cached is None:
+        return None
+    content, content_type = cached
+    response = HttpResponse(_fill_csrf(request, content), content_type=content_type)
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def _entry(response):
+    """สิ่งที่จะเก็บลง cache ของหน้านี้ (None = ไม่เก็บ) -> ตัวเรียกเป็นคน set เอง (sync/async)"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    content = _CSRF_INPUT.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+    response['X-Page-Cache'] = 'miss'
+    return content, response['Content-Type']
+
+
+def _fill_csrf(request, content):
+    if CSRF_PLACEHOLDER not in content:
+        return content
+    # get_token() บอก CsrfViewMiddleware ให้ตั้ง cookie ให้คนนี้ด้วย (ถ้ายังไม่มี)
+    return content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
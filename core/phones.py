@@ -0,0 +1,14 @@
+"""เบอร์โทรรูปแบบเดียว ใช้เทียบ/ค้นหา: เหลือแต่ตัวเลข และ +66 / 66 นำหน้า -> 0
+
+"081-234-5678", "081 234 5678", "+66 81 234 5678" -> "0812345678"
+"""
+import re
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(raw):
+    digits = _NON_DIGITS.sub('', raw or '')
+    if digits.startswith('66') and len(digits) in (10, 11):
+        digits = '0' + digits[2:]
+    return digits
@@ -0,0 +1,207 @@
+"""profile request จริงบน production ได้โดยไม่ต้อง deploy ใหม่
+
+สั่ง profile ได้ 2 แบบ:
+- แอดมิน (is_staff) ใส่ ?_profile=1 ต่อท้าย url หรือส่ง header X-Profile: 1
+  (ค่า cprofile / sample เลือกวิธีได้ ค่าอื่นใช้ PROFILE_MODE)
+- สุ่ม 1 ใน PROFILE_SAMPLE_RATE request ของทุกคน (0 = ไม่สุ่ม)
+
+วิธี profile:
+- cprofile: เก็บทุก function call -> ไฟล์ .prof (เปิดด้วย snakeviz / python -m pstats) ละเอียดแต่ช้าลงพอสมควร
+- sample: thread แยกแอบดู stack ของ request ทุก PROFILE_SAMPLE_INTERVAL_MS -> ไฟล์ .collapsed
+  (รูปแบบของ flamegraph.pl / speedscope) กระทบความเร็วน้อย เหมาะกับสุ่มเก็บ
+
+ไฟล์อยู่ใน PROFILE_DIR เก็บแค่ PROFILE_KEEP ไฟล์ล่าสุด ดูรายการได้ที่หน้า /profiles/ (แอดมิน)
+async view: profile ได้เฉพาะงานใน event loop (query ที่ ORM ส่งไปทำใน thread อื่นจะไม่เห็นใน cprofile)
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+MODES = ('cprofile', 'sample')
+EXTENSIONS = {'cprofile': '.prof', 'sample': '.collapsed'}
+_SLUG = re.compile(r'[^A-Za-z0-9]+')
+
+
+def _requested_mode(request):
+    value = request.GET.get('_profile') or request.headers.get('X-Profile')
+    if not value:
+        return None
+    return value if value in MODES else settings.PROFILE_MODE
+
+
+def _sampled():
+    rate = settings.PROFILE_SAMPLE_RATE
+    return bool(rate) and random.randrange(rate) == 0
+
+
+class Sampler:
+    """แอบดู stack ของ thread หนึ่งเป็นระยะ นับว่าแต่ละ stack เจอกี่ครั้ง"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _filename(request, mode, elapsed_ms):
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    slug = _SLUG.sub('-', request.path).strip('-')[:60] or 'root'
+    return f"{stamp}_{request.method}_{slug}_{elapsed_ms:.0f}ms{EXTENSIONS[mode]}"
+
+
+def _save(request, mode, profiler, elapsed_ms):
+    folder = settings.PROFILE_DIR
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, _filename(request, mode, elapsed_ms))
+    if mode == 'cprofile':
+        profiler.dump_stats(path)
+    else:
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(profiler.collapsed())
+    _rotate(folder)
+    return path
+
+
+def _rotate(folder):
+    # เก็บแค่ PROFILE_KEEP ไฟล์ใหม่สุด (ชื่อไฟล์ขึ้นต้นด้วยเวลา เรียงชื่อ = เรียงเวลา)
+    for name in list_profiles(folder)[settings.PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles(folder=None):
+    """ชื่อไฟล์ profile ใหม่สุดก่อน"""
+    folder = folder or settings.PROFILE_DIR
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if name.endswith(tuple(EXTENSIONS.values()))), reverse=True)
+
+
+def top_functions(path, limit=10):
+    """function ที่กินเวลามากสุดของไฟล์ profile [(ชื่อ, ค่า)] (.prof = เวลารวม ms, .collapsed = จำนวน sample ที่อยู่บนสุดของ stack)"""
+    if path.endswith('.prof'):
+        stats = pstats.Stats(path, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]  # tottime
+        return [(f"{func} ({os.path.basename(filename)}:{line})", round(tottime * 1000, 2))
+                for (filename, line, func), (_, _, tottime, _, _) in rows]
+    leaves = Counter()
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            leaves[stack.rsplit(';', 1)[-1]] += int(count)
+    return leaves.most_common(limit)
+
+
+def _start(mode):
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: เปิด cProfile ได้ทีละตัวทั้ง process (อีก request กำลัง profile อยู่) -> ข้าม
+            return None
+        return profiler
+    sampler = Sampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    return sampler.__enter__()
+
+
+def _stop(mode, profiler):
+    if mode == 'cprofile':
+        profiler.disable()
+    else:
+        profiler.__exit__(None, None, None)
+
+
+def _finish(request, response, mode, profiler, started, is_staff):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _stop(mode, profiler)
+    path = _save(request, mode, profiler, elapsed_ms)
+    # ชื่อไฟล์บอกแค่แอดมิน (คนทั่วไปที่ถูกสุ่ม profile ไม่ต้องรู้ว่ามีไฟล์อะไรบนเซิร์ฟเวอร์)
+    if is_staff:
+        response['X-Profile-File'] = os.path.basename(path)
+    return response
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    # ต้องอยู่หลัง AuthenticationMiddleware (ดู is_staff)
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            mode = _requested_mode(request)
+            if mode is not None and not (await request.auser()).is_staff:
+                mode = None
+            if mode is None and _sampled():
+                mode = settings.PROFILE_MODE
+            if mode is None:
+                return await get_response(request)
+            started = time.perf_counter()
+            profiler = _start(mode)
+            if profiler is None:
+                return await get_response(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _stop(mode, profiler)
+                raise
+            is_staff = (await request.auser()).is_staff
+            return _finish(request, response, mode, profiler, started, is_staff)
+    else:
+        def middleware(request):
+            mode = _requested_mode(request)
+            if mode is not None and not request.user.is_staff:
+                mode = None
+            if mode is None and _sampled():
+                mode = settings.PROFILE_MODE
+            if mode is None:
+                return get_response(request)
+            started = time.perf_counter()
+            profiler = _start(mode)
+            if profiler is None:
+                return get_response(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _stop(mode, profiler)
+                raise
+            return _finish(request, response, mode, profiler, started, request.user.is_staff)
+    return middleware
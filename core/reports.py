@@ -0,0 +1,156 @@
+"""รายงานวิเคราะห์ร้าน: ชุดไหนถูกใช้คุ้ม คืนทุนเมื่อไหร่ รายได้รายเดือน ของแถมยอดนิยม
+
+ดึงใบจองจาก DB รอบเดียว (values_list + iterator ไม่สร้าง model object) ลง numpy array
+แล้วคำนวณทุกตัวเลขแบบ vectorized ทีเดียวทั้งก้อน แทนการวนลูปทีละชุด/ทีละใบจอง
+ผลลัพธ์เก็บใน cache ตามเลขเวอร์ชันข้อมูล (core/cache_versions.py) -> เปิดหน้าซ้ำไม่ต้องคำนวณใหม่จนกว่าข้อมูลจะเปลี่ยน
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import cache_versions
+from .archive import RentalHistory
+from .models import Accessory, ArchivedRental, Dress, Rental, charged_price_expression
+
+CHUNK_SIZE = 2000
+
+RENTAL_DTYPE = [
+    ('dress', 'i8'),
+    ('start', 'datetime64[D]'),
+    ('end', 'datetime64[D]'),
+    ('price', 'f8'),
+]
+
+
+def _rental_array():
+    # ใบจองปัจจุบัน + ใบจองเก่าใน archive (core/archive.py) รายได้ = ราคาที่เก็บจริง
+    rows = RentalHistory().values_list('dress_id', 'start_date', 'end_date', charged_price_expression())
+    return np.fromiter(rows.iterator(chunk_size=CHUNK_SIZE), dtype=RENTAL_DTYPE)
+
+
+def _accessory_ids():
+    ids = []
+    for model in (Rental, ArchivedRental):
+        rows = model.accessories.through.objects.values_list('accessory_id', flat=True)
+        ids.append(np.fromiter(rows.iterator(chunk_size=CHUNK_SIZE), dtype='i8'))
+    return np.concatenate(ids)
+
+
+def dress_stats(rentals, dresses, today):
+    """ต่อชุด: วันที่ถูกจอง / วันที่มีชุดนี้ในร้าน, รายได้, ระยะคืนทุนเทียบกับต้นทุน
+
+    ร้านไม่ได้เก็บวันที่ซื้อชุด จึงนับ "วันที่มีชุด" ตั้งแต่วันเริ่มเช่าครั้งแรก
+    ถึงวันนี้ (หรือวันคืนของคิวที่ไกลสุด ถ้าเลยวันนี้ไป)
+    """
+    ids = np.array([d[0] for d in dresses], dtype='i8')
+    cost = np.array([float(d[2]) for d in dresses], dtype='f8')
+    n = len(ids)
+
+    # แปลง dress_id ของแต่ละใบจอง -> ตำแหน่งใน ids (ids เรียงตาม id มาแล้ว)
+    # ใบจองที่ชุดหายไประหว่างดึงข้อมูล (ถูกลบพอดี) ตัดทิ้ง
+    idx = np.searchsorted(ids, rentals['dress']).clip(max=max(n - 1, 0))
+    known = ids[idx] == rentals['dress'] if n else np.zeros(len(rentals), dtype=bool)
+    idx, rentals = idx[known], rentals[known]
+
+    day_span = (rentals['end'] - rentals['start']).astype('i8').clip(min=0) + 1
+    booked_days = np.bincount(idx, weights=day_span, minlength=n)
+    revenue = np.bincount(idx, weights=rentals['price'], minlength=n)
+    count = np.bincount(idx, minlength=n)
+
+    never = np.datetime64('9999-12-31')
+    first = np.full(n, never, dtype='datetime64[D]')
+    np.minimum.at(first, idx, rentals['start'])
+    last = np.full(n, np.datetime64(today), dtype='datetime64[D]')
+    np.maximum.at(last, idx, rentals['end'])
+
+    rented = count > 0
+    owned_days = np.where(rented, (last - first).astype('i8') + 1, 0)
+    safe_owned = np.maximum(owned_days, 1)
+    utilisation = np.where(rented, np.minimum(booked_days / safe_owned, 1.0), 0.0)
+    daily_revenue = revenue / safe_owned
+    remaining = cost - revenue
+    paid_back = remaining <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_to_payback = np.where(daily_revenue > 0, remaining / daily_revenue, np.inf)
+
+    result = []
+    for i, (pk, name, _) in enumerate(dresses):
+        result.append({
+            'id': int(pk),
+            'name': name,
+            'rental_count': int(count[i]),
+            'booked_days': int(booked_days[i]),
+            'owned_days': int(owned_days[i]),
+            'utilisation': float(utilisation[i]),
+            'revenue': float(revenue[i]),
+            'cost': float(cost[i]),
+            'paid_back': bool(paid_back[i]),
+            # ต้องเช่าอีกประมาณกี่วัน (ตามอัตรารายได้เฉลี่ยที่ผ่านมา) ถึงจะคืนทุน; None = ยังไม่เคยมีรายได้
+            'days_to_payback': (
+                0 if paid_back[i]
+                else int(np.ceil(days_to_payback[i])) if np.isfinite(days_to_payback[i])
+                else None
+            ),
+        })
+    result.sort(key=lambda row: row['utilisation'], reverse=True)
+    return result
+
+
+def monthly_revenue(rentals):
+    """รายได้ + จำนวนใบจอง ต่อเดือน (นับตามเดือนที่เริ่มเช่า) เรียงตามเดือน"""
+    if not len(rentals):
+        return []
+    months, inverse = np.unique(rentals['start'].astype('datetime64[M]'), return_inverse=True)
+    revenue = np.bincount(inverse, weights=rentals['price'])
+    count = np.bincount(inverse)
+    return [
+        {'month': str(month), 'revenue': float(revenue[i]), 'rental_count': int(count[i])}
+        for i, month in enumerate(months)
+    ]
+
+
+def accessory_popularity(accessory_ids, accessories):
+    """จำนวนครั้งที่เครื่องประดับแต่ละชิ้นถูกหยิบไปกับใบจอง มาก -> น้อย"""
+    picked, counts = np.unique(accessory_ids, return_counts=True)
+    picked_count = dict(zip(picked.tolist(), counts.tolist()))
+    result = [
+        {'id': pk, 'name': name, 'count': picked_count.get(pk, 0)}
+        for pk, name in accessories
+    ]
+    result.sort(key=lambda row: row['count'], reverse=True)
+    return result
+
+
+def build_report(today=None):
+    today = today or timezone.now().date()
+    rentals = _rental_array()
+    dresses = list(Dress.objects.order_by('id').values_list('id', 'name', 'cost_price'))
+    accessories = list(Accessory.objects.order_by('id').values_list('id', 'name'))
+    return {
+        'today': today,
+        'rental_count': int(len(rentals)),
+        'total_revenue': float(rentals['price'].sum()),
+        'dresses': dress_stats(rentals, dresses, today),
+        'monthly': monthly_revenue(rentals),
+        'accessories': accessory_popularity(_accessory_ids(), accessories),
+    }
+
+
+def cache_key(today):
+    return "report:{}:{}:{}".format(
+        cache_versions.get(cache_versions.RENTALS),
+        cache_versions.get(cache_versions.CATALOG),
+        today.isoformat(),
+    )
+
+
+def get_report(today=None, refresh=False):
+    """รายงานจาก cache ถ้าข้อมูลยังไม่เปลี่ยน ไม่งั้นคำนวณใหม่แล้วเก็บไว้"""
+    today = today or timezone.now().date()
+    key = cache_key(today)
+    report = None if refresh else cache.get(key)
+    if report is None:
+        report = build_report(today)
+        cache.set(key, report, settings.REPORT_CACHE_TIMEOUT)
+    return report
@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedRental, DailyRevenue, Rental, charged_price, charged_price_expression
+
+
+def rental_state(rental):
+    """ค่าของใบจองที่มีผลกับยอดรายวัน: (วันที่ยืม, ราคาที่เก็บจริง, มัดจำ)"""
+    return (rental.start_date, charged_price(rental), rental.deposit or 0)
+
+
+def _bump(day, total, count, deposit):
+    # บวกเพิ่มด้วย F() ใน DB ตรงๆ สองคนบันทึกพร้อมกันก็ไม่ทับกัน
+    changes = {
+        'booked_total': F('booked_total') + total,
+        'rental_count': F('rental_count') + count,
+        'deposits': F('deposits') + deposit,
+    }
+    if DailyRevenue.objects.filter(day=day).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(day=day, booked_total=total, rental_count=count, deposits=deposit)
+    except IntegrityError:
+        # อีก request สร้างแถววันนี้ไปก่อนแล้ว -> บวกเพิ่มแทน
+        DailyRevenue.objects.filter(day=day).update(**changes)
+
+
+def apply_change(old_state, new_state):
+    """ย้ายยอดของใบจองหนึ่งใบจาก old_state ไป new_state (None = ไม่มี เช่นตอนสร้างใหม่ / ตอนลบ)"""
+    if old_state == new_state:
+        return
+    if old_state is not None:
+        day, total, deposit = old_state
+        _bump(day, -total, -1, -deposit)
+    if new_state is not None:
+        day, total, deposit = new_state
+        _bump(day, total, 1, deposit)
+
+
+def income_summary(today):
+    """ยอดจองของสัปดาห์ / เดือน / ปี ที่ today อยู่ (รวมคิวล่วงหน้าในช่วงนั้นด้วย) ใน query เดียว"""
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    year_start = date(today.year, 1, 1)
+    year_end = date(today.year + 1, 1, 1)
+
+    def total_between(start, end):
+        return Coalesce(Sum('booked_total', filter=Q(day__gte=start, day__lt=end)), Value(0), output_field=DailyRevenue._meta.get_field('booked_total'))
+
+    return DailyRevenue.objects.filter(
+        day__gte=min(week_start, year_start), day__lt=max(week_end, year_end),
+    ).aggregate(
+        week=total_between(week_start, week_end),
+        month=total_between(month_start, month_end),
+        year=total_between(year_start, year_end),
+    )
+
+
+def rebuild():
+    """คำนวณตารางยอดรายวันใหม่ทั้งหมดจากใบจอง รวมใบจองใน archive (ใช้กับคำสั่ง rebuild_rollups)"""
+    days = {}
+    for model in (Rental, ArchivedRental):
+        rows = (
+            model.objects.order_by()
+            .values('start_date')
+            .annotate(total=Sum(charged_price_expression()), count=Count('id'), deposit_total=Sum('deposit'))
+        )
+        for row in rows.iterator():
+            day = days.setdefault(row['start_date'], DailyRevenue(day=row['start_date']))
+            day.booked_total += row['total'] or 0
+            day.rental_count += row['count']
+            day.deposits += row['deposit_total'] or 0
+    DailyRevenue.objects.all().delete()
+    return len(DailyRevenue.objects.bulk_create(days.values()))
@@ -0,0 +1,130 @@
+"""สร้างข้อมูลสมมติจำนวนมาก (ลูกค้า / ชุด / เครื่องประดับ / ใบจอง) ไว้วัดความเร็ว
+
+ใช้ bulk_create ทีละก้อน จึงไม่ผ่าน save() / signal -> เติมค่าที่ save() ปกติทำให้เอง
+(phone_normalized, total_price) แล้วสร้างปฏิทินคิว + ยอดรายวัน + ตัวเลขของชุดใหม่ และ bump เลขเวอร์ชัน cache ตอนจบ
+
+ใบจองของชุดเดียวกันเรียงต่อกันไม่ทับวัน และเครื่องประดับแต่ละชิ้นไม่ถูกจองซ้อนช่วงเดียวกัน
+(ข้อมูลผ่านกฎเดียวกับที่หน้าจองเช็ค)
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from . import cache_versions, dress_stats, images, occupancy, rollups
+from .models import Accessory, Customer, Dress, Rental
+from .phones import normalize_phone
+
+BATCH_SIZE = 1000
+SLOT_DAYS = 4   # ชุดหนึ่งถูกเช่ารอบละไม่เกิน 3 วัน + พักซัก 1 วัน
+
+FIRST_NAMES = ['สมหญิง', 'สมศรี', 'มาลี', 'กานดา', 'พิมพ์ชนก', 'ณัฐธิดา', 'อรอุมา', 'วราภรณ์', 'ชลธิชา', 'ปวีณา']
+LAST_NAMES = ['ใจดี', 'รักไทย', 'ทองคำ', 'ศรีสุข', 'แสงงาม', 'บุญมา', 'พรหมมา', 'วงศ์ใหญ่']
+DRESS_STYLES = ['ชุดไทยจักรี', 'ชุดไทยบรมพิมาน', 'ชุดราตรี', 'ชุดเจ้าสาว', 'ชุดหมั้น', 'ชุดไทยศิวาลัย']
+DRESS_COLOURS = ['ชมพู', 'ทอง', 'ขาว', 'แดง', 'ม่วง', 'ฟ้า', 'เขียว']
+ACCESSORY_KINDS = ['ต่างหู', 'สร้อยคอ', 'กำไล', 'ปิ่นปักผม', 'เข็มขัด', 'มงกุฎ']
+
+
+def _images(folder, count, rng):
+    """สร้างรูป JPEG เล็กๆ count รูปลง storage พร้อมรูปย่อ คืน [(ชื่อไฟล์, ค่าที่ต้องเก็บลงโมเดล)]"""
+    made = []
+    for i in range(count):
+        colour = tuple(rng.randrange(120, 256) for _ in range(3))
+        buffer = BytesIO()
+        Image.new('RGB', (480, 640), colour).save(buffer, format='JPEG', quality=80)
+        name = default_storage.save(f"{folder}/seed_{i}.jpg", ContentFile(buffer.getvalue()))
+        _, fields = images.process_stored(name)
+        made.append((name, fields))
+    return made
+
+
+def _free_phones(count):
+    """เบอร์ 09xxxxxxxx ที่ยังไม่มีลูกค้าใช้ count เบอร์ เริ่มต่อจาก id ล่าสุด
+
+    นับจาก count() ไม่ได้: ลบลูกค้าไปแล้วจำนวนจะลดลง เบอร์ที่ได้ชนกับลูกค้าที่ยังอยู่ (phone_normalized ห้ามซ้ำ)
+    เช็คทีละก้อนด้วยช่วงเบอร์ (ยาวเท่ากันทุกเบอร์ เรียงแบบข้อความได้) ข้ามเบอร์ที่มีคนใช้แล้ว
+    """
+    number = Customer.objects.aggregate(last=Max('id'))['last'] or 0
+    phones = []
+    while len(phones) < count:
+        batch = [f"09{n:08d}" for n in range(number, number + min(count - len(phones), BATCH_SIZE))]
+        taken = set(
+            Customer.objects.filter(phone_normalized__range=(batch[0], batch[-1]))
+            .values_list('phone_normalized', flat=True)
+        )
+        phones += [phone for phone in batch if phone not in taken]
+        number += len(batch)
+    return phones
+
+
+def seed(customers, dresses, rentals, accessories=None, image_count=12, seed=0, today=None):
+    """สร้างข้อมูลแล้วคืนจำนวนที่สร้างของแต่ละแบบ (ควรเรียกใน transaction.atomic())"""
+    rng = random.Random(seed)
+    today = today or timezone.now().date()
+    accessories = accessories if accessories is not None else max(10, dresses // 2)
+
+    phones = _free_phones(customers)
+    customer_ids = [customer.id for customer in Customer.objects.bulk_create(
+        [Customer(name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", phone=phone,
+                  phone_normalized=normalize_phone(phone)) for phone in phones],
+        batch_size=BATCH_SIZE,
+    )]
+
+    dress_images = _images('dresses', min(image_count, dresses), rng) if dresses else []
+    dress_objs = []
+    for i in range(dresses):
+        name, fields = dress_images[i % len(dress_images)] if dress_images else ('', {})
+        cost = Decimal(rng.randrange(20, 200) * 100)
+        dress_objs.append(Dress(
+            name=f"{rng.choice(DRESS_STYLES)} {rng.choice(DRESS_COLOURS)} #{i + 1}",
+            image=name, cost_price=cost, rental_price=(cost / 8).quantize(Decimal('1')), **fields,
+        ))
+    dress_objs = Dress.objects.bulk_create(dress_objs, batch_size=BATCH_SIZE)
+
+    acc_images = _images('accessories', min(image_count, accessories), rng) if accessories else []
+    acc_objs = []
+    for i in range(accessories):
+        name, fields = acc_images[i % len(acc_images)] if acc_images else (None, {})
+        acc_objs.append(Accessory(name=f"{rng.choice(ACCESSORY_KINDS)} #{i + 1}", image=name, **fields))
+    acc_objs = Accessory.objects.bulk_create(acc_objs, batch_size=BATCH_SIZE)
+
+    # ใบจองที่ k: ชุด k % M ช่วงที่ k // M -> ชุดเดียวกันไม่ทับวัน ราวครึ่งหนึ่งเป็นอดีต (คืนแล้ว) ที่เหลือเป็นคิวข้างหน้า
+    slots = -(-rentals // max(dresses, 1))
+    first_day = today - timedelta(days=SLOT_DAYS * (slots // 2))
+    rental_objs = []
+    for k in range(rentals if dresses and customers else 0):
+        dress = dress_objs[k % dresses]
+        start = first_day + timedelta(days=SLOT_DAYS * (k // dresses))
+        end = start + timedelta(days=rng.randrange(0, SLOT_DAYS - 1))
+        status = 'RETURNED' if end < today else 'ACTIVE' if start <= today else 'BOOKED'
+        rental_objs.append(Rental(
+            customer_id=rng.choice(customer_ids), dress=dress, start_date=start, end_date=end,
+            total_price=dress.rental_price, deposit=Decimal(rng.choice([0, 500, 1000])), status=status,
+        ))
+    rental_objs = Rental.objects.bulk_create(rental_objs, batch_size=BATCH_SIZE)
+
+    # ของแถม 0-2 ชิ้น: ใบจองในช่วงเดียวกันใช้เครื่องประดับคนละชิ้นกันเสมอ (ชิ้นที่ i และ i + M ของช่วงนั้น)
+    through = Rental.accessories.through
+    links = []
+    for k, rental in enumerate(rental_objs):
+        position = k % dresses
+        for index in (position, position + dresses)[:rng.randrange(0, 3)]:
+            if index < len(acc_objs):
+                links.append(through(rental_id=rental.id, accessory_id=acc_objs[index].id))
+    through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+    occupancy.rebuild(batch_size=BATCH_SIZE)
+    rollups.rebuild()
+    dress_stats.rebuild(batch_size=BATCH_SIZE)
+    cache_versions.bump(cache_versions.RENTALS)
+    cache_versions.bump(cache_versions.CATALOG)
+    return {
+        'customers': customers, 'dresses': dresses, 'accessories': accessories,
+        'rentals': len(rental_objs), 'rental_accessories': len(links),
+    }
@@ -0,0 +1,75 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import archive, cache_versions, dress_stats, occupancy, rollups
+from .models import Accessory, ArchivedRental, Dress, Rental
+
+
+@receiver(pre_save, sender=Rental)
+def rental_saving(sender, instance, raw=False, **kwargs):
+    # อ่านค่าเดิมใน DB ก่อนบันทึก (query เดียว) เทียบทีหลังว่ายอดรายวัน / ตัวเลขของชุด ต้องย้ายจากไหนไปไหน
+    if raw:
+        return
+    instance._rollup_state = instance._dress_stats_state = None
+    if not instance._state.adding:
+        stored = Rental.objects.filter(pk=instance.pk).only(
+            'dress', 'start_date', 'status', 'total_price', 'price_override', 'deposit',
+        ).first()
+        if stored is not None:
+            instance._rollup_state = rollups.rental_state(stored)
+            instance._dress_stats_state = dress_stats.rental_state(stored)
+
+
+@receiver(post_save, sender=Rental)
+def rental_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # อัปเดตปฏิทินคิวชุด (วันที่/ชุด/สถานะ อาจเปลี่ยน)
+    occupancy.sync_rental(instance)
+    # อัปเดตยอดรายวัน (วันที่/ราคา/มัดจำ อาจเปลี่ยน)
+    rollups.apply_change(instance._rollup_state, rollups.rental_state(instance))
+    # อัปเดตตัวเลขของชุด (เช่ากี่ครั้ง / รายได้ / คิวถัดไป)
+    dress_stats.apply_change(instance._dress_stats_state, dress_stats.rental_state(instance))
+    cache_versions.bump(cache_versions.RENTALS)
+
+
+@receiver(pre_delete, sender=Rental)
+def rental_deleting(sender, instance, **kwargs):
+    instance._rollup_state = rollups.rental_state(instance)
+    instance._dress_stats_state = dress_stats.rental_state(instance)
+
+
+@receiver(post_delete, sender=Rental)
+def rental_deleted(sender, instance, **kwargs):
+    # ย้ายเข้า archive ไม่ใช่ยกเลิกใบจอง -> ยอดรายวัน / ตัวเลขของชุด ยังนับอยู่ (core/archive.py)
+    if archive.is_moving():
+        return
+    rollups.apply_change(instance._rollup_state, None)
+    dress_stats.apply_change(instance._dress_stats_state, None)
+    cache_versions.bump(cache_versions.RENTALS)
+
+
+@receiver(post_delete, sender=ArchivedRental)
+def archived_rental_deleted(sender, instance, **kwargs):
+    # ใบจองใน archive ยังนับอยู่ในยอดรายวัน / ตัวเลขของชุด -> ถูกลบตามลูกค้า/ชุด (cascade) ก็ต้องหักออกเหมือนใบจองปกติ
+    rollups.apply_change(rollups.rental_state(instance), None)
+    dress_stats.apply_change(dress_stats.rental_state(instance), None)
+    cache_versions.bump(cache_versions.RENTALS)
+
+
+@receiver(m2m_changed, sender=Rental.accessories.through)
+def rental_accessories_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache_versions.bump(cache_versions.RENTALS)
+
+
+@receiver(post_save, sender=Dress)
+@receiver(post_delete, sender=Dress)
+@receiver(post_save, sender=Accessory)
+@receiver(post_delete, sender=Accessory)
+def catalog_changed(sender, **kwargs):
+    cache_versions.bump(cache_versions.CATALOG)
+    # bump ซ้ำตอน commit: process อื่นที่โหลดแคตตาล็อกระหว่างนี้ยังเห็นข้อมูลก่อน commit
+    # ถ้าไม่ขยับเลขอีกรอบ มันจะจำของเก่าไว้ใต้เลขใหม่ (core/catalog.py)
+    transaction.on_commit(lambda: cache_versions.bump(cache_versions.CATALOG))
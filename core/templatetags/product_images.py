@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from core import images
+from core.catalog import CatalogItem
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(obj, sizes="100vw", alt="", css_class="", style="", loading="lazy"):
+    """<picture> ที่มี srcset ของรูปย่อ WebP/JPEG ให้เบราว์เซอร์เลือกขนาดที่พอดีเอง
+
+    ใช้: {% responsive_image dress sizes="40px" css_class="rounded-circle" %}
+    ถ้ารูปยังไม่มีรูปย่อ (กำลังประมวลผล / รูปเก่า) จะใช้ไฟล์หลักแทน
+    รับได้ทั้ง model และ CatalogItem จาก core/catalog.py (ที่คำนวณ url ไว้แล้ว)
+    """
+    if isinstance(obj, CatalogItem):
+        image_url, renditions = obj.image_url, obj.renditions
+    else:
+        image = obj.image
+        image_url = image.url
+        renditions = images.rendition_urls(image.storage, image.name, obj.image_renditions)
+    # ขนาด + สีพื้นหลังที่เก็บไว้ตอนอัปโหลด: เบราว์เซอร์จองพื้นที่ได้ทันที ไม่ต้องเปิดไฟล์รูปฝั่ง server
+    attrs = format_html(
+        'alt="{}" class="{}" style="{}" loading="{}" decoding="async"',
+        alt, css_class,
+        f"background-color: {obj.image_placeholder}; {style}" if obj.image_placeholder else style,
+        loading,
+    )
+    if obj.image_width and obj.image_height:
+        attrs = format_html('{} width="{}" height="{}"', attrs, obj.image_width, obj.image_height)
+
+    if not renditions:
+        return format_html('<img src="{}" {}>', image_url, attrs)
+
+    def srcset(ext):
+        return ", ".join(f"{url} {width}w" for width, url in renditions[ext])
+
+    fallback = renditions['jpg'][-1][1]
+    sources = format_html_join(
+        "", '<source type="{}" srcset="{}" sizes="{}">',
+        ((f"image/{ext}", srcset(ext), sizes) for ext in renditions if ext != 'jpg'),
+    )
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" srcset="{}" sizes="{}" {}></picture>',
+        sources, fallback, srcset('jpg'), sizes, attrs,
+    )
@@ -1,3 +1,1540 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+from inspect import iscoroutinefunction
+from io import BytesIO, StringIO
+import json
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.forms import modelform_factory
+from django.db import connection
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.urls import reverse
+import unittest
+from unittest import mock
+from django.utils import timezone
+from PIL import Image
+
+from . import archive, benchmarks, catalog, db_tuning, exports, images, instrumentation, listing, profiling, reports
+from .forms import AccessoryForm, CustomerForm
+from .availability import accessory_conflicts, busy_accessory_ids
+from .models import Accessory, ArchivedRental, Customer, DailyRevenue, Dress, DressOccupancy, Rental
+from .rollups import income_summary
+from .occupancy import dress_conflict
+from .views import AUTOCOMPLETE_LIMIT, QUEUE_PAGE_SIZE
+
+
+def make_dress(name="ชุดทดสอบ", cost_price=1000, rental_price=500):
+    return Dress.objects.create(name=name, cost_price=cost_price, rental_price=rental_price)
+
+
+def make_upload(name="photo.png", size=(1600, 1200), fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (255, 105, 180)).save(buffer, format=fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+def make_rental(customer, dress, start=date(2026, 1, 10), end=date(2026, 1, 12), **kwargs):
+    return Rental.objects.create(customer=customer, dress=dress, start_date=start, end_date=end, **kwargs)
+
+
+class DressStatsTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="ลูกค้า", phone="0812345678")
+        self.user = User.objects.create_user('staff', password='pass')
+        self.client.force_login(self.user)
+
+    def _add_dresses(self, count):
+        # คืนแล้วทั้งหมด จะได้ไม่ไปโผล่ในคิวของ dashboard
+        for i in range(count):
+            dress = make_dress(name=f"ชุด {i}")
+            make_rental(self.customer, dress, total_price=300, status='RETURNED')
+            make_rental(self.customer, dress, total_price=200, status='RETURNED')
+
+    def _count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_profit_uses_stored_revenue(self):
+        dress = make_dress(cost_price=1000)
+        make_rental(self.customer, dress, total_price=1500, status='RETURNED')
+        self.assertEqual(Dress.objects.get(pk=dress.pk).profit(), Decimal("500"))
+        # ย้ายเข้า archive แล้วรายได้ยังนับอยู่
+        archive.archive_rentals(date(2026, 2, 1))
+        self.assertEqual(Dress.objects.get(pk=dress.pk).profit(), Decimal("500"))
+
+    def test_dress_pages_use_constant_queries(self):
+        for url_name in ('dress_list', 'dashboard'):
+            self._add_dresses(1)
+            small = self._count_queries(url_name)
+            self._add_dresses(10)
+            large = self._count_queries(url_name)
+            self.assertEqual(small, large, url_name)
+
+    def _stats(self, dress):
+        return Dress.objects.values_list(*Dress.STATS_FIELDS).get(pk=dress.pk)
+
+    @mock.patch('django.utils.timezone.localdate', return_value=date(2026, 1, 1))
+    def test_counters_follow_rental_changes(self, _today):
+        dress, other = make_dress(), make_dress(name="อีกชุด")
+        rental = make_rental(self.customer, dress, total_price=300, deposit=1000)
+        later = make_rental(self.customer, dress, start=date(2026, 3, 1), end=date(2026, 3, 2), total_price=200)
+        self.assertEqual(self._stats(dress), (2, Decimal("500"), Decimal("1000"), None, date(2026, 1, 10)))
+
+        # ราคาพิเศษ / มัดจำ / สถานะ เปลี่ยน
+        rental.price_override = Decimal("250")
+        rental.deposit = Decimal("500")
+        rental.status = 'RETURNED'
+        rental.save()
+        self.assertEqual(self._stats(dress), (2, Decimal("450"), Decimal("500"), date(2026, 1, 10), date(2026, 3, 1)))
+
+        # ย้ายไปอีกชุด แล้วลบ
+        later.dress = other
+        later.save()
+        self.assertEqual(self._stats(dress), (1, Decimal("250"), Decimal("500"), date(2026, 1, 10), None))
+        self.assertEqual(self._stats(other), (1, Decimal("200"), Decimal("0"), None, date(2026, 3, 1)))
+        rental.delete()
+        self.assertEqual(self._stats(dress), (0, Decimal("0"), Decimal("0"), None, None))
+
+    def test_editing_dress_does_not_overwrite_counters(self):
+        dress = make_dress()
+        stale = Dress.objects.get(pk=dress.pk)
+        make_rental(self.customer, dress, total_price=300)
+        stale.name = "ชุดเปลี่ยนชื่อ"
+        stale.save()
+        self.assertEqual(Dress.objects.get(pk=dress.pk).times_rented, 1)
+
+    def test_recount_fixes_drift(self):
+        dress = make_dress()
+        make_rental(self.customer, dress, total_price=300, status='ACTIVE')
+        make_dress(name="ยังไม่เคยถูกเช่า")
+        expected = self._stats(dress)
+        Dress.objects.filter(pk=dress.pk).update(times_rented=99, revenue_to_date=0, last_rented_on=None)
+
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn("1 ชุด", out.getvalue())
+        self.assertEqual(self._stats(dress), expected)
+
+    def test_next_booking_ignores_past_bookings_and_moves_on(self):
+        dress = make_dress()
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 3, 1)):
+            # ใบจองเก่าที่ค้างสถานะ BOOKED ไม่ใช่คิวถัดไป
+            make_rental(self.customer, dress, start=date(2026, 1, 10), end=date(2026, 1, 12))
+            make_rental(self.customer, dress, start=date(2026, 3, 5), end=date(2026, 3, 6))
+            make_rental(self.customer, dress, start=date(2026, 4, 5), end=date(2026, 4, 6))
+        self.assertEqual(self._stats(dress)[4], date(2026, 3, 5))
+
+        # วันผ่านไปโดยไม่มีใบจองเปลี่ยน -> recount --next-bookings เลื่อนให้
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 3, 10)):
+            out = StringIO()
+            call_command('recount', next_bookings=True, stdout=out)
+        self.assertIn("1 ชุด", out.getvalue())
+        self.assertEqual(self._stats(dress)[4], date(2026, 4, 5))
+
+    def test_dress_list_sorts_by_stored_columns(self):
+        popular, rich = make_dress(name="ชุดฮิต"), make_dress(name="ชุดแพง")
+        make_dress(name="ชุดเงียบ")
+        for _ in range(3):
+            make_rental(self.customer, popular, total_price=100)
+        make_rental(self.customer, rich, total_price=5000)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dress_list'), {'sort': 'popular'})
+        self.assertEqual([d.name for d in response.context['dresses']], ["ชุดฮิต", "ชุดแพง", "ชุดเงียบ"])
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in ctx.captured_queries))
+
+        response = self.client.get(reverse('dress_list'), {'sort': 'revenue'})
+        self.assertEqual([d.name for d in response.context['dresses']], ["ชุดแพง", "ชุดฮิต", "ชุดเงียบ"])
+
+
+class DashboardQueueTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="ลูกค้า", phone="0812345678")
+        self.accessories = [Accessory.objects.create(name=f"ต่างหู {i}") for i in range(3)]
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        self.today = timezone.now().date()
+
+    def _add_open_rentals(self, count, offset_days=0):
+        for _ in range(count):
+            dress = make_dress()
+            rental = make_rental(
+                Customer.objects.create(name="ลูกค้า", phone=f"09{Customer.objects.count():08d}"), dress,
+                start=self.today + timedelta(days=offset_days),
+                end=self.today + timedelta(days=offset_days + 2),
+            )
+            rental.accessories.set(self.accessories)
+
+    def _count_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_queue_queries_do_not_grow_with_rows(self):
+        self._add_open_rentals(2)
+        small, _ = self._count_queries()
+        self._add_open_rentals(8)
+        large, _ = self._count_queries()
+        self.assertEqual(small, large)
+
+    def test_queue_is_paginated(self):
+        self._add_open_rentals(QUEUE_PAGE_SIZE + 5)
+        _, response = self._count_queries()
+        self.assertEqual(len(response.context['upcoming_rentals']), QUEUE_PAGE_SIZE)
+        _, response = self._count_queries(page=2)
+        self.assertEqual(len(response.context['upcoming_rentals']), 5)
+
+    def test_date_window_filters_far_bookings(self):
+        self._add_open_rentals(2)
+        self._add_open_rentals(3, offset_days=60)
+        _, response = self._count_queries(days=7)
+        self.assertEqual(response.context['upcoming_rentals'].paginator.count, 2)
+        _, response = self._count_queries()
+        self.assertEqual(response.context['upcoming_rentals'].paginator.count, 5)
+
+
+class AccessoryAvailabilityTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="คุณเอ", phone="0811111111")
+        self.dress = make_dress()
+        self.earring, self.necklace, self.bag = [
+            Accessory.objects.create(name=name) for name in ("ต่างหู", "สร้อย", "กระเป๋า")
+        ]
+        self.booking = make_rental(self.customer, self.dress, start=date(2026, 3, 10), end=date(2026, 3, 12))
+        self.booking.accessories.set([self.earring, self.necklace])
+
+    def _add_history(self, count):
+        # ประวัติเก่าที่คืนแล้ว + ใบจองที่ไม่ทับช่วงวัน ไม่ควรทำให้จำนวน query เพิ่ม
+        for i in range(count):
+            old = make_rental(self.customer, self.dress, start=date(2025, 1, 1), end=date(2025, 1, 3), status='RETURNED')
+            old.accessories.set([self.earring, self.bag])
+
+    def test_conflicts_return_rental_and_customer(self):
+        conflicts = list(accessory_conflicts(
+            date(2026, 3, 11), date(2026, 3, 15), accessory_ids=[self.earring.id, self.bag.id],
+        ))
+        self.assertEqual([c.accessory_id for c in conflicts], [self.earring.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(conflicts[0].rental.customer.name, "คุณเอ")
+
+    def test_returned_and_excluded_rentals_are_free(self):
+        self.assertEqual(busy_accessory_ids(date(2026, 3, 1), date(2026, 3, 10)), {self.earring.id, self.necklace.id})
+        self.assertEqual(busy_accessory_ids(date(2026, 3, 13), date(2026, 3, 20)), set())
+        self.assertEqual(busy_accessory_ids(date(2026, 3, 1), date(2026, 3, 31), exclude_rental_id=self.booking.id), set())
+        self.booking.status = 'RETURNED'
+        self.booking.save()
+        self.assertEqual(busy_accessory_ids(date(2026, 3, 1), date(2026, 3, 31)), set())
+
+    def test_check_is_single_query_as_history_grows(self):
+        for count in (1, 20):
+            self._add_history(count)
+            with self.assertNumQueries(1):
+                list(accessory_conflicts(date(2026, 3, 11), date(2026, 3, 11), accessory_ids=[self.earring.id]))
+            with self.assertNumQueries(1):
+                busy_accessory_ids(date(2026, 3, 11), date(2026, 3, 11))
+
+    def test_add_rental_rejects_booked_accessory(self):
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        response = self.client.post(reverse('add_rental'), {
+            'customer': self.customer.id,
+            'dress': self.dress.id,
+            'accessories': [self.earring.id, self.bag.id],
+            'start_date': '2026-03-12',
+            'end_date': '2026-03-14',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ต่างหู", str(response.context['form'].errors['accessories']))
+        self.assertIn("คุณเอ", str(response.context['form'].errors['accessories']))
+        self.assertEqual(Rental.objects.count(), 1)
+
+    def test_customer_select_marks_busy_accessories(self):
+        other = Customer.objects.create(name="คุณบี", phone="0822222222")
+        mine = make_rental(other, make_dress(), start=date(2026, 3, 11), end=date(2026, 3, 11))
+        session = self.client.session
+        session['customer_id'] = other.id
+        session.save()
+        response = self.client.get(reverse('customer_select_accessories', args=[mine.id]))
+        self.assertEqual(response.context['booked_acc_ids'], {self.earring.id, self.necklace.id})
+
+
+class DressOccupancyTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="คุณเอ", phone="0811111111")
+        self.dress = make_dress()
+        self.rental = make_rental(self.customer, self.dress, start=date(2026, 5, 1), end=date(2026, 5, 3))
+
+    def test_rows_follow_rental_lifecycle(self):
+        self.assertEqual(DressOccupancy.objects.filter(rental=self.rental).count(), 3)
+
+        self.rental.end_date = date(2026, 5, 1)
+        self.rental.save()
+        self.assertEqual(list(DressOccupancy.objects.values_list('day', flat=True)), [date(2026, 5, 1)])
+
+        self.rental.status = 'RETURNED'
+        self.rental.save()
+        self.assertFalse(DressOccupancy.objects.exists())
+
+        self.rental.status = 'BOOKED'
+        self.rental.save()
+        self.rental.delete()
+        self.assertFalse(DressOccupancy.objects.exists())
+
+    def test_dress_conflict(self):
+        self.assertEqual(dress_conflict(self.dress.id, date(2026, 5, 3), date(2026, 5, 5)), self.rental)
+        self.assertIsNone(dress_conflict(self.dress.id, date(2026, 5, 4), date(2026, 5, 5)))
+        self.assertIsNone(dress_conflict(make_dress().id, date(2026, 5, 1), date(2026, 5, 3)))
+        self.assertIsNone(dress_conflict(self.dress.id, date(2026, 5, 1), date(2026, 5, 3), exclude_rental_id=self.rental.id))
+
+    def test_add_rental_rejects_double_booked_dress(self):
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        response = self.client.post(reverse('add_rental'), {
+            'customer': self.customer.id,
+            'dress': self.dress.id,
+            'start_date': '2026-05-02',
+            'end_date': '2026-05-04',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("คุณเอ", str(response.context['form'].errors['dress']))
+        self.assertEqual(Rental.objects.count(), 1)
+
+    def test_rebuild_command(self):
+        make_rental(self.customer, self.dress, start=date(2026, 6, 1), end=date(2026, 6, 2))
+        make_rental(self.customer, self.dress, start=date(2026, 7, 1), end=date(2026, 7, 9), status='RETURNED')
+        DressOccupancy.objects.all().delete()
+        call_command('rebuild_occupancy', batch_size=2, stdout=StringIO())
+        self.assertEqual(DressOccupancy.objects.count(), 5)
+
+
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_upload_is_saved_first_then_resized(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            dress = Dress.objects.create(name="ชุดใหม่", cost_price=1, rental_price=1, image=make_upload())
+        self.assertEqual(dress.image_status, Dress.IMAGE_PROCESSING)
+        with Image.open(dress.image.path) as img:
+            self.assertEqual(img.size, (1600, 1200))
+
+        for callback in callbacks:
+            callback()
+        dress.refresh_from_db()
+        self.assertEqual(dress.image_status, Dress.IMAGE_READY)
+        with Image.open(dress.image.path) as img:
+            self.assertEqual(img.size, (800, 600))
+            self.assertEqual(img.format, 'JPEG')
+
+    def test_resave_without_new_upload_is_not_requeued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            acc = Accessory.objects.create(name="ต่างหู", image=make_upload())
+        with mock.patch.object(images, 'enqueue') as enqueue:
+            acc.name = "ต่างหูมุก"
+            acc.save()
+        enqueue.assert_not_called()
+        self.assertEqual(acc.image_status, Accessory.IMAGE_READY)
+
+    def test_broken_file_marks_failed(self):
+        broken = SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg")
+        with self.assertLogs('core.images', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            acc = Accessory.objects.create(name="เสีย", image=broken)
+        acc.refresh_from_db()
+        self.assertEqual(acc.image_status, Accessory.IMAGE_FAILED)
+
+    def test_process_file_keeps_small_images_and_skips_upscaling(self):
+        path = f"{self.media_root}/small.jpg"
+        Image.new('RGB', (300, 200)).save(path, format='JPEG')
+        before = open(path, 'rb').read()
+        elapsed_ms, fields = images.process_file(path)
+        self.assertGreaterEqual(elapsed_ms, 0)
+        self.assertEqual(fields['image_renditions'], [96, 300])
+        self.assertEqual((fields['image_width'], fields['image_height']), (300, 200))
+        self.assertEqual(open(path, 'rb').read(), before)
+
+    def test_renditions_are_generated_for_each_width_and_format(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dress = Dress.objects.create(name="ชุดใหม่", cost_price=1, rental_price=1, image=make_upload())
+        self.assertEqual(dress.image_renditions, [96, 400, 800])
+        self.assertEqual((dress.image_width, dress.image_height), (800, 600))
+        self.assertEqual(dress.image_placeholder, "#ff69b4")
+        for width in dress.image_renditions:
+            for ext, fmt in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with dress.image.storage.open(images.rendition_name(dress.image.name, width, ext)) as fh:
+                    with Image.open(fh) as img:
+                        self.assertEqual((img.format, img.width), (fmt, width))
+
+    def test_responsive_image_tag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dress = Dress.objects.create(name="ชุดใหม่", cost_price=1, rental_price=1, image=make_upload())
+        html = Template('{% load product_images %}{% responsive_image dress sizes="40px" alt=dress.name %}').render(
+            Context({'dress': dress})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('_96w.webp 96w', html)
+        self.assertIn('_800w.jpg 800w', html)
+        self.assertIn('sizes="40px"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="800" height="600"', html)
+        self.assertIn('background-color: #ff69b4', html)
+
+        # รูปเก่าที่ยังไม่มีรูปย่อ ใช้ไฟล์หลักไปก่อน
+        Dress.objects.filter(pk=dress.pk).update(image_renditions=[])
+        dress.refresh_from_db()
+        html = Template('{% load product_images %}{% responsive_image dress %}').render(Context({'dress': dress}))
+        self.assertIn(f'src="{dress.image.url}"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_process_images_command_backfills_missing_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            acc = Accessory.objects.create(name="ต่างหู", image=make_upload(size=(200, 200)))
+        Accessory.objects.filter(pk=acc.pk).update(image_renditions=[], image_width=None, image_height=None)
+        Accessory.objects.create(name="ไม่มีรูป")
+        out = StringIO()
+        call_command('process_images', batch_size=1, stdout=out)
+        acc.refresh_from_db()
+        self.assertEqual(acc.image_renditions, [96, 200])
+        self.assertEqual((acc.image_width, acc.image_height), (200, 200))
+        self.assertIn("Accessory: สำเร็จ 1", out.getvalue())
+
+    def test_templates_render_without_opening_image_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dress = Dress.objects.create(name="ชุดใหม่", cost_price=1, rental_price=1, image=make_upload())
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        with mock.patch.object(Image, 'open', side_effect=AssertionError("เปิดไฟล์รูประหว่าง render")):
+            response = self.client.get(reverse('dress_list'))
+        self.assertContains(response, f'width="{dress.image_width}"')
+
+
+class ImageJobCallbackTests(TransactionTestCase):
+    def test_finished_job_does_not_close_the_submitting_connection(self):
+        # future เสร็จไปแล้ว -> callback รันทันทีใน thread ที่ submit (ใน request)
+        dress = make_dress()
+        future = Future()
+        future.set_result((1.0, {'image_width': 320}))
+        connection.ensure_connection()
+        request_connection = connection.connection
+        future.add_done_callback(
+            lambda f: setattr(self, 'worker', images._job_done(Dress, dress.pk, "x.jpg", time.perf_counter(), f))
+        )
+        self.worker.join()
+        self.assertIs(connection.connection, request_connection)
+        dress.refresh_from_db()
+        self.assertEqual((dress.image_status, dress.image_width), (Dress.IMAGE_READY, 320))
+
+
+class LargeUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    @override_settings(IMAGE_MAX_PIXELS=1_000_000)
+    def test_form_rejects_too_many_pixels(self):
+        form = AccessoryForm(data={'name': "ต่างหู"}, files={'image': make_upload(size=(1200, 1000))})
+        self.assertFalse(form.is_valid())
+        self.assertIn("ล้านพิกเซล", str(form.errors['image']))
+
+        form = AccessoryForm(data={'name': "ต่างหู"}, files={'image': make_upload(size=(1000, 1000))})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "ru_maxrss เป็น KB เฉพาะบน Linux")
+    def test_huge_jpeg_is_decoded_with_bounded_memory(self):
+        # รูป 48 ล้านพิกเซล ถ้า decode เต็มๆ ต้องใช้แรม ~48MB (L) + ~144MB ตอนแปลงเป็น RGB
+        path = f"{self.media_root}/huge.jpg"
+        Image.new('L', (8000, 6000), 128).save(path, format='JPEG', quality=50)
+        script = (
+            "import resource, sys\n"
+            "from core.images import process_file\n"
+            "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+            "elapsed, fields = process_file(sys.argv[1], max_pixels=10**9)\n"
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before, fields['image_renditions'])\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script, path],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        )
+        grown_kb, widths = result.stdout.split(maxsplit=1)
+        self.assertLess(int(grown_kb), 32 * 1024)
+        self.assertEqual(widths.strip(), "[96, 400, 800]")
+        with Image.open(path) as img:
+            self.assertEqual(img.size, (800, 600))
+
+
+class DailyRevenueTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="คุณเอ", phone="0811111111")
+        self.dress = make_dress()
+
+    def _day(self, day):
+        row = DailyRevenue.objects.filter(day=day).first()
+        return (row.booked_total, row.rental_count, row.deposits) if row else None
+
+    def test_rollup_follows_rental_changes(self):
+        rental = make_rental(self.customer, self.dress, start=date(2026, 4, 1), total_price=500, deposit=100)
+        make_rental(self.customer, self.dress, start=date(2026, 4, 1), end=date(2026, 4, 1), total_price=300)
+        self.assertEqual(self._day(date(2026, 4, 1)), (Decimal("800"), 2, Decimal("100")))
+
+        rental.total_price = 700
+        rental.status = 'RETURNED'
+        rental.save()
+        self.assertEqual(self._day(date(2026, 4, 1)), (Decimal("1000"), 2, Decimal("100")))
+
+        # ย้ายวันที่ -> ยอดย้ายไปอีกวัน
+        rental.start_date = rental.end_date = date(2026, 4, 5)
+        rental.save()
+        self.assertEqual(self._day(date(2026, 4, 1)), (Decimal("300"), 1, Decimal("0")))
+        self.assertEqual(self._day(date(2026, 4, 5)), (Decimal("700"), 1, Decimal("100")))
+
+        # ราคาพิเศษ = ราคาที่เก็บจริง (นิยามเดียวกับตัวเลขของชุด)
+        rental.price_override = 650
+        rental.save()
+        self.assertEqual(self._day(date(2026, 4, 5)), (Decimal("650"), 1, Decimal("100")))
+        self.assertEqual(Dress.objects.get(pk=self.dress.pk).revenue_to_date, Decimal("950"))
+
+        rental.delete()
+        self.assertEqual(self._day(date(2026, 4, 5)), (Decimal("0"), 0, Decimal("0")))
+
+        # ลบลูกค้า -> ใบจองถูกลบตาม (cascade) ยอดก็หักออกด้วย
+        self.customer.delete()
+        self.assertEqual(self._day(date(2026, 4, 1)), (Decimal("0"), 0, Decimal("0")))
+
+    def test_income_summary_ignores_same_month_last_year(self):
+        make_rental(self.customer, self.dress, start=date(2026, 4, 14), total_price=100)  # สัปดาห์นี้
+        make_rental(self.customer, self.dress, start=date(2026, 4, 2), total_price=200)   # เดือนนี้
+        make_rental(self.customer, self.dress, start=date(2026, 1, 5), total_price=400)   # ปีนี้
+        make_rental(self.customer, self.dress, start=date(2025, 4, 15), total_price=800)  # ปีที่แล้ว
+        make_rental(self.customer, self.dress, start=date(2026, 4, 23), total_price=1600)  # สัปดาห์หน้า
+        with self.assertNumQueries(1):
+            income = income_summary(date(2026, 4, 15))
+        self.assertEqual(income, {'week': Decimal("100"), 'month': Decimal("1900"), 'year': Decimal("2300")})
+
+    def test_rebuild_command_matches_incremental_rollup(self):
+        for i in range(5):
+            make_rental(self.customer, self.dress, start=date(2026, 4, 1 + i % 2), total_price=100 * i, deposit=i)
+        make_rental(self.customer, self.dress, start=date(2026, 4, 2), total_price=900, price_override=450)
+        expected = list(DailyRevenue.objects.order_by('day').values_list('day', 'booked_total', 'rental_count', 'deposits'))
+        DailyRevenue.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        rebuilt = list(DailyRevenue.objects.order_by('day').values_list('day', 'booked_total', 'rental_count', 'deposits'))
+        self.assertEqual(rebuilt, expected)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name="ลูกค้า", phone="0812345678")
+        self.dress = make_dress(name="ชุดขายดี", cost_price=1000)
+        self.idle = make_dress(name="ชุดไม่มีคนเช่า", cost_price=800)
+        self.necklace = Accessory.objects.create(name="สร้อย")
+        self.earring = Accessory.objects.create(name="ต่างหู")
+        # เช่าครั้งแรก 1 ม.ค. -> ถึง 10 ม.ค. มีชุดมาแล้ว 10 วัน ถูกจองไป 3 + 2 = 5 วัน
+        first = make_rental(self.customer, self.dress, start=date(2026, 1, 1), end=date(2026, 1, 3), total_price=300)
+        first.accessories.set([self.necklace, self.earring])
+        # ใบที่สองคิดราคาพิเศษ 250 -> รายได้นับ 250 (ราคาที่เก็บจริง)
+        second = make_rental(
+            self.customer, self.dress, start=date(2026, 1, 9), end=date(2026, 1, 10), total_price=200, price_override=250,
+        )
+        second.accessories.set([self.necklace])
+        make_rental(self.customer, self.dress, start=date(2025, 12, 30), end=date(2025, 12, 30), total_price=0)
+
+    def test_report_figures(self):
+        # ใบจอง (ตารางหลัก + archive), ชุด, เครื่องประดับ, ของแถมในใบจอง (ตารางหลัก + archive)
+        with self.assertNumQueries(6):
+            report = reports.build_report(date(2026, 1, 10))
+        dresses = {d['name']: d for d in report['dresses']}
+        busy = dresses["ชุดขายดี"]
+        # เช่าครั้งแรกจริงๆ 30 ธ.ค. (ราคา 0 แต่ save() เติมราคาเช่าให้ = 500)
+        self.assertEqual(busy['rental_count'], 3)
+        self.assertEqual(busy['booked_days'], 6)
+        self.assertEqual(busy['owned_days'], 12)
+        self.assertAlmostEqual(busy['utilisation'], 0.5)
+        self.assertEqual(busy['revenue'], 1050.0)
+        self.assertTrue(busy['paid_back'])
+        self.assertEqual(busy['days_to_payback'], 0)
+
+        idle = dresses["ชุดไม่มีคนเช่า"]
+        self.assertEqual((idle['utilisation'], idle['revenue'], idle['days_to_payback']), (0.0, 0.0, None))
+
+        self.assertEqual(report['monthly'], [
+            {'month': '2025-12', 'revenue': 500.0, 'rental_count': 1},
+            {'month': '2026-01', 'revenue': 550.0, 'rental_count': 2},
+        ])
+        self.assertEqual(
+            [(a['name'], a['count']) for a in report['accessories']],
+            [("สร้อย", 2), ("ต่างหู", 1)],
+        )
+
+    def test_payback_estimate_uses_average_daily_revenue(self):
+        dress = make_dress(name="ชุดแพง", cost_price=1000)
+        make_rental(self.customer, dress, start=date(2026, 1, 1), end=date(2026, 1, 1), total_price=100)
+        report = reports.build_report(date(2026, 1, 10))
+        row = next(d for d in report['dresses'] if d['name'] == "ชุดแพง")
+        # 100 บาท / 10 วัน = 10 บาทต่อวัน ขาดอีก 900 -> ~90 วัน
+        self.assertEqual((row['paid_back'], row['days_to_payback']), (False, 90))
+
+    def test_report_cached_until_data_changes(self):
+        today = date(2026, 1, 10)
+        reports.get_report(today)
+        with self.assertNumQueries(0):
+            reports.get_report(today)
+
+        make_rental(self.customer, self.idle, start=date(2026, 1, 5), end=date(2026, 1, 5), total_price=800)
+        with self.assertNumQueries(6):
+            report = reports.get_report(today)
+        self.assertEqual(report['rental_count'], 4)
+
+        # แก้ชื่อชุด / เปลี่ยนของแถม ก็ต้องคำนวณใหม่เหมือนกัน
+        self.idle.name = "ชุดเปลี่ยนชื่อ"
+        self.idle.save()
+        self.assertIn("ชุดเปลี่ยนชื่อ", [d['name'] for d in reports.get_report(today)['dresses']])
+        Rental.objects.first().accessories.clear()
+        with self.assertNumQueries(6):
+            reports.get_report(today)
+
+    def test_reports_page_is_staff_only(self):
+        user = User.objects.create_user('clerk', password='pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('reports')).status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('reports'))
+        self.assertContains(response, "ชุดขายดี")
+        self.assertContains(response, "คืนทุนแล้ว")
+
+    def test_command_prints_json(self):
+        out = StringIO()
+        call_command('rental_report', '--json', stdout=out)
+        self.assertIn('"ชุดขายดี"', out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='pass')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name="ลูกค้า", phone="0812345678")
+        self.dress = make_dress(name="ชุดสีชมพู")
+        self.necklace = Accessory.objects.create(name="สร้อย")
+        self.rentals = []
+        for day in range(1, 6):
+            rental = make_rental(
+                self.customer, self.dress, start=date(2026, 3, day), end=date(2026, 3, day),
+                total_price=100 * day, status='RETURNED' if day % 2 else 'BOOKED',
+            )
+            rental.accessories.set([self.necklace])
+            self.rentals.append(rental)
+
+    def _csv(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+    def test_csv_streams_rentals_with_filters(self):
+        lines = self._csv(reverse('export_data', args=['rentals', 'csv']))
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[0].startswith("เลขที่,วันที่ยืม"))
+        self.assertIn("ชุดสีชมพู", lines[1])
+        self.assertIn("สร้อย", lines[1])
+
+        url = reverse('export_data', args=['rentals', 'csv']) + '?date_from=2026-03-02&date_to=2026-03-04&status=RETURNED'
+        lines = self._csv(url)
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(self.rentals[2].id)])
+
+    def test_formula_like_text_is_escaped(self):
+        Customer.objects.filter(pk=self.customer.pk).update(name='=HYPERLINK("http://evil","x")', line_id="@sum(1)")
+        self.rentals[0].note = "-2+3"
+        self.rentals[0].save()
+        lines = self._csv(reverse('export_data', args=['rentals', 'csv']))
+        self.assertIn('"\'=HYPERLINK(""http://evil"",""x"")"', lines[1])
+        self.assertIn(",'@sum(1),", lines[1])
+        self.assertTrue(lines[1].endswith(",'-2+3"))
+
+        from openpyxl import load_workbook
+        with tempfile.TemporaryFile() as fh:
+            exports.write_xlsx('customers', fh)
+            fh.seek(0)
+            rows = list(load_workbook(fh).active.iter_rows(values_only=True))
+        self.assertEqual(rows[1][1], '\'=HYPERLINK("http://evil","x")')
+        self.assertEqual(exports.safe_cell(-5), -5)
+
+    def test_bad_filter_is_rejected(self):
+        response = self.client.get(reverse('export_data', args=['rentals', 'csv']) + '?status=LOST')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['secrets', 'csv'])).status_code, 404)
+
+    def test_accessories_prefetched_per_chunk(self):
+        # 5 ใบจอง ก้อนละ 2 -> ใบจอง 1 query (cursor เดียว) + ของแถม 1 query ต่อก้อน ไม่ใช่ query ละแถว
+        # (+ archive ที่ว่างอยู่อีก 1 query)
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2), self.assertNumQueries(5):
+            rows = list(exports.rental_rows())
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(row[8] == "สร้อย" for row in rows))
+
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('export_data', args=['revenue', 'xlsx']))
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], "วันที่")
+        self.assertEqual(len(rows), 6)
+
+    async def test_exports_stream_asynchronously_under_asgi(self):
+        # ใต้ ASGI ต้องเป็น async iterator ไม่งั้น Django ดึงทั้งไฟล์ลงแรมก่อนส่ง
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        with mock.patch.object(exports, 'CSV_ROWS_PER_WRITE', 2):
+            response = await client.get(reverse('export_data', args=['rentals', 'csv']))
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(b''.join(chunks).decode('utf-8-sig').splitlines()), 6)
+
+        from openpyxl import load_workbook
+        response = await client.get(reverse('export_data', args=['revenue', 'xlsx']))
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(int(response['Content-Length']), len(content))
+        self.assertEqual(len(list(load_workbook(BytesIO(content)).active.iter_rows())), 6)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = f"{folder}/rentals.csv"
+            call_command('export_rentals', '--status', 'BOOKED', '--output', path, stdout=StringIO())
+            with open(path, encoding='utf-8-sig') as fh:
+                self.assertEqual(len(fh.read().splitlines()), 3)
+
+
+@mock.patch.object(listing, 'PAGE_SIZE', 3)
+class ListPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='pass')
+        self.client.force_login(self.user)
+        self.customers = [
+            Customer.objects.create(name=f"ลูกค้า {i}", phone=f"08100000{i:02d}") for i in range(8)
+        ]
+
+    def _names(self, response):
+        return [c.name for c in response.context['customers']]
+
+    def test_walk_forward_and_back(self):
+        first = self.client.get(reverse('customer_list'))
+        self.assertEqual(self._names(first), ["ลูกค้า 0", "ลูกค้า 1", "ลูกค้า 2"])
+        page = first.context['customers']
+        self.assertFalse(page.has_previous)
+
+        second = self.client.get(reverse('customer_list'), {'after': page.next_cursor})
+        self.assertEqual(self._names(second), ["ลูกค้า 3", "ลูกค้า 4", "ลูกค้า 5"])
+        third = self.client.get(reverse('customer_list'), {'after': second.context['customers'].next_cursor})
+        self.assertEqual(self._names(third), ["ลูกค้า 6", "ลูกค้า 7"])
+        self.assertFalse(third.context['customers'].has_next)
+
+        back = self.client.get(reverse('customer_list'), {'before': third.context['customers'].previous_cursor})
+        self.assertEqual(self._names(back), ["ลูกค้า 3", "ลูกค้า 4", "ลูกค้า 5"])
+        back = self.client.get(reverse('customer_list'), {'before': back.context['customers'].previous_cursor})
+        self.assertEqual(self._names(back), ["ลูกค้า 0", "ลูกค้า 1", "ลูกค้า 2"])
+        self.assertFalse(back.context['customers'].has_previous)
+
+    def test_deep_page_is_a_single_seek_query(self):
+        cursor = listing._encode([self.customers[5].id])
+        request = mock.Mock(GET={'after': cursor})
+        with CaptureQueriesContext(connection) as ctx:
+            page = listing.keyset_page(request, Customer.objects.all(), page_size=3)
+        self.assertEqual([c.name for c in page], ["ลูกค้า 6", "ลูกค้า 7"])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT', sql)
+
+    def test_search_by_name_or_phone(self):
+        Customer.objects.create(name="สมหญิง", phone="0999999999")
+        response = self.client.get(reverse('customer_list'), {'q': 'สมห'})
+        self.assertEqual(self._names(response), ["สมหญิง"])
+        response = self.client.get(reverse('customer_list'), {'q': '0999'})
+        self.assertEqual(self._names(response), ["สมหญิง"])
+        self.assertContains(response, 'value="0999"')
+
+        dress = make_dress(name="ชุดราตรีแดง")
+        make_dress(name="ชุดไทย")
+        response = self.client.get(reverse('dress_list'), {'q': 'ชุดราตรี'})
+        self.assertEqual([d.id for d in response.context['dresses']], [dress.id])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "เช็คแผน query ของ SQLite")
+    def test_search_uses_column_indexes(self):
+        # startswith บน SQLite = LIKE ที่ไม่สนตัวพิมพ์ -> SCAN ทั้งตาราง; ช่วงค่าต้องเดินตาม index
+        plan = listing.search(Customer.objects.all(), "สม", ['name', 'phone']).explain()
+        self.assertIn("USING INDEX core_customer_name", plan)
+        self.assertIn("USING INDEX core_customer_phone", plan)
+        self.assertNotIn("SCAN core_customer", plan)
+        plan = listing.search(Accessory.objects.all(), "สร้อย", ['name']).explain()
+        self.assertIn("USING INDEX core_accessory_name", plan)
+        self.assertNotIn("SCAN core_accessory", plan)
+        # ค่าที่ต่อท้ายด้วยตัวอักษรนอก BMP (อีโมจิ) ยังอยู่ในช่วง
+        Accessory.objects.create(name="สร้อย💎")
+        self.assertTrue(listing.search(Accessory.objects.all(), "สร้อย", ['name']).exists())
+
+    def test_search_uses_startswith_outside_sqlite(self):
+        # collation ตาม locale (เช่น PostgreSQL) เรียงไม่เหมือน binary -> ช่วงค่าใช้ไม่ได้
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            where = listing.search(Customer.objects.all(), "สม", ['name', 'phone']).query.where
+        self.assertEqual([child.lookup_name for child in where.children[0].children], ['startswith', 'startswith'])
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        for cursor in ['not-base64!!', listing._encode(['abc']), listing._encode({'id': 1})]:
+            response = self.client.get(reverse('customer_list'), {'after': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self._names(response)[0], "ลูกค้า 0")
+
+    def test_history_pages_by_date_then_id(self):
+        customer = self.customers[0]
+        dress = make_dress()
+        same_day = [make_rental(customer, dress, start=date(2026, 2, 1), end=date(2026, 2, 1)) for _ in range(3)]
+        newest = make_rental(customer, dress, start=date(2026, 3, 1), end=date(2026, 3, 1))
+        request = mock.Mock(GET={})
+        queryset = Rental.objects.filter(customer=customer)
+        page = listing.keyset_page(request, queryset, ordering=('-start_date', '-id'), page_size=2)
+        self.assertEqual([r.id for r in page], [newest.id, same_day[2].id])
+        request.GET = {'after': page.next_cursor}
+        page = listing.keyset_page(request, queryset, ordering=('-start_date', '-id'), page_size=2)
+        self.assertEqual([r.id for r in page], [same_day[1].id, same_day[0].id])
+        self.assertFalse(page.has_next)
+
+    def _spend(self, customer, *prices, status='RETURNED', start=date(2026, 1, 10)):
+        dress = make_dress()
+        for price in prices:
+            make_rental(customer, dress, start=start, end=start, total_price=price, status=status)
+
+    def test_customer_stats_in_one_query(self):
+        regular, newcomer = self.customers[1], self.customers[2]
+        self._spend(regular, 300, 200)
+        self._spend(regular, 999, status='BOOKED', start=date(2026, 5, 1))
+        Rental.objects.filter(customer=regular, total_price=999).update(price_override=100)
+
+        with self.assertNumQueries(1):
+            stats = {c.id: c for c in Customer.objects.with_stats()}
+        self.assertEqual(stats[regular.id].rental_count, 3)
+        self.assertEqual(stats[regular.id].lifetime_spend, Decimal("600"))
+        self.assertEqual(stats[regular.id].last_visit, date(2026, 1, 10))
+        self.assertEqual(stats[regular.id].open_bookings, 1)
+        self.assertEqual(
+            (stats[newcomer.id].rental_count, stats[newcomer.id].lifetime_spend, stats[newcomer.id].last_visit),
+            (0, 0, None),
+        )
+
+    def test_sort_by_spend_pages_through_everyone(self):
+        for i, customer in enumerate(self.customers[:4]):
+            self._spend(customer, 100 * (i + 1))
+        names, params = [], {'sort': 'spend'}
+        while True:
+            response = self.client.get(reverse('customer_list'), params)
+            names += self._names(response)
+            page = response.context['customers']
+            if not page.has_next:
+                break
+            params['after'] = page.next_cursor
+        self.assertEqual(names[:4], ["ลูกค้า 3", "ลูกค้า 2", "ลูกค้า 1", "ลูกค้า 0"])
+        self.assertEqual(sorted(names), sorted(c.name for c in self.customers))
+
+    def test_sort_by_last_visit_keeps_customers_without_visits(self):
+        self._spend(self.customers[6], 100, start=date(2026, 2, 1))
+        self._spend(self.customers[3], 100, start=date(2026, 1, 1))
+        response = self.client.get(reverse('customer_list'), {'sort': 'last_visit'})
+        self.assertEqual(self._names(response), ["ลูกค้า 6", "ลูกค้า 3", "ลูกค้า 7"])
+        self.assertContains(response, "sort=last_visit")
+
+    def test_history_page_queries_do_not_grow_with_rentals(self):
+        customer = self.customers[0]
+        accessory = Accessory.objects.create(name="ต่างหู")
+
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('customer_history', args=[customer.id]))
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        make_rental(customer, make_dress()).accessories.add(accessory)
+        small = queries()
+        for _ in range(2):
+            make_rental(customer, make_dress()).accessories.add(accessory)
+        self.assertEqual(queries(), small)
+
+
+class RentalFormAutocompleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('staff', password='pass')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name="สมศรี", phone="0811111111")
+        self.dress = make_dress(name="ชุดราตรี")
+        self.necklace = Accessory.objects.create(name="สร้อย")
+
+    def _page_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('add_rental'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_form_page_does_not_grow_with_customers(self):
+        self._page_queries()  # ครั้งแรกโหลดแคตตาล็อกเครื่องประดับเข้าแรม
+        before, response = self._page_queries()
+        self.assertNotContains(response, "สมศรี")
+        Customer.objects.bulk_create(Customer(name=f"ลูกค้า {i}", phone=f"09{i:08d}") for i in range(50))
+        Dress.objects.bulk_create(Dress(name=f"ชุด {i}", cost_price=1, rental_price=1) for i in range(50))
+        after, response = self._page_queries()
+        self.assertEqual(before, after)
+        self.assertNotContains(response, "ลูกค้า 1")
+        self.assertContains(response, 'data-autocomplete-url="%s"' % reverse('customer_autocomplete'))
+        # เครื่องประดับยังแสดงครบ (จากแคตตาล็อกในแรม)
+        self.assertContains(response, 'id="acc_%d"' % self.necklace.id)
+
+    def test_invalid_post_keeps_only_selected_values(self):
+        other = Customer.objects.create(name="ลูกค้าอื่น", phone="0822222222")
+        response = self.client.post(reverse('add_rental'), {
+            'customer': self.customer.id, 'dress': self.dress.id,
+            'accessories': [self.necklace.id], 'start_date': 'not-a-date', 'end_date': '2026-01-02',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<option value="{self.customer.id}" selected>')
+        self.assertNotContains(response, other.name)
+        self.assertContains(response, f'value="{self.necklace.id}" id="acc_{self.necklace.id}" class="acc-checkbox" checked')
+
+    def test_autocomplete_prefix_and_limit(self):
+        Customer.objects.bulk_create(Customer(name=f"สมชาย {i:02d}", phone=f"09{i:08d}") for i in range(30))
+        data = self.client.get(reverse('customer_autocomplete'), {'q': 'สม'}).json()
+        self.assertEqual(len(data['results']), AUTOCOMPLETE_LIMIT)
+        self.assertEqual(data['results'][0]['text'], "สมชาย 00 (0900000000)")
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('customer_autocomplete'), {'q': '0811'}).json()
+        self.assertEqual(data['results'], [{'id': self.customer.id, 'text': str(self.customer)}])
+        # ค้นเป็นช่วงค่า (ใช้ index ได้) ไม่ใช่ LIKE
+        self.assertNotIn(' LIKE ', ctx.captured_queries[-1]['sql'])
+        data = self.client.get(reverse('dress_autocomplete'), {'q': 'ราตรี'}).json()
+        self.assertEqual(data['results'], [])  # ต้องขึ้นต้นด้วยคำที่พิมพ์
+        data = self.client.get(reverse('dress_autocomplete'), {'q': 'ชุดรา'}).json()
+        self.assertEqual([r['id'] for r in data['results']], [self.dress.id])
+
+    def test_autocomplete_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('customer_autocomplete')).status_code, 302)
+
+
+class CustomerLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name="สมศรี", phone="081-234-5678")
+
+    def _login(self, phone, ip='10.0.0.1'):
+        return self.client.post(reverse('customer_login'), {'phone': phone}, REMOTE_ADDR=ip)
+
+    def test_normalised_on_save(self):
+        self.assertEqual(self.customer.phone_normalized, "0812345678")
+        self.customer.phone = "+66 89 999 0000"
+        self.customer.save(update_fields=['phone'])
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.phone_normalized, "0899990000")
+
+    def test_login_with_any_formatting_is_one_indexed_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._login("+66 81 234 5678")
+        lookup = ctx.captured_queries[0]['sql']
+        self.assertIn('"phone_normalized" = \'0812345678\'', lookup)
+        self.assertRedirects(response, reverse('customer_portal'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['customer_id'], self.customer.id)
+
+        response = self._login("0899999999")
+        self.assertContains(response, "ไม่พบเบอร์โทรนี้ในระบบ")
+        # ลูกค้าที่ไม่มีเบอร์ (phone_normalized = NULL) ต้องไม่ถูกจับคู่กับช่องว่าง
+        Customer.objects.create(name="ไม่มีเบอร์", phone="-")
+        self.assertContains(self._login("---"), "ไม่พบเบอร์โทรนี้ในระบบ")
+
+    def test_duplicate_phone_rejected_by_form(self):
+        form = CustomerForm(data={'name': "คนใหม่", 'phone': "0812345678"})
+        self.assertFalse(form.is_valid())
+        self.assertIn('phone', form.errors)
+        form = CustomerForm(data={'name': "สมศรี", 'phone': "081 234 5678"}, instance=self.customer)
+        self.assertTrue(form.is_valid())
+
+    def test_duplicate_phone_rejected_by_admin_form(self):
+        # ฟอร์มของแอดมินไม่มี clean_phone -> ต้องได้ error ที่ช่องเบอร์จาก model ไม่ใช่ IntegrityError
+        AdminForm = modelform_factory(Customer, fields='__all__')
+        form = AdminForm(data={'name': "คนใหม่", 'phone': "081-234-5678"})
+        self.assertFalse(form.is_valid())
+        self.assertIn('phone', form.errors)
+
+        # ลูกค้าเก่าเบอร์ซ้ำจากก่อนมีคอลัมน์ (phone_normalized = NULL) แก้แล้วก็ต้องโดนเตือนเหมือนกัน
+        legacy = Customer.objects.create(name="คนเก่า", phone="0800000000")
+        Customer.objects.filter(pk=legacy.pk).update(phone="081 234 5678", phone_normalized=None)
+        legacy.refresh_from_db()
+        form = AdminForm(data={'name': "คนเก่า", 'phone': legacy.phone}, instance=legacy)
+        self.assertFalse(form.is_valid())
+        self.assertIn('phone', form.errors)
+        form = AdminForm(data={'name': "คนเก่า", 'phone': "0800000001"}, instance=legacy)
+        self.assertTrue(form.is_valid())
+
+    def test_plain_save_of_duplicate_keeps_phone_empty_and_is_reported(self):
+        legacy = Customer.objects.create(name="คนเก่า", phone="0800000000")
+        Customer.objects.filter(pk=legacy.pk).update(phone="081 234 5678", phone_normalized=None)
+        legacy.refresh_from_db()
+        legacy.name = "คนเก่า (แก้ชื่อ)"
+        # save() ตรงๆ (ไม่ผ่านฟอร์ม) ต้องไม่ IntegrityError: เว้นเบอร์ว่างไว้ + log เตือน
+        with self.assertLogs('core.models', 'WARNING'):
+            legacy.save()
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.name, legacy.phone_normalized), ("คนเก่า (แก้ชื่อ)", None))
+
+        out = StringIO()
+        call_command('duplicate_phones', stdout=out)
+        self.assertIn(f"#{legacy.pk} คนเก่า (แก้ชื่อ) (081 234 5678) ซ้ำกับ #{self.customer.pk}", out.getvalue())
+
+    @override_settings(CUSTOMER_LOGIN_MAX_ATTEMPTS=3)
+    def test_throttle_per_ip_and_per_phone(self):
+        # login สำเร็จไม่นับเข้าโควต้า (หลายคนใช้ IP เดียวกันได้)
+        for _ in range(5):
+            response = Client().post(reverse('customer_login'), {'phone': "0812345678"}, REMOTE_ADDR='10.0.0.1')
+            self.assertEqual(response.status_code, 302)
+        for i in range(3):
+            self.assertEqual(self._login(f"099000000{i}").status_code, 200)
+        # IP นี้ครบโควต้า -> ตอบ 429 โดยไม่ query DB เลย
+        with self.assertNumQueries(0):
+            response = self._login("0812345678")
+        self.assertEqual(response.status_code, 429)
+
+        # เบอร์เดียวกันยิงจากหลาย IP ก็โดนเหมือนกัน
+        for i in range(3):
+            self._login("0900000000", ip=f"10.0.1.{i}")
+        self.assertEqual(self._login("0900000000", ip='10.0.2.1').status_code, 429)
+        # IP อื่น เบอร์อื่น ยังเข้าได้
+        self.assertEqual(self._login("0812345678", ip='10.0.3.1').status_code, 302)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dress = Dress.objects.create(name="ชุดหน้าแรก", cost_price=1, rental_price=1, image='dresses/a.jpg')
+
+    def test_anonymous_landing_served_from_cache_until_catalog_changes(self):
+        first = self.client.get(reverse('landing_page'))
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            second = Client().get(reverse('landing_page'), {'fbclid': 'abc'})
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertContains(second, "ชุดหน้าแรก")
+
+        Dress.objects.create(name="ชุดมาใหม่", cost_price=1, rental_price=1, image='dresses/b.jpg')
+        third = self.client.get(reverse('landing_page'))
+        self.assertEqual(third['X-Page-Cache'], 'miss')
+        self.assertContains(third, "ชุดมาใหม่")
+
+        # รูปย่อเสร็จ (update ตรงๆ ไม่ผ่าน save) ก็ต้องได้หน้าใหม่
+        images._set_status(Dress, self.dress.pk, Dress.IMAGE_READY, fields={'image_renditions': [96]})
+        self.assertEqual(self.client.get(reverse('landing_page'))['X-Page-Cache'], 'miss')
+
+    def test_cached_page_gets_a_working_csrf_token_per_visitor(self):
+        Client().get(reverse('landing_page'))  # เติม cache
+        visitor = Client(enforce_csrf_checks=True)
+        response = visitor.get(reverse('landing_page'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertIn('csrftoken', response.cookies)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        self.assertNotEqual(token, '__csrf_token__')
+        response = visitor.post(reverse('customer_login'), {'phone': '0800000000', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 200)  # ผ่าน CSRF (ไม่ใช่ 403) แค่ไม่เจอเบอร์
+
+    async def test_async_landing_does_not_touch_cache_inside_event_loop(self):
+        backend = type(caches['default'])
+
+        def outside_loop(method):
+            def check(*args, **kwargs):
+                with self.assertRaises(RuntimeError):  # ไม่มี loop วิ่งใน thread นี้
+                    asyncio.get_running_loop()
+                return method(*args, **kwargs)
+            return check
+
+        patches = [mock.patch.object(backend, name, outside_loop(getattr(backend, name)))
+                   for name in ('get', 'set', 'add', 'incr')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        client = AsyncClient()
+        self.assertEqual((await client.get(reverse('landing_page')))['X-Page-Cache'], 'miss')
+        self.assertEqual((await client.get(reverse('landing_page')))['X-Page-Cache'], 'hit')
+
+    def test_logged_in_and_error_pages_bypass_cache(self):
+        self.client.get(reverse('landing_page'))
+        response = self.client.get(reverse('landing_page'), {'error': '1'})
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, "เบอร์โทรไม่ถูกต้อง")
+
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        self.assertRedirects(self.client.get(reverse('landing_page')), reverse('dashboard'), fetch_redirect_response=False)
+
+        customer_client = Client()
+        session = customer_client.session
+        session['customer_id'] = Customer.objects.create(name="ลูกค้า", phone="0811111111").id
+        session.save()
+        response = customer_client.get(reverse('landing_page'))
+        self.assertRedirects(response, reverse('customer_portal'), fetch_redirect_response=False)
+
+    def test_dress_grid_fragment_follows_rentals(self):
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        self.assertNotContains(self.client.get(reverse('dress_list')), "+299")
+        customer = Customer.objects.create(name="ลูกค้า", phone="0811111111")
+        make_rental(customer, self.dress, total_price=300)
+        self.assertContains(self.client.get(reverse('dress_list')), "+299")
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        self.acc = Accessory.objects.create(name="ต่างหู", image='accessories/a.jpg', image_renditions=[96, 400])
+
+    def test_served_from_memory_until_catalog_version_changes(self):
+        with self.assertNumQueries(1):
+            first = catalog.accessories()
+        # ครั้งต่อไปแค่เช็คเลขเวอร์ชันใน cache ไม่แตะ DB
+        with self.assertNumQueries(0):
+            self.assertIs(catalog.accessories(), first)
+        self.assertEqual(catalog.stats(), {'hits': 1, 'misses': 1})
+        self.assertEqual(first[0].name, "ต่างหู")
+        self.assertEqual(first[0].renditions['webp'][-1], (400, '/media/accessories/renditions/a_400w.webp'))
+
+        self.acc.name = "ต่างหูมุก"
+        self.acc.save()
+        self.assertEqual(catalog.accessories()[0].name, "ต่างหูมุก")
+        self.assertEqual(catalog.stats()['misses'], 2)
+
+    def test_responsive_image_renders_catalog_item_like_model(self):
+        template = Template("{% load product_images %}{% responsive_image acc sizes='10vw' %}")
+        item = catalog.accessories()[0]
+        self.assertEqual(template.render(Context({'acc': item})), template.render(Context({'acc': self.acc})))
+
+    def test_rental_form_and_dress_autocomplete_use_catalog(self):
+        Dress.objects.create(name="ชุดไทย", cost_price=1, rental_price=1)
+        Dress.objects.create(name="ชุดราตรี", cost_price=1, rental_price=1)
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        self.assertContains(self.client.get(reverse('add_rental')), "ต่างหู")
+        catalog.dresses()
+        with self.assertNumQueries(2):  # session + user เท่านั้น
+            response = self.client.get(reverse('dress_autocomplete'), {'q': 'ชุดไ'})
+        self.assertEqual([r['text'] for r in response.json()['results']], ["ชุดไทย"])
+
+
+class SqliteTuningTests(TestCase):
+    def test_pragmas_applied_on_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_busy_timeout_set_before_journal_mode(self):
+        statements = db_tuning.pragma_statements({'journal_mode': 'WAL', 'busy_timeout': 100})
+        self.assertEqual(statements, ["PRAGMA busy_timeout = 100", "PRAGMA journal_mode = WAL"])
+
+    def test_benchmark_command_reports_both_modes(self):
+        out = StringIO()
+        call_command('bench_sqlite_writes', writers=2, readers=1, seconds=0.2, stdout=out)
+        self.assertIn("default:", out.getvalue())
+        self.assertIn("tuned:", out.getvalue())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        user = User.objects.create_user('staff', password='pass')
+        self.necklace = Accessory.objects.create(name="สร้อย")
+        self.jobs = []
+        for i in range(self.THREADS):
+            client = Client()
+            client.force_login(user)
+            customer = Customer.objects.create(name=f"ลูกค้า {i}", phone=f"08{i:08d}")
+            self.jobs.append((client, {
+                'customer': customer.id,
+                'dress': make_dress(name=f"ชุด {i}").id,   # ชุดคนละตัว แย่งกันแค่สร้อยเส้นเดียว
+                'accessories': [self.necklace.id],
+                'start_date': '2026-03-01',
+                'end_date': '2026-03-03',
+            }))
+
+    def _run_together(self, work):
+        barrier = threading.Barrier(len(work))
+        errors = []
+
+        def run(job):
+            try:
+                barrier.wait()
+                job()
+            except Exception as exc:  # แสดงใน assert ด้านล่าง ไม่ให้ thread เงียบหาย
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(job,)) for job in work]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def _booked(self):
+        return Rental.accessories.through.objects.filter(accessory=self.necklace).count()
+
+    def test_parallel_staff_bookings_never_double_book(self):
+        statuses = []
+        self._run_together([
+            lambda client=client, data=data: statuses.append(client.post(reverse('add_rental'), data).status_code)
+            for client, data in self.jobs
+        ])
+        self.assertEqual(sorted(statuses), [200] * (self.THREADS - 1) + [302])
+        self.assertEqual(self._booked(), 1)
+        self.assertEqual(Rental.objects.count(), 1)
+
+    def test_parallel_portal_selections_never_double_book(self):
+        work = []
+        for i, (_, data) in enumerate(self.jobs):
+            rental = make_rental(Customer.objects.get(id=data['customer']), Dress.objects.get(id=data['dress']),
+                                 start=date(2026, 3, 1), end=date(2026, 3, 3))
+            client = Client()
+            session = client.session
+            session['customer_id'] = rental.customer_id
+            session.save()
+            url = reverse('customer_select_accessories', args=[rental.id])
+            work.append(lambda client=client, url=url: client.post(url, {'accessories': [self.necklace.id]}))
+        self._run_together(work)
+        self.assertEqual(self._booked(), 1)
+
+
+class AsyncCustomerViewTests(TransactionTestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="สมหญิง", phone="0811111111")
+        self.rental = make_rental(self.customer, make_dress(name="ชุดไทยจักรี"), start=date(2026, 3, 1), end=date(2026, 3, 3))
+        self.rental.accessories.set([Accessory.objects.create(name="ต่างหูมุก")])
+        session = self.client.session
+        session['customer_id'] = self.customer.id
+        session.save()
+
+    def test_customer_pages_are_async_and_render_prefetched_data(self):
+        from . import views
+        for view in (views.customer_portal, views.customer_select_accessories, views.landing_page):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+        response = self.client.get(reverse('customer_portal'))
+        self.assertContains(response, "ชุดไทยจักรี")
+        self.assertContains(response, "ต่างหูมุก")
+        self.assertContains(self.client.get(reverse('customer_select_accessories', args=[self.rental.id])), "ต่างหูมุก")
+
+    def test_benchmark_command_compares_wsgi_and_asgi(self):
+        out = StringIO()
+        call_command('bench_async_views', requests=4, concurrency=2, threads=2, stdout=out)
+        for label in ("landing wsgi", "portal asgi", "select asgi"):
+            self.assertIn(label, out.getvalue())
+
+
+class SeedBenchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('seed_bench', customers=20, dresses=5, rentals=40, images=2, stdout=StringIO())
+
+    def test_seed_creates_bookable_data_without_double_bookings(self):
+        self.assertEqual(Rental.objects.count(), 40)
+        self.assertEqual(Customer.objects.exclude(phone_normalized=None).count(), 20)
+        self.assertTrue(Rental.objects.filter(status='RETURNED').exists())
+        self.assertTrue(Rental.objects.filter(status='BOOKED').exists())
+        self.assertTrue(Dress.objects.exclude(image_renditions=[]).exists())
+        self.assertEqual(DailyRevenue.objects.aggregate(n=Sum('rental_count'))['n'], 40)
+        for link in Rental.accessories.through.objects.select_related('rental'):
+            rental = link.rental
+            self.assertFalse(accessory_conflicts(rental.start_date, rental.end_date, [link.accessory_id],
+                                                 exclude_rental_id=rental.id).exists())
+            if rental.status != 'RETURNED':
+                self.assertIsNone(dress_conflict(rental.dress_id, rental.start_date, rental.end_date, rental.id))
+
+    def test_seeding_again_after_deletes_skips_taken_phones(self):
+        # ลบลูกค้าไปบางคน + มีคนใช้เบอร์ที่จะได้ถัดไปอยู่แล้ว -> ต้องไม่ชน unique ของ phone_normalized
+        Customer.objects.filter(pk__in=Customer.objects.order_by('id').values('pk')[:5]).delete()
+        last = Customer.objects.order_by('-id').first().id
+        Customer.objects.create(name="ลูกค้าจริง", phone=f"09{last + 2:08d}")
+        call_command('seed_bench', customers=10, dresses=0, rentals=0, images=0, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 26)
+
+    def test_bench_views_writes_json_and_enforces_budgets(self):
+        output = f"{self.media_root}/bench.json"
+        call_command('bench_views', repeat=1, warmup=0, output=output, stdout=StringIO())
+        with open(output, encoding='utf-8') as fh:
+            report = json.load(fh)
+        self.assertEqual(set(report['results']), set(benchmarks.BUDGETS))
+        self.assertEqual(report['over_budget'], [])
+        self.assertEqual(Rental.objects.count(), 40)  # POST จองถูก rollback
+
+        with self.assertRaisesMessage(CommandError, "dashboard queries"):
+            call_command('bench_views', repeat=1, warmup=0, only=['dashboard'],
+                         budget=['dashboard.queries=1'], stdout=StringIO())
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='pass'))
+        self.customer = Customer.objects.create(name="สมหญิง", phone="0811111111")
+        make_rental(self.customer, make_dress())
+
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, INSTRUMENTATION_SLOW_MS=60_000)
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard'))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'sql;dur=[\d.]+;desc="\d+ queries, \d+ repeated"')
+        self.assertIn('tpl;dur=', header)
+        self.assertIn('total;dur=', header)
+        self.assertEqual(len(logs.records), 1)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('dashboard'))
+        self.assertGreater(record['queries'], 0)
+        self.assertLessEqual(len(record['slowest']), settings.INSTRUMENTATION_TOP_QUERIES)
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, INSTRUMENTATION_SLOW_MS=0)
+    def test_slow_request_dumps_all_queries_including_async_views(self):
+        session = self.client.session
+        session['customer_id'] = self.customer.id
+        session.save()
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('customer_portal'))
+        summary, dump = (json.loads(record.getMessage()) for record in logs.records)
+        # query ของ async view รันใน thread อื่น ก็ยังถูกนับ
+        self.assertGreater(summary['queries'], 0)
+        self.assertEqual(len(dump['queries']), summary['queries'])
+        self.assertIn('core_rental', " ".join(query['sql'] for query in dump['queries']))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, INSTRUMENTATION_SLOW_MS=0)
+    def test_slow_request_log_leaves_out_query_values(self):
+        # ค่าที่ค้น (เบอร์โทร / ชื่อลูกค้า) ไม่ลง log ทั้งใน query string และค่าพารามิเตอร์ของ SQL
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('customer_list'), {'q': '0811111111'})
+        output = "\n".join(record.getMessage() for record in logs.records)
+        self.assertIn('core_customer', output)
+        self.assertNotIn('0811111111', output)
+        self.assertNotIn('params', output)
+
+    def test_repeated_queries_grouped_by_signature(self):
+        stats = instrumentation.RequestStats()
+        stats.queries = [
+            ('SELECT * FROM core_dress WHERE id = %s', 1.0, True),
+            ('SELECT * FROM core_dress WHERE id = %s', 3.0, True),
+            ('SELECT * FROM core_accessory WHERE id IN (%s, %s)', 0.5, False),
+            ('SELECT * FROM core_accessory WHERE id IN (%s)', 0.5, False),
+        ]
+        self.assertEqual(stats.duplicates(), [
+            ('SELECT * FROM core_dress WHERE id = %s', 2),
+            ('SELECT * FROM core_accessory WHERE id IN (...)', 2),
+        ])
+        self.assertEqual(stats.slowest(1)[0][1], 3.0)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        override = override_settings(PROFILE_DIR=self.folder, PROFILE_SAMPLE_INTERVAL_MS=0.5, PROFILE_SAMPLE_RATE=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('clerk', password='pass', is_staff=True)
+        self.client.force_login(self.user)
+        make_rental(Customer.objects.create(name="สมหญิง", phone="0811111111"), make_dress())
+
+    def test_staff_query_param_writes_cprofile_file(self):
+        response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+        name = response['X-Profile-File']
+        self.assertTrue(name.endswith('.prof'))
+        self.assertEqual(profiling.list_profiles(), [name])
+        top = profiling.top_functions(f"{self.folder}/{name}", 5)
+        self.assertEqual(len(top), 5)
+
+    def test_header_selects_sampling_profiler(self):
+        response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='sample')
+        self.assertTrue(response['X-Profile-File'].endswith('.collapsed'))
+
+    def test_non_staff_cannot_trigger_profile(self):
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_MODE='sample')
+    def test_random_sample_profiles_anyone(self):
+        response = Client().get(reverse('landing_page'))
+        self.assertNotIn('X-Profile-File', response)  # เก็บไฟล์ แต่ไม่บอกชื่อไฟล์คนทั่วไป
+        self.assertEqual(len(profiling.list_profiles()), 1)
+        self.assertIn('X-Profile-File', self.client.get(reverse('dashboard')))
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_keeps_only_newest_files(self):
+        names = [self.client.get(reverse('dashboard'), {'_profile': 'sample'})['X-Profile-File'] for _ in range(3)]
+        self.assertEqual(profiling.list_profiles(), names[:0:-1])
+
+    def test_collapsed_top_functions_counts_leaf_frames(self):
+        path = f"{self.folder}/x.collapsed"
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write("main;render;query 3\nmain;render 1\nmain;load;query 2\n")
+        self.assertEqual(profiling.top_functions(path), [('query', 5), ('render', 1)])
+
+    def test_profiles_page_lists_files_and_is_staff_only(self):
+        name = self.client.get(reverse('dashboard'), {'_profile': '1'})['X-Profile-File']
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, name)
+        download = self.client.get(reverse('profile_download', args=[name]))
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile_download', args=['..%2Fsettings.py'])).status_code, 404)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 302)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pass', is_staff=True))
+        self.customer = Customer.objects.create(name="สมหญิง", phone="0811111111")
+        self.dress = make_dress()
+        self.earrings = Accessory.objects.create(name="ต่างหู")
+        today = timezone.now().date()
+        self.old = [
+            make_rental(self.customer, self.dress, start=today - timedelta(days=400 + i), end=today - timedelta(days=399 + i),
+                        total_price=300, deposit=100, status='RETURNED')
+            for i in range(3)
+        ]
+        self.old[0].accessories.add(self.earrings)
+        self.recent = make_rental(self.customer, self.dress, start=today - timedelta(days=10), end=today - timedelta(days=9),
+                                  total_price=200, status='RETURNED')
+        self.upcoming = make_rental(self.customer, self.dress, start=today + timedelta(days=5), end=today + timedelta(days=6),
+                                    total_price=500)
+
+    def _snapshot(self):
+        customer = Customer.objects.with_stats().get(pk=self.customer.pk)
+        return (
+            Dress.objects.values_list(*Dress.STATS_FIELDS).get(pk=self.dress.pk),
+            list(DailyRevenue.objects.order_by('day').values_list('day', 'booked_total', 'rental_count', 'deposits')),
+            (customer.rental_count, customer.lifetime_spend, customer.last_visit, customer.open_bookings),
+            reports.build_report()['rental_count'],
+            [row[0] for row in exports.rental_rows()],
+        )
+
+    def test_moves_old_returned_rentals_in_chunks_and_keeps_totals(self):
+        before = self._snapshot()
+        out = StringIO()
+        call_command('archive_rentals', older_than='180d', chunk_size=2, stdout=out)
+        self.assertIn("3 ใบ (ของแถม 1 รายการ)", out.getvalue())
+
+        self.assertEqual(set(Rental.objects.values_list('id', flat=True)), {self.recent.id, self.upcoming.id})
+        archived = ArchivedRental.objects.get(pk=self.old[0].pk)
+        self.assertEqual(list(archived.accessories.all()), [self.earrings])
+        self.assertEqual((archived.total_price, archived.deposit), (Decimal("300"), Decimal("100")))
+        self.assertEqual(self._snapshot(), before)
+
+        # นับใหม่ / สร้างยอดรายวันใหม่ ก็ยังรวมใบจองใน archive
+        call_command('recount', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self._snapshot(), before)
+
+    def test_failed_chunk_moves_nothing(self):
+        through = ArchivedRental.accessories.through
+        with mock.patch.object(through.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive.archive_rentals(timezone.now().date() - timedelta(days=180))
+        self.assertEqual(Rental.objects.count(), 5)
+        self.assertFalse(ArchivedRental.objects.exists())
+
+    def test_dry_run_and_bad_age(self):
+        out = StringIO()
+        call_command('archive_rentals', older_than='26w', dry_run=True, stdout=out)
+        self.assertIn("จะย้าย 3 ใบ", out.getvalue())
+        self.assertFalse(ArchivedRental.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('archive_rentals', older_than='six months')
+
+    def test_history_pages_through_both_tables(self):
+        archive.archive_rentals(timezone.now().date() - timedelta(days=180))
+        expected = [self.upcoming.id, self.recent.id] + [rental.id for rental in self.old]
+        url = reverse('customer_history', args=[self.customer.id])
+        with mock.patch.object(listing, 'PAGE_SIZE', 2):
+            seen, params = [], {}
+            while True:
+                response = self.client.get(url, params)
+                page = response.context['rentals']
+                seen += [rental.id for rental in page]
+                if not page.has_next:
+                    break
+                params = {'after': page.next_cursor}
+        self.assertEqual(seen, expected)
+        response = self.client.get(url)
+        self.assertNotContains(response, reverse('delete_rental', args=[self.old[0].id]))
+
+    def test_admin_is_read_only(self):
+        archive.archive_rentals(timezone.now().date() - timedelta(days=180))
+        self.client.force_login(User.objects.create_superuser('owner', password='pass'))
+        pk = self.old[0].pk
+        self.assertEqual(self.client.get(reverse('admin:core_archivedrental_changelist')).status_code, 200)
+        response = self.client.get(reverse('admin:core_archivedrental_change', args=[pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="total_price"')
+        self.assertEqual(self.client.get(reverse('admin:core_archivedrental_add')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('admin:core_archivedrental_delete', args=[pk]), {'post': 'yes'}).status_code, 403)
+        self.client.post(reverse('admin:core_archivedrental_change', args=[pk]), {'total_price': '1'})
+        self.assertEqual(ArchivedRental.objects.get(pk=pk).total_price, Decimal("300"))
+
+    def test_deleting_customer_or_dress_takes_archived_rentals_out_of_totals(self):
+        archive.archive_rentals(timezone.now().date() - timedelta(days=180))
+        other = Customer.objects.create(name="อีกคน", phone="0822222222")
+        make_rental(other, self.dress, total_price=700)
+        self.customer.delete()
+        after_customer = (
+            Dress.objects.values_list(*Dress.STATS_FIELDS).get(pk=self.dress.pk),
+            list(DailyRevenue.objects.exclude(rental_count=0).values_list('day', 'booked_total', 'rental_count', 'deposits')),
+        )
+        call_command('recount', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(after_customer, (
+            Dress.objects.values_list(*Dress.STATS_FIELDS).get(pk=self.dress.pk),
+            list(DailyRevenue.objects.values_list('day', 'booked_total', 'rental_count', 'deposits')),
+        ))
+        self.assertEqual(Dress.objects.get(pk=self.dress.pk).times_rented, 1)
+
+        # ลบชุด -> ใบจองใน archive ของชุดนี้ถูกลบตาม ยอดรายวันต้องหักด้วย
+        today = timezone.now().date()
+        make_rental(other, self.dress, start=today - timedelta(days=300), end=today - timedelta(days=299),
+                    total_price=400, status='RETURNED')
+        archive.archive_rentals(today - timedelta(days=180))
+        self.assertEqual(ArchivedRental.objects.count(), 1)
+        self.dress.delete()
+        self.assertFalse(DailyRevenue.objects.exclude(rental_count=0).exists())
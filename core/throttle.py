@@ -0,0 +1,30 @@
+"""นับจำนวนครั้งที่ลองทำอะไรซ้ำๆ (เช่น login) ต่อ IP / ต่อเบอร์ เก็บใน cache แบบหน้าต่างเวลาคงที่
+
+เช็คก่อนแตะ DB -> คนที่ยิงฟอร์มรัวๆ เกินโควต้าโดนตัดที่ cache อย่างเดียว ไม่เปลือง query
+"""
+from django.core.cache import cache
+
+
+def _key(scope, ident):
+    return f"throttle:{scope}:{ident}"
+
+
+def exceeded(scope, idents, limit):
+    counts = cache.get_many([_key(scope, ident) for ident in idents])
+    return any(count >= limit for count in counts.values())
+
+
+def record(scope, idents, window):
+    for ident in idents:
+        key = _key(scope, ident)
+        # add() ตั้งอายุ key ครั้งแรกครั้งเดียว incr() หลังจากนั้นไม่ต่ออายุ -> ครบ window ก็ล้างเอง
+        cache.add(key, 0, timeout=window)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=window)  # key หมดอายุพอดีระหว่าง add กับ incr
+
+
+def client_ip(request):
+    # ใช้ REMOTE_ADDR เท่านั้น (X-Forwarded-For ปลอมได้ ถ้าอยู่หลัง proxy ให้ proxy เป็นคนเขียนค่านี้)
+    return request.META.get('REMOTE_ADDR', '')
@@ -7,6 +7,8 @@ urlpatterns = [
     path('dresses/', views.dress_list, name='dress_list'),
     path('dresses/add/', views.add_dress, name='add_dress'),
     path('rentals/add/', views.add_rental, name='add_rental'),
+    path('autocomplete/customers/', views.customer_autocomplete, name='customer_autocomplete'),
+    path('autocomplete/dresses/', views.dress_autocomplete, name='dress_autocomplete'),
     path('customers/', views.customer_list, name='customer_list'),
     path('customers/<int:customer_id>/', views.customer_history, name='customer_history'),
     path('rentals/update/<int:rental_id>/<str:status>/', views.update_rental_status, name='update_rental_status'),
@@ -15,6 +17,10 @@ urlpatterns = [
     path('dresses/delete/<int:dress_id>/', views.delete_dress, name='delete_dress'),
     path('rentals/delete/<int:rental_id>/', views.delete_rental, name='delete_rental'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('reports/', views.reports, name='reports'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:name>', views.profile_download, name='profile_download'),
+    path('exports/<str:kind>.<str:fmt>', views.export_data, name='export_data'),
     # ✅ เพิ่มบรรทัดนี้สำหรับ Login (ชี้ไปที่ไฟล์ html ที่เราเพิ่งสร้าง)
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
 
@@ -1,10 +1,33 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum, Q
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q, Prefetch
 from django.utils import timezone
 from datetime import timedelta
 from .models import Dress, Rental, Customer, Accessory
-from .forms import AccessoryForm, RentalForm, DressForm, CustomerForm
-from django.contrib.auth.decorators import login_required
+from .forms import AccessoryForm, RentalForm, DressForm, CustomerForm, ExportFilterForm
+from .exports import EXPORTS, aiterate, csv_chunks, file_blocks, write_xlsx
+from .availability import abusy_accessory_ids, accessory_conflicts
+from .occupancy import dress_conflict
+from .rollups import income_summary
+from .reports import get_report
+from .listing import keyset_page, search
+from .phones import normalize_phone
+from . import archive, booking, cache_versions, catalog, profiling, throttle
+from .page_cache import cache_anonymous_page
+from django.contrib.auth.decorators import login_required, user_passes_test
+
+# จำนวนคิวต่อหน้าใน dashboard
+QUEUE_PAGE_SIZE = 20
+# จำนวนผลลัพธ์สูงสุดของช่องค้นหาลูกค้า/ชุดในฟอร์มเช่า
+AUTOCOMPLETE_LIMIT = 20
 
 @login_required
 def dashboard(request):
@@ -12,32 +35,128 @@ def dashboard(request):
     
     # 1. คิววันนี้และเร็วๆ นี้ (Calendar View แบบง่าย)
     # แบบที่ 2: เรียงตามวันที่ (งานด่วนอยู่บน) แต่ซ่อนคนคืนแล้ว
-    upcoming_rentals = Rental.objects.exclude(status='RETURNED').order_by('start_date')
+    # select_related + Prefetch: ดึงลูกค้า/ชุด/ของแถมมาทีเดียว ไม่ต้อง query ทีละแถวใน html
+    upcoming_rentals = Rental.objects.exclude(status='RETURNED').select_related(
+        'customer', 'dress'
+    ).prefetch_related(
+        Prefetch('accessories', queryset=Accessory.objects.order_by('id'))
+    ).order_by('start_date', 'id')
+
+    # ?days=N -> ดูเฉพาะคิวที่อยู่ในช่วง วันนี้ ± N วัน
+    window_days = request.GET.get('days', '')
+    if window_days.isdigit():
+        window = timedelta(days=int(window_days))
+        upcoming_rentals = upcoming_rentals.filter(
+            start_date__lte=today + window,
+            end_date__gte=today - window,
+        )
+    else:
+        window_days = ''
 
-    # 2. คำนวณรายได้
-    # รายได้สัปดาห์นี้
-    start_week = today - timedelta(days=today.weekday())
-    weekly_income = Rental.objects.filter(start_date__gte=start_week).aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    # รายได้เดือนนี้
-    monthly_income = Rental.objects.filter(start_date__month=today.month).aggregate(Sum('total_price'))['total_price__sum'] or 0
+    # แบ่งหน้า -> ไม่ว่าจะมีคิวค้างกี่ร้อยรายการ หน้าเว็บก็โหลดแค่ทีละ QUEUE_PAGE_SIZE
+    queue_page = Paginator(upcoming_rentals, QUEUE_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    # 2. คำนวณรายได้ สัปดาห์ / เดือน / ปีนี้ จากตารางยอดรายวัน (ไม่เกิน 366 แถว ไม่ต้องไล่ทุกใบจอง)
+    income = income_summary(today)
 
     # 3. กำไรของแต่ละชุด (Profit Per Item)
+    # รายได้เก็บเป็นคอลัมน์บนชุดอยู่แล้ว (core/dress_stats.py) -> dress.profit ใน html ไม่ยิง query เพิ่ม
     dresses = Dress.objects.all()
-    # Logic คำนวณกำไรอยู่ใน Model Dress.profit() แล้ว เราแค่ส่ง object ไป loop ใน html
 
     context = {
-        'upcoming_rentals': upcoming_rentals,
-        'weekly_income': weekly_income,
-        'monthly_income': monthly_income,
+        'upcoming_rentals': queue_page,
+        'window_days': window_days,
+        'weekly_income': income['week'],
+        'monthly_income': income['month'],
+        'yearly_income': income['year'],
         'dresses': dresses,
+        'export_form': ExportFilterForm(),
     }
     return render(request, 'dashboard.html', context)
 
+@user_passes_test(lambda user: user.is_active and user.is_staff)
+def reports(request):
+    # รายงานวิเคราะห์ (ใช้ของใน cache ถ้าข้อมูลยังไม่เปลี่ยน ดู core/reports.py)
+    report = get_report()
+    return render(request, 'reports.html', {'report': report, 'catalog_stats': catalog.stats()})
+
+# จำนวน function ที่โชว์ต่อไฟล์ในหน้ารายการ profile
+PROFILE_TOP_FUNCTIONS = 8
+
+@user_passes_test(lambda user: user.is_active and user.is_staff)
+def profiles(request):
+    # รายการ profile ล่าสุด (ดู core/profiling.py) พร้อม function ที่กินเวลามากสุด
+    rows = [
+        {'name': name, 'top': profiling.top_functions(os.path.join(settings.PROFILE_DIR, name), PROFILE_TOP_FUNCTIONS)}
+        for name in profiling.list_profiles()
+    ]
+    return render(request, 'profiles.html', {'profiles': rows, 'sample_rate': settings.PROFILE_SAMPLE_RATE})
+
+@user_passes_test(lambda user: user.is_active and user.is_staff)
+def profile_download(request, name):
+    # รับเฉพาะชื่อที่อยู่ในรายการจริง (กันชื่อแบบ ../ ออกไปนอกโฟลเดอร์)
+    if name not in profiling.list_profiles():
+        raise Http404
+    return FileResponse(open(os.path.join(settings.PROFILE_DIR, name), 'rb'), as_attachment=True, filename=name)
+
+@login_required
+def export_data(request, kind, fmt):
+    # /exports/rentals.csv?date_from=...&date_to=...&status=RETURNED
+    if kind not in EXPORTS or fmt not in ('csv', 'xlsx'):
+        raise Http404
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filters = form.cleaned_data
+    filename = f"{kind}-{timezone.now():%Y%m%d}.{fmt}"
+
+    if fmt == 'csv':
+        # ส่งทีละก้อนระหว่างดึงข้อมูล -> browser เริ่มดาวน์โหลดทันที แรมไม่โตตามจำนวนแถว
+        response = StreamingHttpResponse(
+            _streamed(request, csv_chunks(kind, **filters)), content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # xlsx เป็นไฟล์ zip ต้องเขียนให้จบก่อนถึงส่งได้ -> เขียนลงไฟล์ชั่วคราวแล้วส่งเป็นสตรีม
+    fh = tempfile.TemporaryFile()
+    write_xlsx(kind, fh, **filters)
+    fh.seek(0)
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    if not isinstance(request, ASGIRequest):
+        return FileResponse(fh, as_attachment=True, filename=filename, content_type=content_type)
+    size = os.fstat(fh.fileno()).st_size
+    response = StreamingHttpResponse(aiterate(file_blocks(fh)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Content-Length'] = str(size)
+    return response
+
+def _streamed(request, chunks):
+    # ใต้ ASGI (uvicorn) iterator แบบ sync จะถูกดึงลงแรมทั้งก้อนก่อนส่ง -> ส่งเป็น async iterator แทน
+    # ใต้ WSGI กลับกัน: async iterator จะถูกดึงทั้งก้อน -> ส่ง iterator เดิม
+    return aiterate(chunks) if isinstance(request, ASGIRequest) else chunks
+
+# ลำดับของหน้าสต็อกชุด (?sort=...) เรียงตามคอลัมน์ที่มี index ดู Dress.Meta.indexes
+DRESS_SORTS = {
+    'popular': ('-times_rented', '-id'),
+    'revenue': ('-revenue_to_date', '-id'),
+}
+
 @login_required
 def dress_list(request):
-    dresses = Dress.objects.all()
-    return render(request, 'dress_list.html', {'dresses': dresses})
+    q = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', '')
+    if sort not in DRESS_SORTS:
+        sort = ''
+    dresses = keyset_page(request, search(Dress.objects.all(), q, ['name']), DRESS_SORTS.get(sort, ('id',)))
+    return render(request, 'dress_list.html', {
+        'dresses': dresses,
+        'q': q,
+        'sort': sort,
+        # การ์ดชุดแสดงกำไร -> ต้องเปลี่ยนทั้งตอนแก้ชุดและตอนมีใบจองใหม่
+        'grid_version': f"{cache_versions.get(cache_versions.CATALOG)}.{cache_versions.get(cache_versions.RENTALS)}",
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    })
 
 @login_required
 def add_dress(request):
@@ -63,62 +182,111 @@ def add_rental(request):
             start_date = form.cleaned_data.get('start_date')
             end_date = form.cleaned_data.get('end_date')
             selected_accessories = form.cleaned_data.get('accessories')
+            accessory_ids = [acc.id for acc in selected_accessories]
+            dress_id = form.cleaned_data['dress'].id
 
-            # --- 🔥 เริ่ม LOGIC ตรวจกันชน ---
-            
-            # 1. หาใบจองอื่นที่ "วันที่ทับซ้อน" กับเรา
-            overlapping_rentals = Rental.objects.filter(
-                start_date__lte=end_date,   # เริ่มก่อนที่เราจะคืน
-                end_date__gte=start_date    # คืนหลังที่เราเริ่ม
-            ).exclude(status='RETURNED')    # ไม่นับคนที่คืนของแล้ว
-
-            # 2. วนลูปเช็คว่า "ของที่เราเลือก" ไปชนกับ "ของในใบจองพวกนั้น" ไหม?
-            collision_msg = None
-            
-            for rental in overlapping_rentals:
-                # หาของที่ซ้ำกัน (Intersection)
-                # แปลงเป็น set เพื่อเทียบหาตัวซ้ำได้ง่ายๆ
-                booked_items = set(rental.accessories.all())
-                selected_items = set(selected_accessories)
-                
-                duplicates = booked_items.intersection(selected_items)
-                
-                if duplicates:
-                    # เจอตัวซ้ำ! เตรียมข้อความด่า (เอ้ย เตือน)
-                    dup_names = ", ".join([acc.name for acc in duplicates])
+            # เช็คคิว + บันทึก ใน transaction เดียว กันคนอื่นจองของชิ้นเดียวกันแทรกระหว่างนี้ (core/booking.py)
+            with transaction.atomic():
+                booking.lock_items(dress_ids=[dress_id], accessory_ids=accessory_ids)
+
+                # --- 🔥 เริ่ม LOGIC ตรวจกันชน ---
+
+                # หาเครื่องประดับที่เราเลือก ซึ่งถูกใบจองอื่น "วันที่ทับซ้อน" จองไว้แล้ว (query เดียวจบ)
+                collision_msg = None
+                conflicts = list(accessory_conflicts(start_date, end_date, accessory_ids=accessory_ids))
+
+                if conflicts:
+                    # เจอตัวซ้ำ! เตรียมข้อความด่า (เอ้ย เตือน) จากใบจองแรกที่ชน
+                    rental = conflicts[0].rental
+                    dup_names = ", ".join([c.accessory.name for c in conflicts if c.rental_id == rental.id])
                     collision_msg = f"บันทึกไม่ได้! '{dup_names}' ถูกจองโดยคุณ {rental.customer.name} แล้ว (วันที่ {rental.start_date.strftime('%d/%m')} - {rental.end_date.strftime('%d/%m')})"
-                    break # เจอที่เดียวก็พอแล้ว หยุดเช็ค
-            
-            # --- 🔥 จบ LOGIC ---
 
-            if collision_msg:
+                # เช็คชุดด้วย: ชุดเดียวกันห้ามถูกจองซ้อนวัน (ดูจากปฏิทินคิว)
+                dress_msg = None
+                dress_rental = dress_conflict(dress_id, start_date, end_date)
+                if dress_rental:
+                    dress_msg = f"ชุดนี้ถูกจองโดยคุณ {dress_rental.customer.name} แล้ว (วันที่ {dress_rental.start_date.strftime('%d/%m')} - {dress_rental.end_date.strftime('%d/%m')})"
+
+                # --- 🔥 จบ LOGIC ---
+
+                if not (collision_msg or dress_msg):
+                    # ทางสะดวก -> บันทึกได้เลย!
+                    form.save()
+
+            if collision_msg or dress_msg:
                 # ถ้ามีรถชนกัน -> เพิ่ม Error ใส่ฟอร์ม แล้วเด้งกลับไปหน้าเดิม
-                form.add_error('accessories', collision_msg)
+                if collision_msg:
+                    form.add_error('accessories', collision_msg)
+                if dress_msg:
+                    form.add_error('dress', dress_msg)
             else:
-                # ทางสะดวก -> บันทึกได้เลย!
-                form.save()
                 return redirect('dashboard')
 
     else:
         form = RentalForm()
-    
-    accessories = Accessory.objects.all()
+
+    # รายการเครื่องประดับจากแคตตาล็อกในแรม (ไม่ต้องโหลดทั้งตาราง) + จำตัวที่ติ๊กไว้ เผื่อบันทึกไม่ผ่านแล้วต้องแสดงฟอร์มใหม่
+    accessories = catalog.accessories()
+    selected_accessories = {str(pk) for pk in form['accessories'].value() or []}
 
     return render(request, 'form_rental.html', {
         'form': form,
-        'accessories': accessories
+        'accessories': accessories,
+        'selected_accessories': selected_accessories,
     })
 
+def _autocomplete(request, queryset, fields):
+    # ค้นแบบขึ้นต้นด้วย ส่งกลับไม่เกิน AUTOCOMPLETE_LIMIT ตัว (ข้อความเดียวกับที่ dropdown ในฟอร์มแสดง)
+    # listing.search ค้นเป็นช่วงค่า -> เดินตาม index ของ name / phone (migration 0010) ไม่ต้องไล่ทั้งตาราง
+    q = request.GET.get('q', '').strip()
+    rows = search(queryset, q, fields).only('id', *fields).order_by(fields[0], 'id')[:AUTOCOMPLETE_LIMIT]
+    return JsonResponse({'results': [{'id': obj.pk, 'text': str(obj)} for obj in rows]})
+
+@login_required
+def customer_autocomplete(request):
+    return _autocomplete(request, Customer.objects.all(), ['name', 'phone'])
+
+@login_required
+def dress_autocomplete(request):
+    # ชุดมีไม่กี่ร้อยตัว -> ค้นจากแคตตาล็อกในแรมได้เลย ไม่ต้องถาม DB (ลำดับเดียวกับ _autocomplete)
+    q = request.GET.get('q', '').strip()
+    dresses = sorted(
+        (dress for dress in catalog.dresses() if dress.name.startswith(q)),
+        key=lambda dress: (dress.name, dress.id),
+    )[:AUTOCOMPLETE_LIMIT]
+    return JsonResponse({'results': [{'id': dress.id, 'text': dress.name} for dress in dresses]})
+
 @login_required
 def customer_history(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
-    rentals = Rental.objects.filter(customer=customer).order_by('-start_date')
+    customer = get_object_or_404(Customer.objects.with_stats(), id=customer_id)
+    # ใหม่สุดขึ้นก่อน (id ต่อท้ายกันลำดับกำกวมเวลามีหลายใบวันเดียวกัน) ใช้ index (customer, start_date)
+    # รวมใบจองเก่าที่ย้ายไป archive แล้วด้วย (core/archive.py)
+    # ดึงชุด + ของแถมมาพร้อมกัน ไม่ต้อง query ทีละแถวใน html
+    rentals = archive.RentalHistory().filter(customer=customer).select_related('dress').prefetch_related(
+        Prefetch('accessories', queryset=Accessory.objects.order_by('id'))
+    )
+    rentals = keyset_page(request, rentals, ordering=('-start_date', '-id'))
     return render(request, 'customer_history.html', {'customer': customer, 'rentals': rentals})
 
+# ลำดับของหน้ารายชื่อลูกค้า (?sort=...) เรียงตามค่าที่ Customer.objects.with_stats() คำนวณให้
+CUSTOMER_SORTS = {
+    'rentals': ('-rental_count', '-id'),
+    'spend': ('-lifetime_spend', '-id'),
+    'last_visit': ('-last_visit_key', '-id'),
+    'open': ('-open_bookings', '-id'),
+}
+
 @login_required
 def customer_list(request):
-    customers = Customer.objects.all()
-    return render(request, 'customer_list.html', {'customers': customers})
+    # ?q= ค้นจากชื่อ หรือเบอร์โทร (ขึ้นต้นด้วย)
+    q = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', '')
+    if sort not in CUSTOMER_SORTS:
+        sort = ''
+    customers = keyset_page(
+        request, search(Customer.objects.with_stats(), q, ['name', 'phone']), CUSTOMER_SORTS.get(sort, ('id',)),
+    )
+    return render(request, 'customer_list.html', {'customers': customers, 'q': q, 'sort': sort})
 
 @login_required
 def update_rental_status(request, rental_id, status):
@@ -172,27 +340,40 @@ def delete_rental(request, rental_id):
     return redirect('dashboard')
 
 
+async def _aload_user(request):
+    # async view: ดึง user มาไว้ก่อน render (base.html ใช้ user.is_authenticated ซึ่งจะ query แบบ sync ไม่ได้)
+    request.user = await request.auser()
+    return request.user
+
 # 1. เพิ่มฟังก์ชัน Landing Page (ไว้ล่างสุดก็ได้ หรือบนสุดก็ได้)
-def landing_page(request):
+# คนที่ไม่ได้ login ได้หน้าจาก cache (ดู core/page_cache.py) ยกเว้นหน้าที่มี ?error=
+@cache_anonymous_page('landing', skip_params=('error',))
+async def landing_page(request):
     # ถ้าเป็นลูกค้า (มี session) ให้เด้งไปหน้า Portal เลย
-    if 'customer_id' in request.session:
+    if await request.session.ahas_key('customer_id'):
         return redirect('customer_portal')
         
     # ถ้าเป็น Admin (login ระบบ Django) ให้เด้งไป Dashboard เลย
-    if request.user.is_authenticated:
+    if (await _aload_user(request)).is_authenticated:
         return redirect('dashboard')
         
-    latest_dresses = Dress.objects.filter(image__isnull=False).order_by('-id')[:5]
-
-    return render(request, 'landing_page.html', {
-        'latest_dresses': latest_dresses # ส่งไปหน้าเว็บ
+    # ชุดใหม่ล่าสุด 5 ตัวที่มีรูป จากแคตตาล็อกในแรม (ปกติแค่เช็คเลขเวอร์ชัน ไม่แตะ DB)
+    dresses = await sync_to_async(catalog.dresses)()
+    latest_dresses = [dress for dress in reversed(dresses) if dress.image_url][:5]
+
+    # แม่แบบมี {% cache %} (อ่าน/เขียน cache แบบ sync) -> render นอก event loop
+    return await sync_to_async(render)(request, 'landing_page.html', {
+        'latest_dresses': latest_dresses,
+        'catalog_version': await cache_versions.aget(cache_versions.CATALOG),
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 
 @login_required
 def accessory_list(request):
-    accessories = Accessory.objects.all()
-    return render(request, 'accessory_list.html', {'accessories': accessories})
+    q = request.GET.get('q', '').strip()
+    accessories = keyset_page(request, search(Accessory.objects.all(), q, ['name']))
+    return render(request, 'accessory_list.html', {'accessories': accessories, 'q': q})
 
 @login_required
 def add_accessory(request):
@@ -216,75 +397,93 @@ def delete_accessory(request, acc_id):
 # 1. ล็อคอินลูกค้า (ใช้เบอร์โทร)
 def customer_login(request):
     if request.method == 'POST':
-        phone = request.POST.get('phone')
+        # เบอร์รูปแบบไหนก็ได้ (081-234-5678 / +66...) เทียบกับคอลัมน์ที่ normalize แล้ว (unique index)
+        phone = normalize_phone(request.POST.get('phone'))
+        attempt_keys = [f"ip:{throttle.client_ip(request)}"] + ([f"phone:{phone}"] if phone else [])
+        # ลองเกินโควต้า -> ตอบจาก cache เลย ไม่ต้องแตะ DB
+        if throttle.exceeded('customer-login', attempt_keys, settings.CUSTOMER_LOGIN_MAX_ATTEMPTS):
+            return render(request, 'customer_login.html', {
+                'error': 'ลองหลายครั้งเกินไป กรุณารอสักครู่แล้วลองใหม่ค่ะ'
+            }, status=429)
         try:
-            # ค้นหาลูกค้าจากเบอร์โทร
-            customer = Customer.objects.get(phone=phone)
+            # ค้นหาลูกค้าจากเบอร์โทร (ไม่มีตัวเลขเลย = ไม่ต้องค้น ห้ามไปเจอลูกค้าที่ไม่มีเบอร์)
+            if not phone:
+                raise Customer.DoesNotExist
+            customer = Customer.objects.get(phone_normalized=phone)
             # เจอ! เก็บ ID ลง Session (เหมือนการจำว่า login แล้ว)
             request.session['customer_id'] = customer.id
             return redirect('customer_portal')
         except Customer.DoesNotExist:
+            # นับเฉพาะครั้งที่ไม่เจอ: ลูกค้าหลายคนใช้ IP เดียวกัน (wifi ร้าน / เครือข่ายมือถือ) login สำเร็จไม่ควรโดนตัด
+            throttle.record('customer-login', attempt_keys, settings.CUSTOMER_LOGIN_WINDOW)
             return render(request, 'customer_login.html', {'error': 'ไม่พบเบอร์โทรนี้ในระบบค่ะ'})
-            
+
     return render(request, 'customer_login.html')
 
 # 2. หน้าหลักลูกค้า (โชว์รายการเช่าของตัวเอง)
-def customer_portal(request):
-    customer_id = request.session.get('customer_id')
+async def customer_portal(request):
+    # async view: ระหว่างรอ DB ไม่กิน worker (ช่วงลูกค้าเข้าเยอะหน้าฤดูแต่งงาน)
+    customer_id = await request.session.aget('customer_id')
     if not customer_id:
         return redirect('customer_login') # ถ้ายังไม่ login ดีดกลับไป
-    
-    customer = Customer.objects.get(id=customer_id)
+    await _aload_user(request)
+
+    customer = await Customer.objects.aget(id=customer_id)
     # ดึงเฉพาะรายการที่ จองอยู่ (BOOKED) หรือ รับชุดไปแล้ว (ACTIVE)
-    my_rentals = Rental.objects.filter(customer=customer, status__in=['BOOKED', 'ACTIVE']).order_by('-start_date')
+    # ดึงชุด + ของแถมมาให้ครบก่อน render (template แตะ DB แบบ sync ใน async view ไม่ได้)
+    my_rentals = [
+        rental async for rental in Rental.objects.filter(
+            customer_id=customer_id, status__in=['BOOKED', 'ACTIVE']
+        ).select_related('dress').prefetch_related('accessories').order_by('-start_date')
+    ]
     
     return render(request, 'customer_portal.html', {'customer': customer, 'rentals': my_rentals})
 
 # core/views.py
 
-def customer_select_accessories(request, rental_id):
-    customer_id = request.session.get('customer_id')
+async def customer_select_accessories(request, rental_id):
+    customer_id = await request.session.aget('customer_id')
     if not customer_id:
         return redirect('customer_login')
+    await _aload_user(request)
+
+    current_rental = await aget_object_or_404(
+        Rental.objects.select_related('dress').prefetch_related('accessories'), id=rental_id
+    )
     
-    current_rental = get_object_or_404(Rental, id=rental_id)
-    
-    if current_rental.customer.id != customer_id:
+    if current_rental.customer_id != customer_id:
         return redirect('customer_portal')
 
+    error = None
     if request.method == 'POST':
-        selected_ids = request.POST.getlist('accessories')
+        selected_ids = [int(pk) for pk in request.POST.getlist('accessories') if pk.isdigit()]
         if len(selected_ids) > 2:
             pass # (จัดการ error ตามเดิม)
         else:
-            current_rental.accessories.set(selected_ids)
-            return redirect('customer_portal')
+            # เช็คว่ายังว่าง + บันทึก ใน transaction เดียว (ระหว่างลูกค้าเปิดหน้า อาจมีคนจองตัดหน้าไปแล้ว)
+            # transaction ใช้ใน async ไม่ได้ -> ส่งไปทำใน thread
+            if await sync_to_async(booking.choose_accessories)(current_rental, selected_ids):
+                return redirect('customer_portal')
+            error = "ขออภัย มีคนจองเครื่องประดับที่เลือกไปก่อนแล้ว กรุณาเลือกใหม่"
 
     # ---------------------------------------------------------
     # 🔥 LOGIC ป้องกันการจองชนกัน (เพิ่มตรงนี้ครับ)
     # ---------------------------------------------------------
     
-    # 1. หาใบจองอื่น ที่วัน "คาบเกี่ยว" กับใบจองนี้
-    # สูตร: (StartA <= EndB) และ (EndA >= StartB)
-    overlapping_rentals = Rental.objects.filter(
-        start_date__lte=current_rental.end_date, # เริ่มก่อนที่เราจะคืน
-        end_date__gte=current_rental.start_date  # คืนหลังจากที่เราเริ่ม
-    ).exclude(id=current_rental.id).exclude(status='RETURNED') 
-    # exclude id: ไม่นับตัวเอง (เผื่อเราเคยเลือกไว้แล้ว จะได้แก้ได้)
-    # exclude RETURNED: ถ้าคืนแล้ว ถือว่าว่าง จองต่อได้
-
-    # 2. เก็บ ID ของเครื่องประดับที่ "ไม่ว่าง" ใส่ลิสต์ไว้
-    booked_acc_ids = []
-    for r in overlapping_rentals:
-        for acc in r.accessories.all():
-            booked_acc_ids.append(acc.id)
-
-    accessories = Accessory.objects.all()
+    # เก็บ ID ของเครื่องประดับที่ "ไม่ว่าง" ในช่วงวันของใบจองนี้
+    # exclude_rental_id: ไม่นับตัวเอง (เผื่อเราเคยเลือกไว้แล้ว จะได้แก้ได้)
+    booked_acc_ids = await abusy_accessory_ids(
+        current_rental.start_date, current_rental.end_date,
+        exclude_rental_id=current_rental.id,
+    )
+
+    accessories = await sync_to_async(catalog.accessories)()
     
     return render(request, 'customer_select_accessories.html', {
         'rental': current_rental, 
         'accessories': accessories,
-        'booked_acc_ids': booked_acc_ids # ✅ ส่งบัญชีดำไปหน้าเว็บ
+        'booked_acc_ids': booked_acc_ids, # ✅ ส่งบัญชีดำไปหน้าเว็บ
+        'error': error,
     })
 
 # 4. ออกจากระบบลูกค้า
@@ -5,6 +5,21 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+รันจริงด้วย uvicorn (หน้าฝั่งลูกค้า: หน้าแรก / portal / เลือกเครื่องประดับ เป็น async view
+ระหว่างรอ DB ไม่กิน worker) เช่น เครื่องเล็ก 2 core:
+
+    uvicorn pink_rental.asgi:application --host 0.0.0.0 --port 8000 \
+        --workers 2 --no-access-log --timeout-keep-alive 5
+
+- --workers = จำนวน process (ประมาณจำนวน core) แต่ละ process มี event loop ของตัวเอง
+- view ปกติ (หน้าแอดมิน) Django รันใน thread ให้เอง ไม่ต้องตั้งอะไรเพิ่ม
+- หลาย worker ให้ตั้ง CACHE_BACKEND=file (หรือ redis) ให้ทุก worker เห็นเลขเวอร์ชันเดียวกัน (ดู settings)
+- export CSV / Excel (core/views.py export_data) ส่งเป็น async iterator ใต้ ASGI -> สตรีมทีละก้อนจริง
+  ไม่ถูกดึงทั้งไฟล์ลงแรมก่อนส่ง
+- static/media ให้ nginx เสิร์ฟ แล้ว proxy_pass ที่เหลือมาที่ uvicorn
+
+เทียบกับ WSGI: python manage.py bench_async_views --db-latency 5
 """
 
 import os
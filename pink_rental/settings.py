@@ -48,11 +48,15 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    # จับเวลา SQL/template ต่อ request (ทำงานเฉพาะตอนตั้ง REQUEST_INSTRUMENTATION=1 ดู core/instrumentation.py)
+    "core.instrumentation.instrumentation_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # profile request ที่แอดมินสั่ง (?_profile=1) หรือสุ่มได้ (core/profiling.py)
+    "core.profiling.profiling_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -80,11 +84,58 @@ WSGI_APPLICATION = "pink_rental.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# ค่าเริ่มต้นใช้ SQLite ไฟล์เดียว ถ้าตั้ง POSTGRES_DB จะใช้ PostgreSQL แทน (ต้องติดตั้ง psycopg[pool] เพิ่ม)
+# CONN_MAX_AGE = ใช้ connection เดิมซ้ำข้าม request ได้กี่วินาที (ไม่ต้องเปิดใหม่ + ตั้ง PRAGMA ใหม่ทุก request)
+# CONN_HEALTH_CHECKS = เช็คก่อนใช้ว่า connection ที่ค้างไว้ยังไม่ตาย
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 60))
+
+if os.environ.get('POSTGRES_DB'):
+    # POSTGRES_POOL=1 (ค่าเริ่มต้น): ใช้ connection pool ของ psycopg แทนการค้าง connection ต่อ thread
+    # (Django ไม่ให้ใช้ pool คู่กับ CONN_MAX_AGE จึงตั้งเป็น 0)
+    _POSTGRES_POOL = os.environ.get('POSTGRES_POOL', '1') == '1'
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ['POSTGRES_DB'],
+            "USER": os.environ.get('POSTGRES_USER', ''),
+            "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+            "HOST": os.environ.get('POSTGRES_HOST', 'localhost'),
+            "PORT": os.environ.get('POSTGRES_PORT', '5432'),
+            "CONN_MAX_AGE": 0 if _POSTGRES_POOL else CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                    "max_size": int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+                },
+            } if _POSTGRES_POOL else {},
+        }
     }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get('SQLITE_PATH', BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                # transaction.atomic() เปิดด้วย BEGIN IMMEDIATE: จองสิทธิ์เขียนตั้งแต่ต้น
+                # ไม่ใช่อ่านไปครึ่งทางแล้วเจอ "database is locked" ตอนจะเขียน (และกันจองซ้อน ดู core/booking.py)
+                "transaction_mode": "IMMEDIATE",
+            },
+            # ฐานข้อมูลตอนรันเทสต์เป็นไฟล์ (ไม่ใช่ในแรม) ให้ lock ทำงานแบบเดียวกับของจริง
+            # เทสต์จองพร้อมกันหลาย thread (ConcurrentBookingTests) ต้องใช้ WAL + busy_timeout
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+
+# PRAGMA ที่ตั้งทุกครั้งที่เปิด connection SQLite ใหม่ (core/db_tuning.py) ทดสอบผลได้ด้วย manage.py bench_sqlite_writes
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),     # ms
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 20_000)),        # ค่าติดลบ = KiB
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 128 * 1024 * 1024)),
 }
 
 
@@ -126,6 +177,38 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# จำนวน process ที่ใช้ย่อรูปเบื้องหลัง (core/images.py) ตั้งเป็น 0 = ย่อทันทีหลังบันทึก ไม่ใช้ pool
+IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', 2))
+# รูปที่อัปโหลดได้ใหญ่สุด (จำนวนพิกเซล กว้าง x สูง) เกินนี้ฟอร์มจะแจ้ง error
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 64_000_000))
+# เก็บผลรายงานวิเคราะห์ (core/reports.py) ไว้กี่วินาที (ข้อมูลเปลี่ยนเมื่อไหร่ก็คำนวณใหม่ทันทีอยู่แล้ว)
+REPORT_CACHE_TIMEOUT = int(os.environ.get('REPORT_CACHE_TIMEOUT', 60 * 60 * 24))
+# Cache กลาง (เลขเวอร์ชันข้อมูล, หน้าแรก, ส่วนของหน้า, รายงาน, ตัวนับ login)
+# ค่าเริ่มต้น locmem = อยู่ในแรมของแต่ละ process ถ้ารันหลาย worker ให้ตั้ง CACHE_BACKEND=file (หรือ redis/memcached)
+# เพื่อให้ทุก worker เห็นเลขเวอร์ชันเดียวกัน แก้ชุดแล้วหน้าแรกของทุก worker จะเปลี่ยนพร้อมกัน
+# CACHE_BACKEND รับ 'locmem', 'file' หรือ path ของ backend ตรงๆ เช่น django.core.cache.backends.redis.RedisCache
+_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache') if CACHE_BACKEND == 'file' else 'pink-rental',
+        ),
+    }
+}
+# อายุ cache ทั้งหน้า (หน้าแรกของคนที่ไม่ได้ login) และ cache ส่วนของหน้า (ตารางชุด) หน่วยวินาที 0 = ปิด
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 10 * 60))
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 10 * 60))
+
+# หน้า login ลูกค้า: ลองได้ไม่เกินกี่ครั้ง ต่อ IP / ต่อเบอร์ ภายในกี่วินาที
+CUSTOMER_LOGIN_MAX_ATTEMPTS = int(os.environ.get('CUSTOMER_LOGIN_MAX_ATTEMPTS', 10))
+CUSTOMER_LOGIN_WINDOW = int(os.environ.get('CUSTOMER_LOGIN_WINDOW', 5 * 60))
+
 STATIC_URL = 'static/'
 ALLOWED_HOSTS = ['*'] 
 # หรือใส่ชื่อเว็บเราตอนหลัง เช่น ['teerental.pythonanywhere.com']
@@ -139,4 +222,32 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 
 # 3. ถ้า Logout เสร็จ ให้เด้งไปหน้านี้
-LOGOUT_REDIRECT_URL = 'dress_list'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'dress_list'
+
+# จับเวลาแต่ละ request (core/instrumentation.py): header Server-Timing + log JSON ของ logger core.instrumentation
+# ปิดไว้เป็นค่าเริ่มต้น เปิดเฉพาะตอนไล่หาว่าหน้าไหนช้าเพราะอะไร
+# เปิดแล้ว log จะมีข้อความ SQL + path ของทุก request (ไม่มีค่าพารามิเตอร์ / query string) -> เก็บ log ให้เหมือนข้อมูลภายใน
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', '0') == '1'
+# request ที่ช้ากว่านี้ (ms) จะ log รายการ query ทั้งหมดไว้
+INSTRUMENTATION_SLOW_MS = int(os.environ.get('INSTRUMENTATION_SLOW_MS', 500))
+# จำนวน query ช้าสุด / query ที่ยิงซ้ำ ที่ใส่ใน log แต่ละบรรทัด
+INSTRUMENTATION_TOP_QUERIES = int(os.environ.get('INSTRUMENTATION_TOP_QUERIES', 5))
+
+# profile รายครั้ง (core/profiling.py): แอดมินใส่ ?_profile=1 (หรือ =cprofile / =sample) หรือ header X-Profile
+# PROFILE_SAMPLE_RATE = สุ่ม profile 1 ใน N request (0 = ไม่สุ่ม) ไฟล์เก็บที่ PROFILE_DIR แค่ PROFILE_KEEP ไฟล์ล่าสุด
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 2))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}